@@ -0,0 +1,163 @@
+"""
+Dynamic micro-batching for the recycling detection server.
+Collects frames from all WebSocket connections for a short window and runs them
+through the detector as one batch, then hands each result back to its caller.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class BatchStats:
+    """
+    Throughput and latency statistics grouped by batch size.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes = {}
+
+    def record(self, batch_size, run_seconds, latencies):
+        """
+        Record one executed batch
+        Args:
+            batch_size: Number of frames in the batch
+            run_seconds: Time spent running the batch job
+            latencies: End-to-end latency (queue wait + run) of every frame, in seconds
+        """
+        with self._lock:
+            entry = self._sizes.setdefault(batch_size, {
+                "batches": 0, "frames": 0, "run_s": 0.0, "latency_s": 0.0, "max_latency_s": 0.0,
+            })
+            entry["batches"] += 1
+            entry["frames"] += len(latencies)
+            entry["run_s"] += run_seconds
+            entry["latency_s"] += sum(latencies)
+            entry["max_latency_s"] = max(entry["max_latency_s"], max(latencies, default=0.0))
+
+    def snapshot(self):
+        """Return a JSON-friendly copy of the statistics, keyed by batch size"""
+        with self._lock:
+            report = {}
+            for size, entry in sorted(self._sizes.items()):
+                frames = entry["frames"]
+                report[str(size)] = {
+                    "batches": entry["batches"],
+                    "frames": frames,
+                    "throughput_fps": round(frames / entry["run_s"], 2) if entry["run_s"] else 0.0,
+                    "avg_run_ms": round(entry["run_s"] * 1000 / entry["batches"], 3),
+                    "avg_latency_ms": round(entry["latency_s"] * 1000 / frames, 3) if frames else 0.0,
+                    "max_latency_ms": round(entry["max_latency_s"] * 1000, 3),
+                }
+            return report
+
+
+class BatchScheduler:
+    """
+    Groups submitted items into batches of up to max_batch items, waiting at most
+    max_wait_ms after the first item of a batch arrives.
+
+    run_batch is an async callable that takes a list of items and returns a list
+    of results in the same order. Several batches may be in flight at once; the
+    inference pool behind run_batch provides the actual concurrency limit.
+    """
+
+    def __init__(self, run_batch, max_batch=8, max_wait_ms=5.0):
+        """
+        Initialize the scheduler
+        Args:
+            run_batch: Async callable mapping a list of items to a list of results
+            max_batch: Maximum number of items per batch
+            max_wait_ms: Maximum time to wait for a batch to fill up
+        """
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.stats = BatchStats()
+        self._queue = None
+        self._arrived = None
+        self._collector = None
+        self._inflight = set()
+
+    def _ensure_started(self):
+        # Start the collector lazily so it runs on the server's event loop
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._collector = asyncio.create_task(self._collect())
+
+    async def submit(self, item):
+        """
+        Queue an item for the next batch and wait for its result
+        """
+        if self.max_batch == 1:
+            # Batching disabled, run the item on its own
+            return (await self._run([(item, time.perf_counter(), None)], direct=True))[0]
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, time.perf_counter(), future))
+        self._arrived.set()
+        return await future
+
+    async def _collect(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                # Take items without awaiting the queue: a get() cancelled by a
+                # timeout can lose an item it already dequeued (Python < 3.12)
+                self._arrived.clear()
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch, direct=False):
+        items = [entry[0] for entry in batch]
+        start = time.perf_counter()
+        try:
+            results = await self.run_batch(items)
+        except Exception as e:
+            if direct:
+                raise
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return None
+
+        end = time.perf_counter()
+        self.stats.record(len(items), end - start, [end - entry[1] for entry in batch])
+        if direct:
+            return results
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        return results
+
+    def info(self):
+        """Return scheduler configuration and per-batch-size statistics"""
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batch_sizes": self.stats.snapshot(),
+        }
+
+    async def shutdown(self):
+        """Stop collecting new batches"""
+        if self._collector is not None:
+            self._collector.cancel()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the detector preprocessing pipeline.
+Compares the original per-frame preprocessing (copy, convertScaleAbs, resize,
+cvtColor, divide) with the buffer-reusing FramePreprocessor, reporting time and
+bytes allocated per stage on images from the test set.
+"""
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+import cv2
+import numpy as np
+from preprocessing import FramePreprocessor, letterbox
+
+def legacy_stages(imgsz):
+    """Stages of the original YOLODetector preprocessing"""
+    return [
+        ("copy", lambda s: s.update(enhanced=s["frame"].copy())),
+        ("convertScaleAbs", lambda s: s.update(enhanced=cv2.convertScaleAbs(s["enhanced"], alpha=1.05, beta=3))),
+        # Material classification path
+        ("cls: resize 224", lambda s: s.update(resized=cv2.resize(s["enhanced"], (224, 224)))),
+        ("cls: cvtColor", lambda s: s.update(rgb=cv2.cvtColor(s["resized"], cv2.COLOR_BGR2RGB))),
+        ("cls: /255 (float64)", lambda s: s.update(normalized=s["rgb"] / 255.0)),
+        ("cls: reshape", lambda s: s.update(features=s["normalized"].reshape(1, -1))),
+        # Detection path (letterbox + NCHW float tensor)
+        ("det: letterbox", lambda s: s.update(padded=letterbox(s["enhanced"], imgsz)[0])),
+        ("det: to tensor", lambda s: s.update(
+            tensor=(s["padded"][:, :, ::-1].transpose(2, 0, 1)[np.newaxis] / 255.0).astype(np.float32))),
+    ]
+
+def reusable_stages(imgsz):
+    """Stages of the FramePreprocessor pipeline"""
+    pre = FramePreprocessor(imgsz=imgsz)
+    pre._ensure_capacity(1)
+
+    def normalize(s):
+        tensor = pre._batch[0]
+        tensor[...] = s["canvas"].transpose(2, 0, 1)[::-1]
+        tensor *= np.float32(1.0 / 255.0)
+
+    return [
+        ("cls: features (resize+LUT+RGB+scale)", lambda s: pre.classification_features([s["frame"]])),
+        ("det: letterbox + LUT", lambda s: s.update(canvas=pre.letterbox_into(s["frame"], 0)[0])),
+        ("det: to tensor", normalize),
+    ]
+
+def run_stages(stages, frames, repeats):
+    """
+    Time every stage over all frames, then measure its allocations with tracemalloc
+    Returns a list of (stage, microseconds per frame, bytes allocated per frame)
+    """
+    states = [{"frame": frame} for frame in frames]
+    # Warm-up pass so one-time buffer allocations are not counted
+    for state in states:
+        for _, fn in stages:
+            fn(state)
+
+    timings = {name: 0 for name, _ in stages}
+    for _ in range(repeats):
+        for state in states:
+            for name, fn in stages:
+                start = time.perf_counter_ns()
+                fn(state)
+                timings[name] += time.perf_counter_ns() - start
+
+    allocations = {name: 0 for name, _ in stages}
+    tracemalloc.start()
+    for state in states:
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(state)
+            allocations[name] += max(0, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    count = repeats * len(frames)
+    return [(name, timings[name] / count / 1000.0, allocations[name] / len(frames)) for name, _ in stages]
+
+def print_report(title, rows):
+    print(f"\n{title}")
+    print(f"{'Stage':<40}{'us/frame':>12}{'KiB alloc/frame':>18}")
+    print("-" * 70)
+    for name, us, nbytes in rows:
+        print(f"{name:<40}{us:>12.1f}{nbytes / 1024:>18.1f}")
+    total_us = sum(r[1] for r in rows)
+    total_bytes = sum(r[2] for r in rows)
+    print("-" * 70)
+    print(f"{'Total':<40}{total_us:>12.1f}{total_bytes / 1024:>18.1f}")
+    return total_us, total_bytes
+
+def main():
+    """
+    Main function to parse arguments and run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Benchmark detector preprocessing")
+    parser.add_argument("--images", type=str, default="DATASET/test/images",
+                      help="Directory with sample images (default: DATASET/test/images)")
+    parser.add_argument("--count", type=int, default=20,
+                      help="Number of images to use (default: 20)")
+    parser.add_argument("--repeats", type=int, default=20,
+                      help="Timing repetitions per image (default: 20)")
+    parser.add_argument("--imgsz", type=int, default=640,
+                      help="Detection input size (default: 640)")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.images).glob("*.jpg"))[:args.count]
+    frames = [f for f in (cv2.imread(str(p)) for p in paths) if f is not None]
+    if not frames:
+        print(f"Error: No images found in {args.images}")
+        return
+
+    print(f"Benchmarking preprocessing on {len(frames)} images x {args.repeats} repeats "
+          f"(frame size {frames[0].shape[1]}x{frames[0].shape[0]}, imgsz {args.imgsz})")
+    legacy_us, legacy_bytes = print_report("Original pipeline", run_stages(legacy_stages(args.imgsz), frames, args.repeats))
+    new_us, new_bytes = print_report("FramePreprocessor (reused buffers)", run_stages(reusable_stages(args.imgsz), frames, args.repeats))
+
+    print(f"\nSpeedup: {legacy_us / new_us:.2f}x, allocations: "
+          f"{legacy_bytes / 1024:.0f} KiB -> {new_bytes / 1024:.0f} KiB per frame")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the /ws/detect response encodings.
+Builds typical detection responses (empty scene, a few items, a mixed-waste pile)
+and reports bytes and encoding time per message for every available format:
+json (standard library), json (orjson, if installed), msgpack (if installed) and
+the packed binary layout.
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import response_protocol
+from response_protocol import encode_packed
+
+CLASS_NAMES = {0: "Plastic", 1: "Paper", 2: "Glass", 3: "Metal", 4: "Cardboard", 5: "Organic", 6: "Other"}
+
+def make_response(count, rng):
+    """A response dict shaped like the server's, with count tracked detections"""
+    detections = []
+    for i in range(count):
+        x1, y1 = rng.uniform(0, 1100), rng.uniform(0, 600)
+        class_id = int(rng.integers(0, len(CLASS_NAMES)))
+        detections.append({
+            "class_id": class_id,
+            "class_name": CLASS_NAMES[class_id],
+            "confidence": round(float(rng.uniform(0.25, 1.0)), 4),
+            "recyclable": False,
+            "bbox": [x1, y1, x1 + rng.uniform(20, 180), y1 + rng.uniform(20, 120)],
+            "track_id": i + 1,
+        })
+    best = max(detections, key=lambda d: d["confidence"], default=None)
+    return {
+        "detections": detections,
+        "recyclable_detected": best is not None,
+        "last_detection": {
+            "detected": best is not None,
+            "class": best["class_name"] if best else None,
+            "confidence": best["confidence"] if best else 0.0,
+            "recyclable": False,
+        },
+        "timings_ms": {"decode": 3.1, "preprocess": 1.2, "predict": 41.7, "postprocess": 0.4},
+        "dropped_frames": 0,
+        "total_dropped_frames": 12,
+        "imgsz": 640,
+        "temporal": {"skipped": False, "skip_rate": 0.4213},
+        "frame": {"id": 1234, "timestamp": 1718000000000.0, "width": 1280, "height": 720, "format": "jpeg"},
+    }
+
+def encoders():
+    """(name, encode function) for every format available here"""
+    class_ids = {name: class_id for class_id, name in CLASS_NAMES.items()}
+    result = [("json (stdlib)", json.dumps)]
+    if response_protocol.orjson is not None:
+        orjson = response_protocol.orjson
+        result.append(("json (orjson)", lambda r: orjson.dumps(r, option=orjson.OPT_SERIALIZE_NUMPY).decode()))
+    if response_protocol.msgpack is not None:
+        msgpack = response_protocol.msgpack
+        result.append(("msgpack", lambda r: msgpack.packb(r, use_bin_type=True)))
+    result.append(("packed", lambda r: encode_packed(r, class_ids)))
+    return result
+
+def time_encoder(encode, responses, repeats):
+    """Microseconds per message and average encoded size in bytes"""
+    for response in responses:
+        encode(response)
+    start = time.perf_counter_ns()
+    for _ in range(repeats):
+        for response in responses:
+            encode(response)
+    elapsed = time.perf_counter_ns() - start
+    size = sum(len(encode(response)) for response in responses) / len(responses)
+    return elapsed / (repeats * len(responses)) / 1000.0, size
+
+def main():
+    """
+    Main function to parse arguments and run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Benchmark /ws/detect response encodings")
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 3, 50],
+                      help="Detections per response to test (default: 0 3 50)")
+    parser.add_argument("--samples", type=int, default=50,
+                      help="Different responses per count (default: 50)")
+    parser.add_argument("--repeats", type=int, default=200,
+                      help="Timing repetitions per response (default: 200)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    available = encoders()
+    missing = [name for name in ("orjson", "msgpack") if getattr(response_protocol, name) is None]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}")
+
+    for count in args.counts:
+        responses = [make_response(count, rng) for _ in range(args.samples)]
+        print(f"\n{count} detections per response")
+        print(f"{'Format':<16}{'bytes/msg':>12}{'us/msg':>10}{'size vs json':>14}")
+        print("-" * 52)
+        baseline = None
+        for name, encode in available:
+            us, size = time_encoder(encode, responses, args.repeats)
+            baseline = baseline or size
+            print(f"{name:<16}{size:>12.0f}{us:>10.1f}{size / baseline:>13.0%}")
+
+if __name__ == "__main__":
+    main()
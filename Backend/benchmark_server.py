@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Load generator and benchmark for the recycling detection server.
+Replays test images over N concurrent WebSocket clients to /ws/detect at a fixed
+frame rate while polling /api/recyclable-status, then reports end-to-end latency
+percentiles, throughput, dropped frames, response size and server CPU/RSS. Results
+are saved as JSON so runs on different commits (or response formats) can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+import requests
+import websockets
+from frame_protocol import encode_frame, FORMAT_JPEG
+from response_protocol import decode_packed
+
+try:
+    import psutil
+    HAVE_PSUTIL = True
+except ImportError:
+    HAVE_PSUTIL = False
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize_latencies(latencies_ms):
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": sum(latencies_ms) / len(latencies_ms) if latencies_ms else None,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": max(latencies_ms) if latencies_ms else None,
+    }
+
+class RunStats:
+    """Counters shared by all simulated clients"""
+
+    def __init__(self):
+        self.measuring = False
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.server_dropped = 0
+        self.cached = 0
+        self.unanswered = 0
+        self.latencies_ms = []
+        self.status_latencies_ms = []
+        self.status_errors = 0
+        self.response_bytes = 0
+
+def parse_reply(message):
+    """
+    Normalize a detection response in any response format to a dict with
+    "error", "frame_id", "dropped_frames" and "cached" (None for the one-time class table)
+    """
+    if isinstance(message, bytes):
+        if message[:2] == b"RR":
+            reply = decode_packed(message)
+            return {"error": None, "frame_id": reply["frame_id"], "dropped_frames": reply["dropped_frames"],
+                    "cached": reply["cached"]}
+        import msgpack
+        reply = msgpack.unpackb(message)
+    else:
+        reply = json.loads(message)
+        if "classes" in reply:
+            return None
+    frame = reply.get("frame")
+    return {"error": reply.get("error"), "frame_id": frame["id"] if frame else None,
+            "dropped_frames": reply.get("dropped_frames", 0), "cached": bool(reply.get("cached"))}
+
+async def run_binary_client(uri, images, fps, stats, stop_at):
+    """
+    Open-loop client: sends binary frames at a fixed rate and matches replies to
+    frames through the echoed frame id
+    """
+    interval = 1.0 / fps
+    sent_times = {}
+    async with websockets.connect(uri, max_size=None) as ws:
+        async def receiver():
+            async for message in ws:
+                now = time.perf_counter()
+                reply = parse_reply(message)
+                if reply is None or not stats.measuring:
+                    continue
+                stats.response_bytes += len(message)
+                if reply["error"]:
+                    stats.errors += 1
+                if reply["frame_id"] in sent_times:
+                    stats.received += 1
+                    stats.latencies_ms.append((now - sent_times.pop(reply["frame_id"])) * 1000.0)
+                stats.server_dropped += reply["dropped_frames"] or 0
+                stats.cached += reply["cached"]
+
+        receive_task = asyncio.create_task(receiver())
+        frame_id = 0
+        next_send = time.perf_counter()
+        try:
+            while time.perf_counter() < stop_at:
+                image_bytes, width, height = images[frame_id % len(images)]
+                message = encode_frame(image_bytes, frame_id, width, height, FORMAT_JPEG)
+                if stats.measuring:
+                    sent_times[frame_id] = time.perf_counter()
+                    stats.sent += 1
+                await ws.send(message)
+                frame_id += 1
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+            # Give in-flight frames a moment to come back
+            await asyncio.sleep(1.0)
+        finally:
+            receive_task.cancel()
+            stats.unanswered += len(sent_times)
+
+async def run_text_client(uri, images, fps, stats, stop_at):
+    """
+    Closed-loop client for the legacy base64 text mode: waits for each reply
+    before sending the next frame (at most fps frames per second)
+    """
+    import base64
+    interval = 1.0 / fps
+    encoded = ["data:image/jpeg;base64," + base64.b64encode(img).decode("ascii") for img, _, _ in images]
+    async with websockets.connect(uri, max_size=None) as ws:
+        index = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            await ws.send(encoded[index % len(encoded)])
+            reply = None
+            while reply is None:
+                message = await ws.recv()
+                reply = parse_reply(message)
+            elapsed = time.perf_counter() - start
+            if stats.measuring:
+                stats.sent += 1
+                stats.received += 1
+                stats.response_bytes += len(message)
+                stats.latencies_ms.append(elapsed * 1000.0)
+                if reply["error"]:
+                    stats.errors += 1
+                stats.cached += reply["cached"]
+            index += 1
+            await asyncio.sleep(max(0.0, interval - elapsed))
+
+async def run_status_poller(url, rate, stats, stop_at):
+    """Poll the REST status endpoint like the game client does"""
+    session = requests.Session()
+    interval = 1.0 / rate
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            response = await asyncio.to_thread(session.get, url, timeout=5)
+            response.raise_for_status()
+            if stats.measuring:
+                stats.status_latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        except Exception:
+            if stats.measuring:
+                stats.status_errors += 1
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+async def sample_server_resources(pid, stop_at, samples):
+    """Sample server CPU (% of one core) and RSS once per second"""
+    process = psutil.Process(pid)
+    children = lambda: [process] + process.children(recursive=True)
+    for p in children():
+        p.cpu_percent(None)
+    while time.perf_counter() < stop_at:
+        await asyncio.sleep(1.0)
+        try:
+            procs = children()
+            samples.append({
+                "cpu_percent": sum(p.cpu_percent(None) for p in procs),
+                "rss_mb": sum(p.memory_info().rss for p in procs) / (1024 * 1024),
+            })
+        except psutil.Error:
+            break
+
+def load_images(image_dir, limit):
+    """Load encoded JPEG bytes (and their size) from the test set"""
+    import cv2
+    images = []
+    for path in sorted(Path(image_dir).glob("*.jpg"))[:limit]:
+        data = path.read_bytes()
+        img = cv2.imread(str(path))
+        if img is not None:
+            images.append((data, img.shape[1], img.shape[0]))
+    return images
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+async def run_benchmark(args, images):
+    stats = RunStats()
+    resources = []
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+    ws_uri = f"ws://{args.host}:{args.port}/ws/detect?format={args.format}"
+    status_url = f"http://{args.host}:{args.port}/api/recyclable-status"
+
+    client = run_binary_client if args.mode == "binary" else run_text_client
+    tasks = [asyncio.create_task(client(ws_uri, images[i % len(images):] + images[:i % len(images)],
+                                        args.fps, stats, stop_at))
+             for i in range(args.clients)]
+    tasks += [asyncio.create_task(run_status_poller(status_url, args.status_rate, stats, stop_at))
+              for _ in range(args.status_pollers)]
+    if args.server_pid and HAVE_PSUTIL:
+        tasks.append(asyncio.create_task(sample_server_resources(args.server_pid, stop_at, resources)))
+
+    await asyncio.sleep(max(0.0, measure_from - time.perf_counter()))
+    stats.measuring = True
+    measure_start = time.perf_counter()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = min(time.perf_counter(), stop_at) - measure_start
+    failures = [r for r in results if isinstance(r, Exception)]
+    for failure in failures:
+        print(f"Client failed: {failure}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "mode": args.mode, "format": args.format, "clients": args.clients, "fps_per_client": args.fps,
+            "duration_s": args.duration, "warmup_s": args.warmup,
+            "status_pollers": args.status_pollers, "status_rate": args.status_rate,
+            "images": len(images),
+        },
+        "frames": {
+            "sent": stats.sent,
+            "answered": stats.received,
+            "errors": stats.errors,
+            "dropped_by_server": stats.server_dropped,
+            "cached": stats.cached,
+            "unanswered": stats.unanswered,
+            "throughput_fps": stats.received / elapsed if elapsed > 0 else 0.0,
+            "avg_response_bytes": stats.response_bytes / stats.received if stats.received else None,
+        },
+        "latency": summarize_latencies(stats.latencies_ms),
+        "status_polls": dict(summarize_latencies(stats.status_latencies_ms), errors=stats.status_errors),
+        "client_failures": len(failures),
+    }
+    if resources:
+        report["server"] = {
+            "cpu_percent_avg": sum(s["cpu_percent"] for s in resources) / len(resources),
+            "cpu_percent_max": max(s["cpu_percent"] for s in resources),
+            "rss_mb_avg": sum(s["rss_mb"] for s in resources) / len(resources),
+            "rss_mb_max": max(s["rss_mb"] for s in resources),
+        }
+    return report
+
+def print_report(report):
+    frames, latency = report["frames"], report["latency"]
+    fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+    print(f"\n{'='*50}")
+    print(f"Benchmark results (commit {report['commit'] or 'unknown'})")
+    print(f"- Frames sent/answered: {frames['sent']} / {frames['answered']}")
+    print(f"- Throughput:           {frames['throughput_fps']:.2f} FPS")
+    print(f"- Dropped by server:    {frames['dropped_by_server']}  (unanswered: {frames['unanswered']}, errors: {frames['errors']})")
+    print(f"- Latency p50/p95/p99:  {fmt(latency['p50_ms'])} / {fmt(latency['p95_ms'])} / {fmt(latency['p99_ms'])} ms")
+    print(f"- Avg response size:    {fmt(frames['avg_response_bytes'])} bytes ({report['config'].get('format', 'json')})")
+    if frames.get("cached"):
+        print(f"- WARNING: {frames['cached']} replies came from the server's result cache, so latency and "
+              f"throughput do not measure inference. Restart the server with RESULT_CACHE_SIZE=0")
+    status = report["status_polls"]
+    print(f"- Status polls:         {status['count']} (p95 {fmt(status['p95_ms'])} ms, errors {status['errors']})")
+    if "server" in report:
+        server = report["server"]
+        print(f"- Server CPU avg/max:   {server['cpu_percent_avg']:.0f}% / {server['cpu_percent_max']:.0f}%")
+        print(f"- Server RSS avg/max:   {server['rss_mb_avg']:.0f} / {server['rss_mb_max']:.0f} MB")
+    print(f"{'='*50}")
+
+def compare_reports(baseline, current, tolerance):
+    """
+    Flag regressions against a baseline report.
+    Returns a list of human-readable regression messages.
+    """
+    checks = [
+        ("latency p50", baseline["latency"]["p50_ms"], current["latency"]["p50_ms"], True),
+        ("latency p95", baseline["latency"]["p95_ms"], current["latency"]["p95_ms"], True),
+        ("latency p99", baseline["latency"]["p99_ms"], current["latency"]["p99_ms"], True),
+        ("throughput", baseline["frames"]["throughput_fps"], current["frames"]["throughput_fps"], False),
+    ]
+    if "server" in baseline and "server" in current:
+        checks.append(("server CPU", baseline["server"]["cpu_percent_avg"], current["server"]["cpu_percent_avg"], True))
+        checks.append(("server RSS", baseline["server"]["rss_mb_max"], current["server"]["rss_mb_max"], True))
+
+    regressions = []
+    print(f"\nComparison with baseline (commit {baseline.get('commit') or 'unknown'}):")
+    for name, old, new, lower_is_better in checks:
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        marker = "REGRESSION" if worse else "ok"
+        print(f"- {name:<12} {old:>10.2f} -> {new:>10.2f} ({change:+.1%}) {marker}")
+        if worse:
+            regressions.append(f"{name} changed by {change:+.1%}")
+    return regressions
+
+def main():
+    """
+    Main function to parse arguments and run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the recycling detection server")
+    parser.add_argument("--host", type=str, default="localhost",
+                      help="Server host (default: localhost)")
+    parser.add_argument("--port", type=int, default=8080,
+                      help="Server port (default: 8080)")
+    parser.add_argument("--clients", type=int, default=4,
+                      help="Number of concurrent WebSocket clients (default: 4)")
+    parser.add_argument("--fps", type=float, default=5.0,
+                      help="Frames per second sent by each client (default: 5, like the demo page)")
+    parser.add_argument("--mode", type=str, default="binary", choices=["binary", "text"],
+                      help="Frame protocol (default: binary)")
+    parser.add_argument("--format", type=str, default="json", choices=["json", "msgpack", "packed"],
+                      help="Response format requested from the server (default: json)")
+    parser.add_argument("--duration", type=float, default=30.0,
+                      help="Measured duration in seconds (default: 30)")
+    parser.add_argument("--warmup", type=float, default=5.0,
+                      help="Warm-up seconds excluded from the results (default: 5)")
+    parser.add_argument("--status-pollers", type=int, default=1,
+                      help="Concurrent /api/recyclable-status pollers (default: 1)")
+    parser.add_argument("--status-rate", type=float, default=2.0,
+                      help="Polls per second per poller (default: 2)")
+    parser.add_argument("--images", type=str, default="DATASET/test/images",
+                      help="Images to replay (default: DATASET/test/images)")
+    parser.add_argument("--max-images", type=int, default=100,
+                      help="Maximum number of images to load (default: 100)")
+    parser.add_argument("--server-pid", type=int, default=None,
+                      help="PID of the server process for CPU/RSS sampling (requires psutil)")
+    parser.add_argument("--output", type=str, default=None,
+                      help="Write the results as JSON to this file")
+    parser.add_argument("--compare", type=str, default=None,
+                      help="Baseline JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                      help="Relative change counted as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.max_images)
+    if not images:
+        print(f"Error: No images found in {args.images}")
+        sys.exit(2)
+    if args.server_pid and not HAVE_PSUTIL:
+        print("psutil not available, server CPU/RSS will not be sampled")
+
+    print(f"Benchmarking ws://{args.host}:{args.port}/ws/detect with {args.clients} clients at "
+          f"{args.fps} FPS ({args.mode} mode, {args.format} responses) for {args.duration}s after {args.warmup}s warm-up...")
+    report = asyncio.run(run_benchmark(args, images))
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) detected: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions detected.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline bulk inference for archives of bin-camera images.
+Streams images from a directory, a tar archive (optionally compressed) or a zip
+file and hands them to a process pool in batches. Every worker process owns a
+detector, decodes its batch and runs detection, and sends back only the result
+records. The results are appended to a JSONL file or a Parquet dataset as they arrive.
+
+Memory stays flat regardless of the input size: files are read lazily, at most
+--max-pending images are in flight at any time, and results are written as
+batches finish (Parquet in small parts that are only renamed into place once
+complete). With --resume, images already present in the output are skipped, so
+an interrupted run continues where it stopped.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
+from preprocessing import FramePreprocessor
+from yolo_backends import BACKENDS, default_model_path, load_exported_model
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+# Trained model written by train_model.py, preferred over the pretrained yolov10n.pt
+TRAINED_TORCH_MODEL = os.path.join("models", "recyclables.pt")
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def iter_directory(root):
+    """Yield (relative path, bytes) for every image below root, directory by directory"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if is_image(filename):
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    yield os.path.relpath(path, root), f.read()
+
+def iter_tar(path):
+    """Yield (member name, bytes) for every image in a tar archive, read as a stream"""
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and is_image(member.name):
+                yield member.name, archive.extractfile(member).read()
+
+def iter_zip(path):
+    """Yield (member name, bytes) for every image in a zip file"""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_image(info.filename):
+                yield info.filename, archive.read(info)
+
+def iter_images(source):
+    """Pick the reader for a directory, tar or zip source"""
+    if os.path.isdir(source):
+        return iter_directory(source)
+    if zipfile.is_zipfile(source):
+        return iter_zip(source)
+    if tarfile.is_tarfile(source):
+        return iter_tar(source)
+    raise ValueError(f"{source} is not a directory, tar or zip file")
+
+class Detector:
+    """
+    Batch detector over the torch (Ultralytics) or exported ONNX/OpenVINO models,
+    returning per-frame (boxes, scores, class_ids) arrays in frame coordinates.
+    Frames are letterboxed and enhanced like the server does for every backend.
+    """
+
+    def __init__(self, backend, model_path, imgsz=640, conf=0.25, iou=0.45, threads=0):
+        self.backend = backend
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        if backend == "torch":
+            from ultralytics import YOLO
+            if threads:
+                import torch
+                torch.set_num_threads(threads)
+            self.model = YOLO(str(model_path))
+            self.names = dict(self.model.names)
+            self.preprocessor = FramePreprocessor(imgsz)
+        else:
+            self.model = load_exported_model(backend, model_path, imgsz=imgsz, threads=threads)
+            self.names = dict(self.model.names)
+
+    def __call__(self, frames):
+        if self.backend != "torch":
+            return self.model.predict(frames, conf=self.conf, iou=self.iou)
+        import torch
+        batch, metas = self.preprocessor.detection_batch(frames)
+        results = self.model.predict(torch.from_numpy(batch), imgsz=self.imgsz, conf=self.conf, iou=self.iou,
+                                     verbose=False)
+        outputs = []
+        for result, (ratio, (pad_x, pad_y), (h, w)) in zip(results, metas):
+            # Letterbox to frame coordinates
+            boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32)
+            boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / ratio).clip(0, w)
+            boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / ratio).clip(0, h)
+            outputs.append((boxes, result.boxes.conf.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(np.int64)))
+        return outputs
+
+def to_record(name, frame, output, names):
+    """One output row: file name, image size and its detections (or an error)"""
+    if frame is None:
+        return {"file": name, "width": None, "height": None, "error": "decode failed", "detections": []}
+    boxes, scores, class_ids = output
+    detections = [
+        {"class_id": class_id, "class_name": names.get(class_id, str(class_id)),
+         "confidence": round(score, 4), "bbox": [round(v, 1) for v in box]}
+        for box, score, class_id in zip(boxes.tolist(), scores.tolist(), class_ids.tolist())
+    ]
+    return {"file": name, "width": frame.shape[1], "height": frame.shape[0], "error": None, "detections": detections}
+
+_worker_detector = None
+
+def init_worker(backend, model_path, imgsz, conf, threads):
+    """Pool initializer: load this worker process's detector"""
+    global _worker_detector
+    # One OpenCV thread per worker process, the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _worker_detector = Detector(backend, model_path, imgsz, conf, threads=threads)
+
+def detect_batch(batch):
+    """
+    Pool job: decode and detect a batch of (name, bytes). Only the records go back
+    to the parent, never the decoded frames.
+    Returns (records, decode seconds, inference seconds)
+    """
+    start = time.perf_counter()
+    decoded = [(name, cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)) for name, data in batch]
+    decode_seconds = time.perf_counter() - start
+    frames = [frame for _, frame in decoded if frame is not None]
+    start = time.perf_counter()
+    outputs = iter(_worker_detector(frames)) if frames else iter(())
+    inference_seconds = time.perf_counter() - start
+    records = [to_record(name, frame, next(outputs) if frame is not None else None, _worker_detector.names)
+               for name, frame in decoded]
+    return records, decode_seconds, inference_seconds
+
+class JsonlWriter:
+    """Appends one JSON line per image, flushed after every batch"""
+
+    def __init__(self, path, resume):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done = set()
+        if resume and self.path.exists():
+            self.done = self._load_done()
+        self._file = open(self.path, "a" if resume else "w")
+
+    def _load_done(self):
+        # A crash can leave a partial last line: keep only complete records
+        good_size = 0
+        done = set()
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["file"])
+                except (ValueError, KeyError):
+                    break
+                good_size += len(line)
+        with open(self.path, "rb+") as f:
+            f.truncate(good_size)
+        return done
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class ParquetWriter:
+    """
+    Writes a Parquet dataset directory in small parts of part_rows rows. A part
+    is written to a .tmp file and renamed once complete (Parquet only writes its
+    footer on close), so a crash loses at most the rows not yet in a part and
+    never leaves an unreadable part; resume only trusts renamed parts.
+    """
+
+    def __init__(self, path, resume, part_rows=1000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.part_rows = part_rows
+        # Unfinished parts of an interrupted run
+        for tmp in self.path.glob("part-*.parquet.tmp"):
+            tmp.unlink()
+        parts = sorted(self.path.glob("part-*.parquet"))
+        self.done = set()
+        if resume:
+            for part in parts:
+                self.done.update(pq.read_table(part, columns=["file"]).column("file").to_pylist())
+        else:
+            for part in parts:
+                part.unlink()
+        self._next_part = int(parts[-1].stem.split("-")[1]) + 1 if resume and parts else 0
+        self._rows = []
+        detection = pa.struct([("class_id", pa.int32()), ("class_name", pa.string()),
+                               ("confidence", pa.float32()), ("bbox", pa.list_(pa.float32(), 4))])
+        self.schema = pa.schema([("file", pa.string()), ("width", pa.int32()), ("height", pa.int32()),
+                                 ("error", pa.string()), ("detections", pa.list_(detection))])
+
+    def write(self, records):
+        self._rows.extend(records)
+        if len(self._rows) >= self.part_rows:
+            self._write_part()
+
+    def _write_part(self):
+        if not self._rows:
+            return
+        part = self.path / f"part-{self._next_part:05d}.parquet"
+        tmp = part.with_name(part.name + ".tmp")
+        self.pq.write_table(self.pa.Table.from_pylist(self._rows, schema=self.schema), str(tmp))
+        os.replace(tmp, part)
+        self._next_part += 1
+        self._rows = []
+
+    def close(self):
+        self._write_part()
+
+def create_writer(output, output_format, resume, part_rows=1000):
+    if output_format is None:
+        output_format = "parquet" if not str(output).endswith(".jsonl") else "jsonl"
+    if output_format == "parquet":
+        return ParquetWriter(output, resume, part_rows)
+    return JsonlWriter(output, resume)
+
+class Throughput:
+    """
+    Progress and time split: decode and inference are summed over the worker
+    processes, wait is the time the parent spent waiting for results
+    """
+
+    def __init__(self, interval=10.0):
+        self.start = time.perf_counter()
+        self.interval = interval
+        self.last_report = self.start
+        self.images = 0
+        self.failed = 0
+        self.skipped = 0
+        self.seconds = {"decode": 0.0, "inference": 0.0, "wait": 0.0, "write": 0.0}
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        elapsed = now - self.start
+        rate = self.images / elapsed if elapsed > 0 else 0.0
+        split = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.seconds.items())
+        print(f"{self.images} images ({self.failed} failed, {self.skipped} skipped) in {elapsed:.1f}s: "
+              f"{rate:.1f} img/s [{split}]", flush=True)
+
+def default_bulk_model(backend):
+    """Default model for a backend: the trained model for torch when there is one"""
+    if backend == "torch" and os.path.exists(TRAINED_TORCH_MODEL):
+        return TRAINED_TORCH_MODEL
+    return default_model_path(backend)
+
+def run(args):
+    source = iter_images(args.input)
+    writer = create_writer(args.output, args.format, args.resume, args.part_rows)
+    if writer.done:
+        print(f"Resuming: {len(writer.done)} images already in {args.output}")
+    model_path = args.model or default_bulk_model(args.backend)
+    print(f"Loading {args.backend} model {model_path} in {args.workers} worker processes...")
+
+    stats = Throughput(args.report_interval)
+    pending = deque()
+    # Batches in flight; a bounded window keeps memory flat
+    max_batches = max(1, args.max_pending // args.batch_size)
+
+    def drain_one():
+        start = time.perf_counter()
+        records, decode_seconds, inference_seconds = pending.popleft().result()
+        stats.seconds["wait"] += time.perf_counter() - start
+        stats.seconds["decode"] += decode_seconds
+        stats.seconds["inference"] += inference_seconds
+        start = time.perf_counter()
+        writer.write(records)
+        stats.seconds["write"] += time.perf_counter() - start
+        stats.images += len(records)
+        stats.failed += sum(record["error"] is not None for record in records)
+        stats.report()
+
+    initargs = (args.backend, str(model_path), args.imgsz, args.conf, args.threads)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=initargs) as pool:
+        try:
+            batch = []
+            for count, (name, data) in enumerate(source):
+                if args.limit and count >= args.limit:
+                    break
+                if name in writer.done:
+                    stats.skipped += 1
+                    continue
+                batch.append((name, data))
+                if len(batch) >= args.batch_size:
+                    pending.append(pool.submit(detect_batch, batch))
+                    batch = []
+                    while len(pending) > max_batches:
+                        drain_one()
+            if batch:
+                pending.append(pool.submit(detect_batch, batch))
+            while pending:
+                drain_one()
+        finally:
+            writer.close()
+
+    stats.report(force=True)
+    return stats
+
+def main():
+    """
+    Main function to parse arguments and run bulk inference
+    """
+    parser = argparse.ArgumentParser(description="Run the recycling detector over a directory, tar or zip of images")
+    parser.add_argument("input", type=str,
+                      help="Directory, tar (.tar, .tar.gz, ...) or zip file with images")
+    parser.add_argument("--output", type=str, default="bulk_results.jsonl",
+                      help="Output .jsonl file or Parquet dataset directory (default: bulk_results.jsonl)")
+    parser.add_argument("--format", type=str, default=None, choices=["jsonl", "parquet"],
+                      help="Output format (default: jsonl for *.jsonl outputs, else parquet)")
+    parser.add_argument("--backend", type=str, default="torch", choices=list(BACKENDS),
+                      help="Inference backend (default: torch)")
+    parser.add_argument("--model", type=str, default=None,
+                      help="Model path (default: models/recyclables.pt for torch if it exists, "
+                           "else the server's default for the backend)")
+    parser.add_argument("--imgsz", type=int, default=640,
+                      help="Model input size (default: 640)")
+    parser.add_argument("--conf", type=float, default=0.25,
+                      help="Confidence threshold (default: 0.25)")
+    parser.add_argument("--batch-size", type=int, default=16,
+                      help="Images per detector call (default: 16)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                      help="Worker processes, each decoding and running its own detector (default: half the CPUs)")
+    parser.add_argument("--threads", type=int, default=0,
+                      help="Inference threads per worker (default: CPU count / workers)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                      help="Images in flight at once (default: 2 x workers x batch size)")
+    parser.add_argument("--part-rows", type=int, default=1000,
+                      help="Rows per Parquet part file (default: 1000)")
+    parser.add_argument("--resume", action="store_true",
+                      help="Skip images already in the output and append to it")
+    parser.add_argument("--limit", type=int, default=None,
+                      help="Stop after this many input images")
+    parser.add_argument("--report-interval", type=float, default=10.0,
+                      help="Seconds between progress lines (default: 10)")
+    args = parser.parse_args()
+    args.max_pending = args.max_pending or 2 * args.workers * args.batch_size
+    args.threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    if not os.path.exists(args.input):
+        print(f"Error: {args.input} not found")
+        sys.exit(2)
+
+    stats = run(args)
+    elapsed = time.perf_counter() - stats.start
+    print(f"\nDone: {stats.images} images in {elapsed:.1f}s "
+          f"({stats.images / elapsed if elapsed > 0 else 0.0:.1f} img/s), results in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Ultralytics training on the pre-decoded dataset store (see dataset_cache.py).
+CachedDetectionTrainer builds its train and val datasets on top of the store, so
+data loader workers copy letterboxed pixels out of a shared memory map instead
+of decoding and resizing JPEGs. Augmentation (mosaic, HSV, flips, ...) is
+unchanged and still runs every epoch.
+
+EpochTimer records the wall time of every epoch to <run dir>/epoch_times.json,
+for training with or without the store, so runs can be compared.
+
+Run directly with the same key=value arguments as `yolo train` (this is what
+train_yolov10.py does):
+
+    python cached_training.py data=DATASET/data.yaml model=yolov10n.pt epochs=20 imgsz=640
+    python cached_training.py ... store=False                  # baseline, read the JPEGs
+    python cached_training.py ... compare_to=runs/detect/baseline/epoch_times.json
+"""
+
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from ultralytics import YOLO
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+from dataset_cache import prepare_store
+
+
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset whose images and labels come from a DatasetStore"""
+
+    def __init__(self, *args, store, **kwargs):
+        # Set before the base class runs get_img_files() / get_labels()
+        self.store = store
+        self.store_index = {str(path): i for i, path in enumerate(store.files)}
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        files = [str(path) for path in self.store.files]
+        if self.fraction < 1:
+            files = files[:round(len(files) * self.fraction)]
+        return files
+
+    def get_labels(self):
+        size = self.store.imgsz
+        labels = []
+        for im_file in self.im_files:
+            cls, bboxes = self.store.labels(self.store_index[im_file])
+            labels.append({
+                "im_file": im_file,
+                "shape": (size, size),
+                "cls": cls.copy(),
+                "bboxes": bboxes.copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        """Letterboxed image i from the store: (image, original hw, resized hw)"""
+        image = self.store.image(self.store_index[self.im_files[i]])
+        if self.augment:
+            # Mosaic/MixUp pick their extra images from the buffer
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return image, image.shape[:2], image.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """DetectionTrainer that prepares (or reuses) the dataset store of each split"""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        if not isinstance(img_path, (str, Path)):
+            print(f"Dataset store needs a single image directory per split, reading {mode} images from files")
+            return super().build_dataset(img_path, mode, batch)
+        cfg = self.args
+        store = prepare_store(img_path, cfg.imgsz)
+        stride = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return CachedYOLODataset(
+            store=store,
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=cfg,
+            rect=False,  # every stored image is already imgsz x imgsz
+            cache=None,  # the store replaces Ultralytics' RAM/disk image cache
+            single_cls=cfg.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=cfg.task,
+            classes=cfg.classes,
+            data=self.data,
+            fraction=cfg.fraction if mode == "train" else 1.0,
+        )
+
+
+def typical_epoch(epochs, key="train_seconds"):
+    """Median epoch time, leaving out the first epoch (warm-up) when there are more"""
+    values = [epoch[key] for epoch in epochs]
+    return statistics.median(values[1:] if len(values) > 1 else values) if values else 0.0
+
+
+class EpochTimer:
+    """
+    Training callbacks timing every epoch: the training pass (including data
+    loading and augmentation) and the whole epoch (including validation)
+    """
+
+    EVENTS = ("on_train_epoch_start", "on_train_epoch_end", "on_fit_epoch_end", "on_train_end")
+
+    def __init__(self, dataset, compare_to=None):
+        """
+        Initialize the timer
+        Args:
+            dataset: "store" or "files", recorded with the timings
+            compare_to: epoch_times.json of an earlier run to compare against at the end
+        """
+        self.dataset = dataset
+        self.compare_to = compare_to
+        self.epochs = []
+        self._epoch_start = None
+        self._train_seconds = None
+
+    def attach(self, model):
+        for event in self.EVENTS:
+            model.add_callback(event, getattr(self, event))
+
+    def on_train_epoch_start(self, trainer):
+        self._epoch_start = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer):
+        self._train_seconds = time.perf_counter() - self._epoch_start
+
+    def on_fit_epoch_end(self, trainer):
+        if self._epoch_start is None:
+            return
+        total = time.perf_counter() - self._epoch_start
+        self.epochs.append({"epoch": trainer.epoch + 1, "train_seconds": round(self._train_seconds, 3),
+                            "total_seconds": round(total, 3)})
+        print(f"Epoch {trainer.epoch + 1} ({self.dataset}): train {self._train_seconds:.1f}s, "
+              f"with validation {total:.1f}s")
+
+    def report(self, trainer):
+        args = trainer.args
+        return {
+            "dataset": self.dataset,
+            "imgsz": args.imgsz,
+            "batch": args.batch,
+            "workers": args.workers,
+            "device": str(trainer.device),
+            "cache": args.cache,
+            "median_train_seconds": round(typical_epoch(self.epochs), 3),
+            "median_total_seconds": round(typical_epoch(self.epochs, "total_seconds"), 3),
+            "epochs": self.epochs,
+        }
+
+    def on_train_end(self, trainer):
+        report = self.report(trainer)
+        path = Path(trainer.save_dir) / "epoch_times.json"
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nMedian epoch ({self.dataset}): train {report['median_train_seconds']:.1f}s, "
+              f"with validation {report['median_total_seconds']:.1f}s (saved to {path})")
+        if self.compare_to:
+            print_comparison(report, self.compare_to)
+
+
+def print_comparison(report, baseline_path):
+    """Print the epoch times of a run against an earlier run's epoch_times.json"""
+    try:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot compare epoch times with {baseline_path}: {e}")
+        return
+    print(f"\n{'Epoch time':<22} {baseline['dataset']:>10} {report['dataset']:>10} {'Speedup':>8}")
+    for key, label in (("median_train_seconds", "train (median, s)"), ("median_total_seconds", "with validation (s)")):
+        before, after = baseline[key], report[key]
+        speedup = f"{before / after:.2f}x" if after else "-"
+        print(f"{label:<22} {before:>10.1f} {after:>10.1f} {speedup:>8}")
+    for key in ("imgsz", "batch", "workers", "device"):
+        if baseline.get(key) != report.get(key):
+            print(f"Note: {key} differs ({baseline.get(key)} vs {report.get(key)})")
+
+
+def train(model, data, use_store=True, compare_to=None, **overrides):
+    """
+    Train a YOLO model, from the dataset store or from the image files, timing every epoch
+    Args:
+        model: ultralytics.YOLO instance
+        data: Path to the dataset yaml
+        use_store: Read images from the dataset store (prepared on first use)
+        compare_to: epoch_times.json of an earlier run to compare against
+        overrides: Further model.train() arguments
+    Returns the training results
+    """
+    timer = EpochTimer("store" if use_store else "files", compare_to)
+    timer.attach(model)
+    if use_store:
+        overrides["cache"] = False
+        return model.train(data=data, trainer=CachedDetectionTrainer, **overrides)
+    return model.train(data=data, **overrides)
+
+
+def parse_value(value):
+    """Convert a CLI value the way `yolo` does: ints, floats, booleans and None"""
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered == "none":
+        return None
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def main():
+    """
+    Main function to parse key=value arguments and train
+    """
+    overrides = {}
+    for argument in sys.argv[1:]:
+        key, sep, value = argument.partition("=")
+        if not sep:
+            print(f"Error: expected key=value, got {argument!r}")
+            sys.exit(2)
+        overrides[key] = parse_value(value)
+
+    model = YOLO(str(overrides.pop("model", "yolov10n.pt")))
+    data = overrides.pop("data", "DATASET/data.yaml")
+    use_store = overrides.pop("store", True)
+    compare_to = overrides.pop("compare_to", None)
+    train(model, str(data), use_store=use_store, compare_to=compare_to, **overrides)
+
+
+if __name__ == "__main__":
+    main()
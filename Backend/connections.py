@@ -0,0 +1,195 @@
+"""
+Connection registry and broadcast fan-out for the recycling detection server.
+Every push subscriber (/ws/status WebSocket or SSE stream) owns a bounded
+outgoing queue. A broadcast serializes its message once and only enqueues it,
+so it never waits on a socket; each WebSocket subscriber has its own sender task
+that drains the queue. A subscriber that cannot keep up is handled by the
+slow-consumer policy:
+
+    drop_oldest  the oldest queued message is discarded (default; status
+                 messages supersede each other, so the newest one matters)
+    disconnect   the subscriber is closed and unregistered
+"""
+
+import asyncio
+import logging
+from typing import Dict, Set
+
+from response_protocol import dumps_json
+
+log = logging.getLogger("recycling.connections")
+
+POLICIES = ("drop_oldest", "disconnect")
+
+
+class Subscriber:
+    """
+    One push subscriber: a bounded message queue, plus a sender task when it is
+    backed by a WebSocket (SSE subscribers are drained by their response instead)
+    """
+
+    def __init__(self, topic, websocket=None, max_queue=16, policy="drop_oldest", send_timeout=2.0, on_close=None):
+        """
+        Initialize the subscriber
+        Args:
+            topic: Topic the subscriber listens to
+            websocket: WebSocket to send to, or None for a queue drained by the caller
+            max_queue: Maximum queued messages
+            policy: Slow-consumer policy ("drop_oldest" or "disconnect")
+            send_timeout: Seconds a single send may take before the subscriber is dropped
+            on_close: Called with the subscriber once it is closed
+        """
+        self.topic = topic
+        self.websocket = websocket
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize=max(1, max_queue))
+        self._on_close = on_close
+        self._sender = asyncio.create_task(self._send_loop()) if websocket is not None else None
+
+    def offer(self, text):
+        """
+        Queue a message without waiting
+        Returns False if the subscriber is closed or was dropped as a slow consumer
+        """
+        if self.closed:
+            return False
+        if self._queue.full():
+            if self.policy == "disconnect":
+                self.close("slow consumer")
+                return False
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(text)
+        return True
+
+    async def get(self, timeout=None):
+        """Next queued message, or None after timeout seconds (for SSE responses)"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _send_loop(self):
+        try:
+            while True:
+                text = await self._queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.close(str(e) or type(e).__name__)
+
+    def close(self, reason=None):
+        """Stop the subscriber (idempotent); a WebSocket is closed in the background"""
+        if self.closed:
+            return
+        self.closed = True
+        if reason:
+            log.info("Dropped %s subscriber: %s", self.topic, reason)
+        if self._sender is not None and self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        if self.websocket is not None and reason:
+            # Close the socket so the client notices and reconnects
+            asyncio.ensure_future(self._close_socket())
+        if self._on_close is not None:
+            self._on_close(self, reason)
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), self.send_timeout)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """
+    Registry of /ws/detect connections (a set) and push subscribers (a dict of
+    topic -> set of Subscriber), all O(1) to add and remove.
+    """
+
+    def __init__(self, max_queue=16, policy="drop_oldest", send_timeout=2.0):
+        """
+        Initialize the manager
+        Args:
+            max_queue: Queued messages per subscriber
+            policy: Slow-consumer policy, see the module docstring
+            send_timeout: Seconds a WebSocket subscriber may take to accept one message
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy {policy!r} (expected one of {', '.join(POLICIES)})")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.active_connections: Set = set()
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self.dropped_subscribers = 0
+        self.dropped_messages = 0
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.add(websocket)
+
+    def disconnect(self, websocket):
+        self.active_connections.discard(websocket)
+
+    def subscribe(self, topic, websocket=None):
+        """
+        Register a push subscriber for a topic
+        Args:
+            websocket: Accepted WebSocket to push to, or None for an SSE queue
+        Returns the Subscriber
+        """
+        subscriber = Subscriber(topic, websocket, self.max_queue, self.policy, self.send_timeout,
+                                on_close=self._closed)
+        self.topics.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+
+    def _closed(self, subscriber, reason):
+        self.dropped_messages += subscriber.dropped
+        if reason:
+            self.dropped_subscribers += 1
+        subscribers = self.topics.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[subscriber.topic]
+
+    @property
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self.topics.values())
+
+    def broadcast(self, message, topic):
+        """
+        Queue a message for every subscriber of a topic. The message is serialized
+        once and never awaited per subscriber, so a stalled or failing client
+        cannot hold up the others.
+        Returns the number of subscribers the message was queued for
+        """
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return 0
+        text = dumps_json(message)
+        # Copy: a slow consumer may be unregistered while iterating
+        return sum(subscriber.offer(text) for subscriber in list(subscribers))
+
+    def info(self):
+        return {
+            "subscribers": self.subscriber_count,
+            "topics": len(self.topics),
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "dropped_subscribers": self.dropped_subscribers,
+            "dropped_messages": self.dropped_messages + sum(
+                subscriber.dropped for subscribers in self.topics.values() for subscriber in subscribers),
+        }
+
+    def close(self):
+        for subscribers in list(self.topics.values()):
+            for subscriber in list(subscribers):
+                subscriber.close()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Pre-decoded training dataset store.
+Decodes and letterboxes every image of a dataset split once, into a memory-mapped
+uint8 array (N x imgsz x imgsz x 3) next to a label index, so training epochs read
+ready-to-augment pixels from the page cache instead of decoding and resizing
+JPEGs in every data loader worker on every epoch.
+
+A store lives in DATASET/.cache/<split>-<imgsz>/:
+
+    images.npy    uint8 (N, imgsz, imgsz, 3) BGR letterboxed images (memory-mapped)
+    boxes.npy     float32 (M, 5) class, x, y, w, h normalized to the letterboxed image
+    offsets.npy   int64 (N + 1,) rows of boxes.npy belonging to image i: offsets[i]:offsets[i+1]
+    index.json    image file names, original sizes and a fingerprint of the source
+                  files (written last, a store without it is incomplete)
+
+The store is rebuilt whenever an image or label file is added, removed or changed,
+or when a different imgsz is requested. cached_training.py reads it during training.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
+from preprocessing import PAD_VALUE, letterbox
+
+STORE_VERSION = 1
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def list_images(images_dir):
+    """Sorted image files of a split"""
+    return sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def label_path(image_path):
+    """YOLO label file of an image: .../images/x.jpg -> .../labels/x.txt"""
+    image_path = Path(image_path)
+    return image_path.parent.parent / "labels" / (image_path.stem + ".txt")
+
+
+def store_dir(images_dir, imgsz):
+    """Store location for a split: DATASET/.cache/<split>-<imgsz>"""
+    images_dir = Path(images_dir).resolve()
+    return images_dir.parent.parent / ".cache" / f"{images_dir.parent.name}-{imgsz}"
+
+
+def fingerprint(image_files, imgsz):
+    """Hash of the names, sizes and modification times of every image and label file"""
+    digest = hashlib.sha1(f"{STORE_VERSION}:{imgsz}".encode())
+    for image in image_files:
+        for path in (image, label_path(image)):
+            try:
+                stat = path.stat()
+                digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            except FileNotFoundError:
+                digest.update(f"{path.name}:missing;".encode())
+    return digest.hexdigest()
+
+
+def read_labels(path):
+    """
+    Read a YOLO label file
+    Returns a float32 (n, 5) array of class, x, y, w, h (normalized); polygon
+    rows are reduced to their bounding box
+    """
+    rows = []
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                values = line.split()
+                if len(values) < 5:
+                    continue
+                cls, coords = float(values[0]), np.array(values[1:], dtype=np.float32)
+                if len(coords) > 4:
+                    xs, ys = coords[0::2], coords[1::2]
+                    coords = np.array([(xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2,
+                                       xs.max() - xs.min(), ys.max() - ys.min()], dtype=np.float32)
+                rows.append((cls, *coords[:4]))
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def letterbox_labels(labels, shape, ratio, pad, imgsz):
+    """Map normalized labels of an h x w image into the letterboxed imgsz x imgsz image"""
+    h, w = shape
+    labels = labels.copy()
+    labels[:, 1] = (labels[:, 1] * w * ratio + pad[0]) / imgsz
+    labels[:, 2] = (labels[:, 2] * h * ratio + pad[1]) / imgsz
+    labels[:, 3] *= w * ratio / imgsz
+    labels[:, 4] *= h * ratio / imgsz
+    return labels
+
+
+_worker_images = None
+
+
+def _init_worker(images_path):
+    # Every worker writes its images straight into the shared memory map
+    global _worker_images
+    cv2.setNumThreads(1)
+    _worker_images = np.load(images_path, mmap_mode="r+")
+
+
+def _fill(job):
+    """Pool job: decode, letterbox and store image i; returns (i, original shape, labels)"""
+    i, image_path, imgsz = job
+    frame = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if frame is None:
+        _worker_images[i] = PAD_VALUE
+        return i, None, np.zeros((0, 5), dtype=np.float32)
+    padded, ratio, pad = letterbox(frame, imgsz)
+    _worker_images[i] = padded
+    labels = letterbox_labels(read_labels(label_path(image_path)), frame.shape[:2], ratio, pad, imgsz)
+    return i, frame.shape[:2], labels
+
+
+class DatasetStore:
+    """
+    Read side of a prepared store. The image array is memory-mapped on first use,
+    in every process separately, so the store can be handed to data loader
+    workers without copying the pixels.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "index.json") as f:
+            self.index = json.load(f)
+        self.imgsz = self.index["imgsz"]
+        self.images_dir = Path(self.index["images_dir"])
+        self.files = [self.images_dir / name for name in self.index["files"]]
+        self.shapes = self.index["shapes"]
+        self.boxes = np.load(self.path / "boxes.npy")
+        self.offsets = np.load(self.path / "offsets.npy")
+        self._images = None
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(self.path / "images.npy", mmap_mode="r")
+        return self._images
+
+    def image(self, i):
+        """Writable copy of letterboxed image i (augmentations work in place)"""
+        return np.array(self.images[i])
+
+    def labels(self, i):
+        """(classes (n, 1), xywh boxes (n, 4)) of image i, normalized to the letterboxed image"""
+        rows = self.boxes[self.offsets[i]:self.offsets[i + 1]]
+        return rows[:, :1], rows[:, 1:]
+
+    @property
+    def nbytes(self):
+        return len(self) * self.imgsz * self.imgsz * 3
+
+
+def prepare_store(images_dir, imgsz=640, workers=None, force=False):
+    """
+    Build the store for a split, or reuse it if it is up to date
+    Args:
+        images_dir: Directory of the split's images (labels are read from ../labels)
+        imgsz: Letterbox size, must match the training imgsz
+        workers: Decode processes (default: CPU count - 1)
+        force: Rebuild even if the store is up to date
+    Returns the DatasetStore
+    """
+    images_dir = Path(images_dir).resolve()
+    image_files = list_images(images_dir)
+    if not image_files:
+        raise ValueError(f"No images found in {images_dir}")
+    path = store_dir(images_dir, imgsz)
+    source = fingerprint(image_files, imgsz)
+    if not force and (path / "index.json").exists():
+        store = DatasetStore(path)
+        if store.index.get("fingerprint") == source:
+            return store
+        print(f"Dataset store {path} is out of date, rebuilding")
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    size_gb = len(image_files) * imgsz * imgsz * 3 / 1e9
+    print(f"Preparing dataset store {path}: {len(image_files)} images at {imgsz}x{imgsz} "
+          f"({size_gb:.2f} GB) with {workers} workers...", flush=True)
+    start = time.perf_counter()
+    building = path.with_name(path.name + ".tmp")
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+    images_path = building / "images.npy"
+    np.lib.format.open_memmap(images_path, mode="w+", dtype=np.uint8,
+                              shape=(len(image_files), imgsz, imgsz, 3)).flush()
+
+    shapes = [None] * len(image_files)
+    labels = [None] * len(image_files)
+    jobs = [(i, image, imgsz) for i, image in enumerate(image_files)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(images_path),)) as pool:
+        for done, (i, shape, image_labels) in enumerate(pool.map(_fill, jobs, chunksize=16), 1):
+            shapes[i], labels[i] = shape, image_labels
+            if done % 500 == 0:
+                print(f"  {done}/{len(jobs)} images", flush=True)
+
+    failed = [image_files[i].name for i, shape in enumerate(shapes) if shape is None]
+    if failed:
+        print(f"Warning: {len(failed)} images could not be decoded and are stored as empty backgrounds: "
+              f"{', '.join(failed[:5])}{' ...' if len(failed) > 5 else ''}")
+    counts = np.array([len(image_labels) for image_labels in labels], dtype=np.int64)
+    np.save(building / "boxes.npy", np.concatenate(labels))
+    np.save(building / "offsets.npy", np.concatenate([[0], np.cumsum(counts)]))
+    index = {
+        "version": STORE_VERSION,
+        "imgsz": imgsz,
+        "images_dir": str(images_dir),
+        "files": [image.name for image in image_files],
+        "shapes": [list(shape) if shape else [imgsz, imgsz] for shape in shapes],
+        "failed": failed,
+        "fingerprint": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(building / "index.json", "w") as f:
+        json.dump(index, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(building, path)
+    print(f"Dataset store ready in {time.perf_counter() - start:.1f}s: {path}")
+    return DatasetStore(path)
+
+
+def resolve_splits(data_yaml, splits=("train", "val")):
+    """
+    Image directories of the splits named in a dataset yaml, resolved the way
+    Ultralytics does (relative to the yaml's path: or its directory, with a
+    fallback for "../" paths)
+    Returns {split: Path}
+    """
+    import yaml
+    data_yaml = Path(data_yaml).resolve()
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = Path(data.get("path") or data_yaml.parent)
+    if not root.is_absolute():
+        root = (data_yaml.parent / root).resolve()
+    dirs = {}
+    for split in splits:
+        value = data.get(split)
+        if not isinstance(value, str):
+            continue
+        path = (root / value).resolve()
+        if not path.exists() and value.startswith("../"):
+            path = (root / value[3:]).resolve()
+        dirs[split] = path
+    return dirs
+
+
+def prepare_dataset(data_yaml, imgsz=640, workers=None, force=False):
+    """
+    Prepare the stores of the train and val splits of a dataset yaml
+    Returns {split: DatasetStore}
+    """
+    return {split: prepare_store(images_dir, imgsz, workers, force)
+            for split, images_dir in resolve_splits(data_yaml).items()}
+
+
+def benchmark(store, limit=None, repeats=3):
+    """
+    Time one pass of image loading as the training data loader does it: decode +
+    letterbox from the JPEG files versus copying from the store
+    Returns {"files": images/s, "store": images/s}
+    """
+    count = min(len(store), limit or len(store))
+    rates = {}
+    for mode in ("files", "store"):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for i in range(count):
+                if mode == "files":
+                    letterbox(cv2.imread(str(store.files[i]), cv2.IMREAD_COLOR), store.imgsz)
+                else:
+                    store.image(i)
+            best = min(best, time.perf_counter() - start)
+        rates[mode] = count / best if best > 0 else 0.0
+    return rates
+
+
+def main():
+    """
+    Main function to parse arguments and prepare or benchmark the dataset stores
+    """
+    parser = argparse.ArgumentParser(description="Pre-decode the training dataset into memory-mapped stores")
+    parser.add_argument("command", choices=["prepare", "info", "benchmark"],
+                      help="prepare: build the stores, info: describe them, benchmark: compare image loading speed")
+    parser.add_argument("--data", type=str, default="DATASET/data.yaml",
+                      help="Path to dataset yaml file (default: DATASET/data.yaml)")
+    parser.add_argument("--imgsz", type=int, default=640,
+                      help="Image size, must match the training imgsz (default: 640)")
+    parser.add_argument("--workers", type=int, default=None,
+                      help="Decode processes for prepare (default: CPU count - 1)")
+    parser.add_argument("--force", action="store_true",
+                      help="Rebuild the stores even if they are up to date")
+    parser.add_argument("--limit", type=int, default=None,
+                      help="Images per split to benchmark (default: all)")
+    args = parser.parse_args()
+
+    if not Path(args.data).exists():
+        print(f"Error: Dataset config file {args.data} not found")
+        sys.exit(2)
+
+    if args.command == "info":
+        for split, images_dir in resolve_splits(args.data).items():
+            path = store_dir(images_dir, args.imgsz)
+            if not (path / "index.json").exists():
+                print(f"{split}: no store at {path}")
+                continue
+            store = DatasetStore(path)
+            state = "up to date" if store.index["fingerprint"] == fingerprint(list_images(images_dir), args.imgsz) else "out of date"
+            print(f"{split}: {len(store)} images, {len(store.boxes)} boxes, {store.nbytes / 1e9:.2f} GB, "
+                  f"{state}, built {store.index['created']} ({path})")
+        return
+
+    stores = prepare_dataset(args.data, args.imgsz, args.workers, args.force)
+    if args.command == "benchmark":
+        print(f"\n{'Split':<8} {'Files img/s':>12} {'Store img/s':>12} {'Speedup':>8}")
+        for split, store in stores.items():
+            rates = benchmark(store, args.limit)
+            speedup = rates["store"] / rates["files"] if rates["files"] else 0.0
+            print(f"{split:<8} {rates['files']:>12.1f} {rates['store']:>12.1f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
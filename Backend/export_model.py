@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Script to export the trained YOLOv10 model for CPU inference.
+Writes ONNX and OpenVINO IR versions of models/recyclables.pt that the detection
+server can load with YOLO_BACKEND=onnx or YOLO_BACKEND=openvino.
+"""
+
+import argparse
+import shutil
+from pathlib import Path
+from ultralytics import YOLO
+
+def export_model(model_path, export_format, imgsz=640, dynamic=True, half=False, output_dir="models"):
+    """
+    Export a YOLO model to ONNX or OpenVINO
+
+    Args:
+        model_path: Path to the trained .pt model
+        export_format: "onnx" or "openvino"
+        imgsz: Input image size baked into the export
+        dynamic: Allow a variable batch size (needed for micro-batching)
+        half: Export FP16 weights (OpenVINO only)
+        output_dir: Directory to place the exported model in
+
+    Returns:
+        Path to the exported model file/directory
+    """
+    model = YOLO(model_path)
+    export_args = {"format": export_format, "imgsz": imgsz, "dynamic": dynamic}
+    if export_format == "onnx":
+        export_args["simplify"] = True
+    if export_format == "openvino" and half:
+        export_args["half"] = True
+
+    print(f"Exporting {model_path} to {export_format}...")
+    exported = Path(model.export(**export_args))
+
+    # Move the export next to the other models with a predictable name
+    stem = Path(model_path).stem
+    target = Path(output_dir) / (f"{stem}.onnx" if export_format == "onnx" else f"{stem}_openvino_model")
+    if exported.resolve() != target.resolve():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.is_dir():
+            shutil.rmtree(target)
+        elif target.exists():
+            target.unlink()
+        shutil.move(str(exported), str(target))
+    print(f"Exported model saved to {target}")
+    return target
+
+def main():
+    """
+    Main function to parse arguments and export the model
+    """
+    parser = argparse.ArgumentParser(description="Export trained YOLOv10 model to ONNX / OpenVINO")
+    parser.add_argument("--model", type=str, default="models/recyclables.pt",
+                      help="Path to trained model (default: models/recyclables.pt)")
+    parser.add_argument("--formats", type=str, nargs="+", default=["onnx", "openvino"],
+                      choices=["onnx", "openvino"],
+                      help="Export formats (default: onnx openvino)")
+    parser.add_argument("--imgsz", type=int, default=640,
+                      help="Image size for the exported model (default: 640)")
+    parser.add_argument("--static", action="store_true",
+                      help="Export with a fixed batch size of 1")
+    parser.add_argument("--half", action="store_true",
+                      help="Export FP16 OpenVINO weights")
+    parser.add_argument("--output", type=str, default="models",
+                      help="Output directory (default: models/)")
+    args = parser.parse_args()
+
+    # Check if model exists
+    if not Path(args.model).exists():
+        print(f"Error: Model file {args.model} not found.")
+        print("Train a model first with train_model.py or train_yolov10.py")
+        return
+
+    exported = []
+    for export_format in args.formats:
+        try:
+            exported.append(export_model(args.model, export_format, args.imgsz,
+                                         dynamic=not args.static, half=args.half,
+                                         output_dir=args.output))
+        except Exception as e:
+            print(f"Error exporting to {export_format}: {e}")
+
+    if exported:
+        print("\nExport completed! Start the server with one of:")
+        for path in exported:
+            backend = "onnx" if str(path).endswith(".onnx") else "openvino"
+            print(f"  YOLO_BACKEND={backend} YOLO_MODEL={path} python recycling_detection_server.py")
+        print(f"Compare accuracy and latency with: python validate_model.py --backends torch {' '.join(args.formats)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-connection frame mailbox for the recycling detection server.
+A reader task drops incoming frames into a single slot; when the detector is
+slower than the client, older frames are overwritten so results always refer to
+the newest frame the client sent.
+"""
+
+import asyncio
+from collections import deque
+
+
+class MailboxClosed(Exception):
+    """Raised by get() once the mailbox is closed and drained"""
+
+
+class LatestFrameMailbox:
+    """
+    Mailbox holding at most one frame plus control messages, in arrival order.
+
+    Frames overwrite each other (latest frame wins) and every superseded frame
+    is counted as dropped. Control messages such as RESET_DETECTION are never
+    dropped; a control message that supersedes frames also drops the pending
+    frame, so a frame sent before a reset cannot be processed after it.
+    """
+
+    def __init__(self):
+        self._items = deque()  # (is_frame, item) in arrival order, at most one frame
+        self._frame = None  # the pending frame entry of _items, if any
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._error = None
+        self.received = 0
+        self.dropped = 0
+        self._reported_dropped = 0
+
+    def _drop_frame(self):
+        if self._frame is not None:
+            self._items.remove(self._frame)
+            self._frame = None
+            self.dropped += 1
+
+    def put_frame(self, item):
+        """Store a frame, replacing (and dropping) any frame not yet processed"""
+        self.received += 1
+        self._drop_frame()
+        self._frame = (True, item)
+        self._items.append(self._frame)
+        self._ready.set()
+
+    def put_control(self, item, drop_frame=False):
+        """
+        Queue a control message; these are never dropped
+        Args:
+            drop_frame: Drop the pending frame (for messages such as a reset that
+                        make earlier frames obsolete)
+        """
+        if drop_frame:
+            self._drop_frame()
+        self._items.append((False, item))
+        self._ready.set()
+
+    def close(self, error=None):
+        """
+        Close the mailbox; get() raises once the pending items are drained
+        Args:
+            error: Optional exception to raise from get() instead of MailboxClosed
+        """
+        self._closed = True
+        self._error = error
+        self._ready.set()
+
+    async def get(self):
+        """Wait for the next control message or frame, in arrival order"""
+        while True:
+            if self._items:
+                entry = self._items.popleft()
+                if entry is self._frame:
+                    self._frame = None
+                return entry[1]
+            if self._closed:
+                if self._error is not None:
+                    raise self._error
+                raise MailboxClosed()
+            self._ready.clear()
+            await self._ready.wait()
+
+    def take_dropped(self):
+        """Return the number of frames dropped since the previous call"""
+        count = self.dropped - self._reported_dropped
+        self._reported_dropped = self.dropped
+        return count
@@ -0,0 +1,101 @@
+"""
+Binary frame protocol for the /ws/detect WebSocket endpoint.
+
+A binary message is a fixed 20-byte little-endian header followed by the
+encoded image (JPEG or WebP):
+
+    offset  size  field
+    0       2     magic, always b"RD"
+    2       1     protocol version (1)
+    3       1     image format (0 = JPEG, 1 = WebP)
+    4       4     frame id (uint32)
+    8       8     client timestamp in milliseconds (float64)
+    16      2     image width in pixels (uint16, 0 if unknown)
+    18      2     image height in pixels (uint16, 0 if unknown)
+    20      ...   encoded image bytes
+
+Text messages (base64 data URLs) are still accepted for older clients.
+"""
+
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"RD"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIdHH")
+HEADER_SIZE = HEADER.size
+
+FORMAT_JPEG = 0
+FORMAT_WEBP = 1
+FORMAT_NAMES = {FORMAT_JPEG: "jpeg", FORMAT_WEBP: "webp"}
+
+
+class FrameProtocolError(ValueError):
+    """Raised when a binary message does not follow the frame protocol"""
+
+
+class FrameHeader:
+    """Parsed header of a binary frame message"""
+
+    __slots__ = ("frame_id", "timestamp", "width", "height", "image_format")
+
+    def __init__(self, frame_id, timestamp, width, height, image_format):
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.width = width
+        self.height = height
+        self.image_format = image_format
+
+    def to_dict(self):
+        return {
+            "id": self.frame_id,
+            "timestamp": self.timestamp,
+            "width": self.width,
+            "height": self.height,
+            "format": FORMAT_NAMES.get(self.image_format, "unknown"),
+        }
+
+
+def parse_header(message):
+    """
+    Parse the header of a binary frame message
+    Args:
+        message: bytes (or any buffer) received from the WebSocket
+    Returns a FrameHeader, raises FrameProtocolError if the header is invalid
+    """
+    if len(message) <= HEADER_SIZE:
+        raise FrameProtocolError("Binary frame is too short")
+    magic, version, image_format, frame_id, timestamp, width, height = HEADER.unpack_from(message, 0)
+    if magic != MAGIC:
+        raise FrameProtocolError("Bad frame magic")
+    if version != VERSION:
+        raise FrameProtocolError(f"Unsupported frame protocol version {version}")
+    if image_format not in FORMAT_NAMES:
+        raise FrameProtocolError(f"Unsupported image format {image_format}")
+    return FrameHeader(frame_id, timestamp, width, height, image_format)
+
+
+def image_array(message):
+    """
+    Encoded image bytes of a binary frame message as a uint8 array, read in place
+    from the received buffer (no copy)
+    """
+    return np.frombuffer(message, dtype=np.uint8, offset=HEADER_SIZE)
+
+
+def encode_frame(image_bytes, frame_id, width=0, height=0, image_format=FORMAT_JPEG, timestamp=None):
+    """
+    Build a binary frame message (used by Python clients and tools)
+    Args:
+        image_bytes: Encoded JPEG/WebP image
+        frame_id: Client frame counter
+        width, height: Image dimensions (0 if unknown)
+        image_format: FORMAT_JPEG or FORMAT_WEBP
+        timestamp: Client timestamp in milliseconds (defaults to now)
+    """
+    if timestamp is None:
+        timestamp = time.time() * 1000.0
+    header = HEADER.pack(MAGIC, VERSION, image_format, frame_id & 0xFFFFFFFF, timestamp, width, height)
+    return header + bytes(image_bytes)
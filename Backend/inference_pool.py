@@ -0,0 +1,234 @@
+"""
+Inference worker pool for the recycling detection server.
+Runs frame decoding and model prediction outside the asyncio event loop, in a
+thread or process pool, so the uvicorn loop only handles network I/O.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Detector and worker barrier owned by a process-pool worker (set by the pool initializer)
+_process_detector = None
+_process_barrier = None
+
+# Seconds a worker waits at the barrier for the other workers to take their job
+BARRIER_TIMEOUT = 600
+
+
+def _init_process_worker(detector_factory, factory_args, barrier):
+    """Build one detector per worker process when the process pool starts"""
+    global _process_detector, _process_barrier
+    _process_detector = detector_factory(*factory_args)
+    _process_barrier = barrier
+
+
+def _run_in_process(fn, args):
+    """Entry point executed inside a worker process"""
+    return fn(_process_detector, *args)
+
+
+def _run_at_barrier(fn, detector, args, barrier):
+    """
+    Run one job, then hold the worker until every worker has taken a job, so a
+    round of pool-size jobs reaches each worker exactly once
+    """
+    try:
+        return fn(detector, *args)
+    finally:
+        barrier.wait(BARRIER_TIMEOUT)
+
+
+def _run_in_process_at_barrier(fn, args):
+    """Entry point of run_on_every_worker() inside a worker process"""
+    return _run_at_barrier(fn, _process_detector, args, _process_barrier)
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool queue is full and the caller asked not to wait"""
+
+
+class StageStats:
+    """
+    Running latency statistics per processing stage (decode, preprocess, ...).
+    Values are kept in milliseconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, timings):
+        """
+        Add one frame's stage timings
+        Args:
+            timings: Dict mapping stage name to duration in seconds
+        """
+        with self._lock:
+            for stage, seconds in timings.items():
+                ms = seconds * 1000.0
+                entry = self._stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+                entry["count"] += 1
+                entry["total_ms"] += ms
+                entry["last_ms"] = ms
+                if ms > entry["max_ms"]:
+                    entry["max_ms"] = ms
+
+    def snapshot(self):
+        """Return a JSON-friendly copy of the current statistics"""
+        with self._lock:
+            return {
+                stage: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 3) if entry["count"] else 0.0,
+                    "max_ms": round(entry["max_ms"], 3),
+                    "last_ms": round(entry["last_ms"], 3),
+                }
+                for stage, entry in self._stages.items()
+            }
+
+
+class InferencePool:
+    """
+    Bounded pool that executes inference jobs away from the event loop.
+
+    Jobs are plain functions called as fn(detector, *args). In thread mode the
+    detector is shared (or built per thread when more than one worker is used and
+    a factory is given); in process mode every worker process builds its own
+    detector from the factory, so jobs and their results must be picklable.
+    """
+
+    def __init__(self, detector=None, executor="thread", workers=1, max_queue=8,
+                 detector_factory=None, factory_args=()):
+        """
+        Initialize the pool
+        Args:
+            detector: Detector instance used by thread workers
+            executor: "thread" or "process"
+            workers: Number of worker threads/processes
+            max_queue: Maximum number of jobs queued or running at once
+            detector_factory: Callable that builds a detector (required for process mode)
+            factory_args: Positional arguments passed to detector_factory
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {executor}")
+        if executor == "process" and detector_factory is None:
+            raise ValueError("Process executor requires a detector_factory")
+
+        self.executor_type = executor
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.detector = detector
+        self.detector_factory = detector_factory
+        self.factory_args = tuple(factory_args)
+        self.stats = StageStats()
+
+        self._pending = 0
+        self._rejected = 0
+        self._slots = None
+        self._thread_local = threading.local()
+
+        if executor == "process":
+            # Handed to the workers at start-up: synchronization primitives cannot be sent with a job
+            self._barrier = multiprocessing.Barrier(self.workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(detector_factory, self.factory_args, self._barrier),
+            )
+        else:
+            self._barrier = threading.Barrier(self.workers)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+    def _get_slots(self):
+        # Create the semaphore lazily so it binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        return self._slots
+
+    def _thread_detector(self):
+        """Detector for the calling worker thread"""
+        if self.workers == 1 or self.detector_factory is None:
+            return self.detector
+        detector = getattr(self._thread_local, "detector", None)
+        if detector is None:
+            detector = self.detector_factory(*self.factory_args)
+            self._thread_local.detector = detector
+        return detector
+
+    def _run_in_thread(self, fn, args):
+        return fn(self._thread_detector(), *args)
+
+    def _run_in_thread_at_barrier(self, fn, args):
+        return _run_at_barrier(fn, self._thread_detector(), args, self._barrier)
+
+    @property
+    def queue_depth(self):
+        """Number of jobs currently waiting or running"""
+        return self._pending
+
+    async def submit(self, fn, *args, wait=True):
+        """
+        Run fn(detector, *args) in the pool and return its result
+        Args:
+            fn: Job function (module-level for process mode)
+            args: Extra arguments for the job
+            wait: If False, raise PoolBusyError instead of waiting for a free slot
+        """
+        slots = self._get_slots()
+        if not wait and slots.locked():
+            self._rejected += 1
+            raise PoolBusyError("Inference queue is full")
+
+        async with slots:
+            self._pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                if self.executor_type == "process":
+                    return await loop.run_in_executor(self._executor, _run_in_process, fn, args)
+                return await loop.run_in_executor(self._executor, self._run_in_thread, fn, args)
+            finally:
+                self._pending -= 1
+
+    async def run_on_every_worker(self, fn, *args):
+        """
+        Run fn(detector, *args) exactly once in every worker thread/process (for
+        warm-up) and return the results. Each worker starts, and builds its
+        detector, before this returns. Does not count against the queue size.
+        """
+        loop = asyncio.get_running_loop()
+        if self.executor_type == "process":
+            calls = [loop.run_in_executor(self._executor, _run_in_process_at_barrier, fn, args)
+                     for _ in range(self.workers)]
+        else:
+            calls = [loop.run_in_executor(self._executor, self._run_in_thread_at_barrier, fn, args)
+                     for _ in range(self.workers)]
+        return await asyncio.gather(*calls)
+
+    def record(self, timings):
+        """Record per-stage timings (seconds) for one frame"""
+        self.stats.record(timings)
+
+    def info(self):
+        """Return pool configuration and live statistics"""
+        return {
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._pending,
+            "rejected": self._rejected,
+            "stages": self.stats.snapshot(),
+        }
+
+    def shutdown(self):
+        """Stop the worker threads/processes"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def timed(timings, stage, start):
+    """Store the time elapsed since start under timings[stage] and return now"""
+    now = time.perf_counter()
+    timings[stage] = now - start
+    return now
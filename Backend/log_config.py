@@ -0,0 +1,188 @@
+"""
+Logging setup for the recycling detection server.
+
+All server logs go through a QueueHandler, so the event loop and inference
+workers only enqueue records; a background QueueListener thread does the
+formatting and writing. Per-frame messages use the "recycling.frames" logger,
+which is off by default and, when enabled, is sampled and rate-limited.
+
+Environment variables:
+    LOG_LEVEL           Level for server logs (default: INFO)
+    LOG_FORMAT          "text" (key=value) or "json" (default: text)
+    LOG_FRAMES          1 to enable per-frame debug tracing (default: 0)
+    LOG_FRAME_SAMPLE    Log 1 in N per-frame debug messages (default: 1)
+    LOG_FRAME_RATE      Max per-frame messages per second per message type (default: 20, 0 = unlimited)
+
+Per-frame tracing can also be toggled while the server runs by sending SIGUSR1
+to a server process (kill -USR1 <pid>).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "recycling"
+FRAME_LOGGER = "recycling.frames"
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def _extra_fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with extra fields appended as key=value pairs"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class FrameSampler(logging.Filter):
+    """
+    Sampling and rate limiting for per-frame messages.
+
+    DEBUG/INFO records are sampled 1-in-N; every record is limited to max_per_second
+    per message template, so a repeating warning cannot flood the output. The
+    number of suppressed records is attached to the next record that gets through.
+    """
+
+    def __init__(self, sample_every=1, max_per_second=20):
+        super().__init__()
+        self.sample_every = max(1, int(sample_every))
+        self.max_per_second = max_per_second
+        self._seen = 0
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and self.sample_every > 1:
+            self._seen += 1
+            if self._seen % self.sample_every:
+                return False
+
+        if self.max_per_second:
+            now = int(time.monotonic())
+            window = self._windows.get(record.msg)
+            if window is None or window[0] != now:
+                suppressed = window[2] if window is not None else 0
+                window = self._windows[record.msg] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.max_per_second:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+def setup_logging():
+    """
+    Configure the "recycling" loggers from the environment (idempotent)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    formatter = JsonFormatter() if os.environ.get("LOG_FORMAT", "text") == "json" else KeyValueFormatter()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+    frames = logging.getLogger(FRAME_LOGGER)
+    frames.setLevel(logging.DEBUG if os.environ.get("LOG_FRAMES", "0") == "1" else logging.WARNING)
+    frames.addFilter(FrameSampler(
+        sample_every=int(os.environ.get("LOG_FRAME_SAMPLE", "1")),
+        max_per_second=int(os.environ.get("LOG_FRAME_RATE", "20")),
+    ))
+    _install_trace_toggle()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(), so process-pool workers need their own
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    for name in (ROOT_LOGGER, FRAME_LOGGER):
+        logger = logging.getLogger(name)
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+        for f in list(logger.filters):
+            logger.removeFilter(f)
+    setup_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def set_frame_tracing(enabled, sample_every=None):
+    """Turn per-frame tracing on or off at runtime"""
+    frames = logging.getLogger(FRAME_LOGGER)
+    frames.setLevel(logging.DEBUG if enabled else logging.WARNING)
+    if sample_every is not None:
+        for f in frames.filters:
+            if isinstance(f, FrameSampler):
+                f.sample_every = max(1, int(sample_every))
+
+
+def frame_tracing_enabled():
+    return logging.getLogger(FRAME_LOGGER).level <= logging.DEBUG
+
+
+def _toggle_frame_tracing(signum, frame):
+    enabled = not frame_tracing_enabled()
+    set_frame_tracing(enabled)
+    logging.getLogger(ROOT_LOGGER).info("Per-frame tracing %s (pid %d)", "enabled" if enabled else "disabled", os.getpid())
+
+
+def _install_trace_toggle():
+    # SIGUSR1 toggles per-frame tracing; handlers can only be set from the main
+    # thread, and the signal does not exist on Windows
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _toggle_frame_tracing)
@@ -0,0 +1,92 @@
+"""
+Fast-loading cache for the material classification model.
+model.pkl can need several loaders before one succeeds. Once a load works, the
+model is written to models/.cache in a single known format: joblib
+(uncompressed, so NumPy arrays are memory-mapped on load) or, without joblib,
+pickle protocol 5. The cache entry is keyed by the source file's size and
+modification time, so replacing model.pkl invalidates it automatically.
+"""
+
+import os
+import pickle
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", ".cache")
+# Age after which an unfinished cache file is assumed to be left over from a crash
+STALE_TMP_SECONDS = 3600
+
+
+def _joblib():
+    try:
+        import joblib
+        return joblib
+    except ImportError:
+        return None
+
+
+def cache_path(source_path, cache_dir=CACHE_DIR):
+    """Cache file for a model file, or None if the source does not exist"""
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return None
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    suffix = "joblib" if _joblib() is not None else "pickle"
+    return os.path.join(cache_dir, f"{name}-{stat.st_size}-{stat.st_mtime_ns}.{suffix}")
+
+
+def load_cached_model(source_path, cache_dir=CACHE_DIR):
+    """
+    Load the cached copy of a model
+    Returns the model, or None if there is no usable cache entry
+    """
+    path = cache_path(source_path, cache_dir)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        joblib = _joblib()
+        if joblib is not None:
+            return joblib.load(path, mmap_mode="r")
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # A corrupt or incompatible cache entry is rebuilt from the source
+        return None
+
+
+def save_cached_model(source_path, model, cache_dir=CACHE_DIR):
+    """
+    Write a loaded model to the cache (best effort) and remove stale entries
+    Returns the cache file path, or None if it could not be written
+    """
+    path = cache_path(source_path, cache_dir)
+    if path is None:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        prefix = os.path.splitext(os.path.basename(source_path))[0] + "-"
+        for entry in os.listdir(cache_dir):
+            entry_path = os.path.join(cache_dir, entry)
+            if not entry.startswith(prefix) or entry_path == path:
+                continue
+            try:
+                # Another worker may be writing a .tmp file right now: only remove
+                # ones left behind by a crashed process
+                if entry.endswith(".tmp") and time.time() - os.path.getmtime(entry_path) < STALE_TMP_SECONDS:
+                    continue
+                os.remove(entry_path)
+            except OSError:
+                pass  # already removed by another worker
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib = _joblib()
+        if joblib is not None:
+            joblib.dump(model, tmp_path, compress=0)
+        else:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Atomic rename, so concurrent workers never read a partial file
+        os.replace(tmp_path, path)
+        return path
+    except Exception:
+        return None
@@ -0,0 +1,171 @@
+"""
+Frame preprocessing for the recycling detection server.
+Turns decoded BGR frames into model inputs using buffers that are allocated once
+and reused, so steady-state inference does not allocate full-frame arrays.
+"""
+
+import cv2
+import numpy as np
+
+PAD_VALUE = 114
+
+# Brightness/contrast enhancement applied before detection (cv2.convertScaleAbs
+# alpha and beta). The server, the exported model backends and INT8 calibration
+# all preprocess with these values, so offline scores match what is served.
+ENHANCE_ALPHA = 1.05
+ENHANCE_BETA = 3
+
+
+def letterbox(frame, size, color=PAD_VALUE):
+    """
+    Resize a BGR frame to fit a size x size square, keeping the aspect ratio and
+    padding the remainder.
+    Returns (padded_image, ratio, (pad_x, pad_y))
+    """
+    h, w = frame.shape[:2]
+    ratio, (new_w, new_h), (left, top) = letterbox_geometry(h, w, size)
+    if (w, h) != (new_w, new_h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    bottom, right = size - new_h - top, size - new_w - left
+    padded = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color))
+    return padded, ratio, (left, top)
+
+
+def letterbox_geometry(h, w, size):
+    """
+    Scale and padding used to letterbox an h x w frame into a size x size square
+    Returns (ratio, (new_w, new_h), (left, top))
+    """
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    left = int(round((size - new_w) / 2 - 0.1))
+    top = int(round((size - new_h) / 2 - 0.1))
+    return ratio, (new_w, new_h), (left, top)
+
+
+def brightness_contrast_lut(alpha=ENHANCE_ALPHA, beta=ENHANCE_BETA):
+    """
+    256-entry lookup table equivalent to cv2.convertScaleAbs(frame, alpha=alpha, beta=beta)
+    """
+    values = np.abs(np.arange(256, dtype=np.float64) * alpha + beta)
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+def _into(result, dst):
+    """
+    Make sure an OpenCV result landed in dst (OpenCV may return a new array when
+    it cannot write into a strided view)
+    """
+    if result is not dst and not np.shares_memory(result, dst):
+        dst[...] = result
+    return dst
+
+
+class FramePreprocessor:
+    """
+    Reusable preprocessing buffers for one inference worker.
+
+    Brightness/contrast enhancement is a single cv2.LUT pass applied to the
+    already-resized image, and every intermediate (letterbox canvas, RGB
+    conversion, normalized batch tensor) is written into preallocated arrays.
+    Instances are not thread-safe: use one per worker thread.
+    """
+
+    def __init__(self, imgsz=640, cls_size=224, alpha=ENHANCE_ALPHA, beta=ENHANCE_BETA, dtype=np.float32, enhance=True):
+        """
+        Initialize the preprocessor
+        Args:
+            imgsz: Square letterbox size for the detection models
+            cls_size: Square input size of the material classification model
+            alpha, beta: Brightness/contrast adjustment (same as cv2.convertScaleAbs)
+            dtype: np.float32 (normalized to [0, 1]) or np.uint8 (raw pixels) batch output
+            enhance: Apply the brightness/contrast lookup table
+        """
+        if dtype not in (np.float32, np.uint8):
+            raise ValueError(f"Unsupported preprocessing dtype: {dtype}")
+        self.imgsz = imgsz
+        self.cls_size = cls_size
+        self.dtype = dtype
+        self.lut = brightness_contrast_lut(alpha, beta) if enhance else None
+
+        self._canvases = []     # letterbox canvases (imgsz x imgsz x 3 uint8), one per batch slot
+        self._geometry = []     # last (h, w) letterboxed into each canvas
+        self._batch = np.empty((0, 3, imgsz, imgsz), dtype=dtype)
+        self._cls_bgr = np.empty((cls_size, cls_size, 3), dtype=np.uint8)
+        self._cls_rgb = np.empty((cls_size, cls_size, 3), dtype=np.uint8)
+        self._features = np.empty((0, cls_size * cls_size * 3), dtype=np.float32)
+
+    def _ensure_capacity(self, n):
+        # Buffers only grow, so a steady batch size never reallocates
+        while len(self._canvases) < n:
+            self._canvases.append(np.full((self.imgsz, self.imgsz, 3), PAD_VALUE, dtype=np.uint8))
+            self._geometry.append(None)
+        if self._batch.shape[0] < n:
+            self._batch = np.empty((n, 3, self.imgsz, self.imgsz), dtype=self.dtype)
+
+    def _enhance(self, image):
+        if self.lut is not None:
+            _into(cv2.LUT(image, self.lut, dst=image), image)
+        return image
+
+    def letterbox_into(self, frame, slot):
+        """
+        Letterbox and enhance one frame into the canvas for the given batch slot
+        Returns (canvas, ratio, (pad_x, pad_y))
+        """
+        canvas = self._canvases[slot]
+        h, w = frame.shape[:2]
+        ratio, (new_w, new_h), (left, top) = letterbox_geometry(h, w, self.imgsz)
+
+        # The padding only needs repainting when the frame geometry changes
+        if self._geometry[slot] != (h, w):
+            canvas.fill(PAD_VALUE)
+            self._geometry[slot] = (h, w)
+
+        roi = canvas[top:top + new_h, left:left + new_w]
+        if (new_w, new_h) == (w, h):
+            roi[...] = frame
+        else:
+            _into(cv2.resize(frame, (new_w, new_h), dst=roi, interpolation=cv2.INTER_LINEAR), roi)
+        self._enhance(roi)
+        return canvas, ratio, (left, top)
+
+    def detection_batch(self, frames):
+        """
+        Build the NCHW RGB detection batch for a list of BGR frames
+        Returns (batch, metas): batch is a view into the reused buffer (valid until
+        the next call) and metas holds (ratio, pad, (h, w)) per frame
+        """
+        n = len(frames)
+        self._ensure_capacity(n)
+        batch = self._batch[:n]
+        metas = []
+        for i, frame in enumerate(frames):
+            canvas, ratio, pad = self.letterbox_into(frame, i)
+            # BGR HWC uint8 -> RGB CHW as a strided cast-copy, then scale in place
+            # (avoids the temporary buffers of a mixed-type ufunc)
+            batch[i] = canvas.transpose(2, 0, 1)[::-1]
+            metas.append((ratio, pad, frame.shape[:2]))
+        if self.dtype == np.float32:
+            batch *= np.float32(1.0 / 255.0)
+        return batch, metas
+
+    def classification_features(self, frames):
+        """
+        Build flattened RGB features in [0, 1] for the material classification model.
+        The classifier was fitted on plain (stretched) resizes, so frames are resized
+        to cls_size x cls_size rather than letterboxed.
+        Returns a (n, cls_size * cls_size * 3) float32 view into the reused buffer
+        """
+        n = len(frames)
+        if self._features.shape[0] < n:
+            self._features = np.empty((n, self._features.shape[1]), dtype=np.float32)
+        features = self._features[:n]
+        size = (self.cls_size, self.cls_size)
+        for i, frame in enumerate(frames):
+            _into(cv2.resize(frame, size, dst=self._cls_bgr), self._cls_bgr)
+            self._enhance(self._cls_bgr)
+            _into(cv2.cvtColor(self._cls_bgr, cv2.COLOR_BGR2RGB, dst=self._cls_rgb), self._cls_rgb)
+            features[i] = self._cls_rgb.reshape(-1)
+        features *= np.float32(1.0 / 255.0)
+        return features
@@ -0,0 +1,129 @@
+"""
+Quality-of-service controller for the recycling detection server.
+Watches end-to-end frame latency and inference queue depth and trades accuracy
+for latency under load: it steps the model input size down a ladder of levels
+(e.g. 640 -> 480 -> 320) and widens the micro-batch window, then steps back up
+once the load drops. Accuracy of every level can be measured ahead of time with
+validate_model.py --imgsz-levels.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+class QosController:
+    """
+    Step-wise controller with hysteresis.
+
+    Every interval seconds it looks at the p95 latency of recent frames and the
+    queue depth. Over target (or queue_high) moves one level down right away;
+    under half the target (and at most queue_low queued) for `patience`
+    consecutive intervals moves one level up.
+    """
+
+    def __init__(self, levels=(640, 480, 320), wait_ms=(5.0, 20.0), target_ms=250.0,
+                 queue_high=6, queue_low=1, interval=2.0, patience=3, queue_depth=None):
+        """
+        Initialize the controller
+        Args:
+            levels: Model input sizes from best quality to fastest
+            wait_ms: (min, max) micro-batch window; level 0 uses min, the last level max
+            target_ms: p95 end-to-end latency to stay under
+            queue_high: Queue depth that counts as overloaded
+            queue_low: Queue depth that allows stepping back up
+            interval: Seconds between decisions
+            patience: Calm intervals required before stepping up
+            queue_depth: Callable returning the current queue depth
+        """
+        if not levels:
+            raise ValueError("QoS controller needs at least one level")
+        self.levels = tuple(int(level) for level in levels)
+        self.min_wait_ms, self.max_wait_ms = wait_ms
+        self.target = target_ms / 1000.0
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.interval = interval
+        self.patience = patience
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.level = 0
+        self.changes = 0
+        self.operating_points = {}
+        self._latencies = deque(maxlen=256)
+        self._calm = 0
+        self._last_decision = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def imgsz(self):
+        """Model input size for the current level"""
+        return self.levels[self.level]
+
+    @property
+    def wait_ms(self):
+        """Micro-batch window for the current level"""
+        if len(self.levels) == 1:
+            return self.min_wait_ms
+        step = (self.max_wait_ms - self.min_wait_ms) / (len(self.levels) - 1)
+        return self.min_wait_ms + step * self.level
+
+    def load_operating_points(self, path):
+        """
+        Load the accuracy of every level (JSON written by validate_model.py
+        --imgsz-levels), reported alongside the current level
+        """
+        with open(path) as f:
+            points = json.load(f)
+        self.operating_points = {int(p["imgsz"]): p for p in points.get("levels", [])}
+
+    def observe(self, latency):
+        """
+        Record one frame's end-to-end latency in seconds
+        Returns True if the level changed
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append(latency)
+            if now - self._last_decision < self.interval:
+                return False
+            self._last_decision = now
+            return self._decide()
+
+    def _decide(self):
+        if not self._latencies:
+            return False
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        depth = self.queue_depth()
+        self._latencies.clear()
+
+        if (p95 > self.target or depth >= self.queue_high) and self.level < len(self.levels) - 1:
+            self.level += 1
+            self._calm = 0
+            self.changes += 1
+            return True
+        if p95 < self.target / 2 and depth <= self.queue_low:
+            self._calm += 1
+            if self._calm >= self.patience and self.level > 0:
+                self.level -= 1
+                self._calm = 0
+                self.changes += 1
+                return True
+        else:
+            self._calm = 0
+        return False
+
+    def info(self):
+        with self._lock:
+            info = {
+                "levels": list(self.levels),
+                "level": self.level,
+                "imgsz": self.imgsz,
+                "batch_wait_ms": round(self.wait_ms, 2),
+                "target_ms": self.target * 1000.0,
+                "changes": self.changes,
+            }
+            if self.imgsz in self.operating_points:
+                info["operating_point"] = self.operating_points[self.imgsz]
+            return info
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Script to build a static INT8 version of the exported YOLOv10 detector.
+Calibrates on images from DATASET/train/images, validates the result on
+DATASET/valid, and only publishes the quantized model if mAP stays within the
+allowed tolerance of the FP32 model. Calibration and validation both use the
+server's preprocessing, including its brightness/contrast enhancement.
+"""
+
+import argparse
+import random
+import shutil
+from pathlib import Path
+import cv2
+from preprocessing import FramePreprocessor
+from yolo_backends import default_model_path
+from validate_model import evaluate_exported
+
+def load_calibration_images(image_dir, count, seed=0):
+    """Pick a reproducible random sample of calibration images"""
+    images = sorted(Path(image_dir).glob("*.jpg")) + sorted(Path(image_dir).glob("*.png"))
+    random.Random(seed).shuffle(images)
+    return images[:count]
+
+def calibration_preprocessor(imgsz):
+    """The server's preprocessing, including its brightness/contrast enhancement"""
+    return FramePreprocessor(imgsz=imgsz)
+
+def preprocess_image(path, preprocessor):
+    """Load one image and turn it into a 1x3xHxW float32 tensor, as the server does"""
+    img = cv2.imread(str(path))
+    if img is None:
+        return None
+    batch, _ = preprocessor.detection_batch([img])
+    # The batch is a view into the preprocessor's reused buffer
+    return batch.copy()
+
+def quantize_onnx(fp32_path, output_path, calibration_images, imgsz):
+    """
+    Static QDQ quantization with ONNX Runtime (INT8 weights, UINT8 activations)
+    """
+    from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    preprocessor = calibration_preprocessor(imgsz)
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(calibration_images)
+
+        def get_next(self):
+            for path in self._images:
+                tensor = preprocess_image(path, preprocessor)
+                if tensor is not None:
+                    return {input_name: tensor}
+            return None
+
+    # Shape inference and graph cleanup improve quantization coverage
+    model_input = fp32_path
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        prepared = output_path.with_name(output_path.stem + "_prep.onnx")
+        quant_pre_process(str(fp32_path), str(prepared))
+        model_input = prepared
+    except Exception as e:
+        print(f"Skipping ONNX pre-processing: {e}")
+
+    quantize_static(
+        str(model_input),
+        str(output_path),
+        ImageReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    if model_input != fp32_path:
+        Path(model_input).unlink(missing_ok=True)
+
+    # Keep the Ultralytics metadata (class names, stride, ...) on the quantized model
+    import onnx
+    source = onnx.load(str(fp32_path), load_external_data=False)
+    quantized = onnx.load(str(output_path))
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, str(output_path))
+    return output_path
+
+def quantize_openvino(fp32_dir, output_dir, calibration_images, imgsz):
+    """
+    Static INT8 quantization of an OpenVINO IR model with NNCF
+    """
+    import nncf
+    import openvino as ov
+
+    xml_path = next(Path(fp32_dir).glob("*.xml"))
+    model = ov.Core().read_model(str(xml_path))
+    preprocessor = calibration_preprocessor(imgsz)
+    tensors = [t for t in (preprocess_image(p, preprocessor) for p in calibration_images) if t is not None]
+    dataset = nncf.Dataset(tensors)
+
+    quantized = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED, subset_size=len(tensors))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ov.save_model(quantized, str(output_dir / xml_path.name))
+    metadata = Path(fp32_dir) / "metadata.yaml"
+    if metadata.exists():
+        shutil.copy(metadata, output_dir / "metadata.yaml")
+    return output_dir
+
+def publish(staged, target):
+    """Move a validated model from the staging location to its final path"""
+    if target.is_dir():
+        shutil.rmtree(target)
+    elif target.exists():
+        target.unlink()
+    shutil.move(str(staged), str(target))
+
+def discard(staged):
+    if staged.is_dir():
+        shutil.rmtree(staged)
+    elif staged.exists():
+        staged.unlink()
+
+def main():
+    """
+    Main function to parse arguments, quantize and validate the model
+    """
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the recycling detector")
+    parser.add_argument("--backend", type=str, default="onnx", choices=["onnx", "openvino"],
+                      help="Exported model format to quantize (default: onnx)")
+    parser.add_argument("--model", type=str, default=None,
+                      help="FP32 exported model (default: output of export_model.py for the backend)")
+    parser.add_argument("--output", type=str, default=None,
+                      help="Where to publish the INT8 model (default: models/recyclables_int8.onnx or _int8_openvino_model)")
+    parser.add_argument("--data", type=str, default="DATASET/data.yaml",
+                      help="Path to dataset yaml file (default: DATASET/data.yaml)")
+    parser.add_argument("--calib-dir", type=str, default="DATASET/train/images",
+                      help="Calibration images (default: DATASET/train/images)")
+    parser.add_argument("--calib-size", type=int, default=300,
+                      help="Number of calibration images (default: 300)")
+    parser.add_argument("--imgsz", type=int, default=640,
+                      help="Image size (default: 640)")
+    parser.add_argument("--conf", type=float, default=0.25,
+                      help="Confidence threshold for validation (default: 0.25)")
+    parser.add_argument("--max-map-drop", type=float, default=0.01,
+                      help="Maximum allowed absolute drop in mAP@0.5 and mAP@0.5-0.95 (default: 0.01)")
+    parser.add_argument("--force", action="store_true",
+                      help="Publish the quantized model even if the accuracy check fails")
+    args = parser.parse_args()
+
+    fp32_path = Path(args.model or default_model_path(args.backend))
+    target = Path(args.output or default_model_path(args.backend, "int8"))
+    # Validate from a staging location so a failed check never replaces a published model
+    staged = target.with_name("staging_" + target.name)
+
+    if not fp32_path.exists():
+        print(f"Error: FP32 model {fp32_path} not found.")
+        print(f"Export it first: python export_model.py --formats {args.backend}")
+        return
+    if not Path(args.data).exists():
+        print(f"Error: Dataset config file {args.data} not found")
+        return
+
+    calibration_images = load_calibration_images(args.calib_dir, args.calib_size)
+    if not calibration_images:
+        print(f"Error: No calibration images found in {args.calib_dir}")
+        return
+
+    print(f"\n{'='*50}")
+    print(f"Starting INT8 quantization with the following configuration:")
+    print(f"- Backend:       {args.backend}")
+    print(f"- FP32 model:    {fp32_path.absolute()}")
+    print(f"- Calibration:   {len(calibration_images)} images from {args.calib_dir}")
+    print(f"- Output:        {target.absolute()}")
+    print(f"- Max mAP drop:  {args.max_map_drop}")
+    print(f"{'='*50}\n")
+
+    try:
+        discard(staged)
+        if args.backend == "onnx":
+            quantize_onnx(fp32_path, staged, calibration_images, args.imgsz)
+        else:
+            quantize_openvino(fp32_path, staged, calibration_images, args.imgsz)
+    except Exception as e:
+        print(f"Error during quantization: {e}")
+        discard(staged)
+        return
+
+    try:
+        # Both models are scored on the preprocessing they were calibrated with and are served with
+        print("\nValidating FP32 model...")
+        baseline = evaluate_exported(args.backend, fp32_path, args.data, args.imgsz, args.conf)
+        print("\nValidating INT8 model...")
+        quantized = evaluate_exported(args.backend, staged, args.data, args.imgsz, args.conf)
+    except Exception as e:
+        print(f"Error during validation: {e}")
+        discard(staged)
+        return
+
+    print(f"\n{'Metric':<14}{'FP32':>10}{'INT8':>10}{'Delta':>10}")
+    for key, label in [("map50", "mAP@0.5"), ("map", "mAP@0.5-0.95"), ("precision", "Precision"), ("recall", "Recall")]:
+        print(f"{label:<14}{baseline[key]:>10.4f}{quantized[key]:>10.4f}{quantized[key] - baseline[key]:>+10.4f}")
+
+    drops = {key: baseline[key] - quantized[key] for key in ("map50", "map")}
+    passed = all(drop <= args.max_map_drop for drop in drops.values())
+    if not passed and not args.force:
+        print(f"\nINT8 model rejected: mAP dropped by more than {args.max_map_drop} "
+              f"(mAP@0.5 -{drops['map50']:.4f}, mAP@0.5-0.95 -{drops['map']:.4f}).")
+        print("Try more calibration images (--calib-size) or raise --max-map-drop.")
+        discard(staged)
+        return
+
+    publish(staged, target)
+    if not passed:
+        print("\nWarning: accuracy check failed, model published because of --force")
+    print(f"\nINT8 model published to {target}")
+    print(f"Run the server with: YOLO_BACKEND={args.backend} YOLO_PRECISION=int8 python recycling_detection_server.py")
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,45 @@
+import time
+# Module import time, reported by /api/ready (heavy model libraries are imported later,
+# only when the chosen backend needs them)
+_import_start = time.perf_counter()
 import os
+import sys
 import cv2
 import numpy as np
 import base64
 from typing import List, Dict, Union
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 from pydantic import BaseModel
 import asyncio
-import time
-from ultralytics import YOLO
-import pickle
-import traceback
-
-# Add joblib for alternative model loading
-try:
-    import joblib
-    HAVE_JOBLIB = True
-except ImportError:
-    HAVE_JOBLIB = False
-    print("joblib not available, will try alternative loading methods")
-
-# Try to import sklearn for model handling
-try:
-    import sklearn
-    HAVE_SKLEARN = True
-except ImportError:
-    HAVE_SKLEARN = False
-    print("sklearn not available, some model features may not work")
+import logging
+import threading
+from inference_pool import InferencePool, PoolBusyError, timed
+from batching import BatchScheduler
+from frame_protocol import FrameProtocolError, parse_header, image_array
+from frame_mailbox import LatestFrameMailbox, MailboxClosed
+from preprocessing import FramePreprocessor
+from metrics import Registry
+from yolo_backends import BACKENDS, DEFAULT_MODEL_PATHS, default_model_path, load_exported_model
+from log_config import setup_logging
+from session_state import DEFAULT_SESSION, create_session_store
+from model_cache import CACHE_DIR, load_cached_model, save_cached_model
+from temporal import TemporalSmoother, frame_signature, motion_fraction, scene_changed
+from roi import crop, load_roi_config, offset_detections, parse_roi
+from result_cache import ResultCache
+from qos import QosController
+from connections import ConnectionManager
+from response_protocol import MAX_PACKED_DROPPED, DeltaFilter, ResponseFormatError, check_format, dumps_json, encode_response
+
+# Queue-based logging: handlers run on a background thread, per-frame messages
+# go to "recycling.frames" (off unless LOG_FRAMES=1, sampled and rate-limited)
+setup_logging()
+log = logging.getLogger("recycling.server")
+frame_log = logging.getLogger("recycling.frames")
+
 
 # Initialize FastAPI app
 app = FastAPI(title="Recyclable Detection Server")
@@ -61,9 +71,45 @@ RECYCLABLE_STATUS = {
     "Others": False  # Generally not recyclable
 }
 
-# Variable to track if a recyclable has been detected
-recyclable_detected = False
-last_detection_result = {"detected": False, "class": None, "confidence": 0.0, "recyclable": False}
+# YOLO inference backend: "torch" (Ultralytics/PyTorch), "onnx" (ONNX Runtime) or "openvino"
+YOLO_BACKEND = os.environ.get("YOLO_BACKEND", "torch")
+# Model file for the chosen backend (defaults to DEFAULT_MODEL_PATHS[YOLO_BACKEND])
+YOLO_MODEL = os.environ.get("YOLO_MODEL", "")
+# "fp32" or "int8" (quantized model written by quantize_model.py, onnx/openvino only)
+YOLO_PRECISION = os.environ.get("YOLO_PRECISION", "fp32")
+YOLO_IMGSZ = int(os.environ.get("YOLO_IMGSZ", "640"))
+# Threads per server process for OpenCV, PyTorch and the exported runtimes (0 = library
+# default, usually one per core). serve.py sets this so worker processes do not
+# oversubscribe the CPU.
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "0"))
+
+def limit_worker_threads(threads):
+    """
+    Cap the intra-op thread pools of OpenCV and, once a model has loaded it,
+    PyTorch for this process (never imports torch itself)
+    """
+    if threads <= 0:
+        return
+    cv2.setNumThreads(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+# Detection state per kiosk/game session (override with environment variables):
+# "memory" keeps it in this process, "sqlite" shares it between uvicorn workers
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH") or None
+sessions = create_session_store(SESSION_STORE, ttl=SESSION_TTL_SECONDS, path=SESSION_DB_PATH)
+
+async def session_call(fn, *args):
+    """
+    Call a session store method without blocking the event loop: the sqlite store
+    may wait on other workers' write locks, so its calls run in a thread
+    """
+    if sessions.kind == "memory":
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
 
 # YOLOv10-based detector - Upgraded from YOLOv8 for improved detection capabilities
 class YOLODetector:
@@ -75,34 +121,48 @@ class YOLODetector:
         """
         # Flag to indicate whether we're using pickle model
         self.is_pickle_model = False
+        # Inference backend for the YOLO path ("torch", "onnx" or "openvino")
+        self.backend = "torch"
+        # File the active model was loaded from (part of model_version)
+        self.model_source = None
+        # Per-thread preprocessing buffers
+        self._local = threading.local()
         
         # Check for model.pkl specifically first
         pkl_path = os.path.join(os.path.dirname(__file__), "models", "model.pkl")
-        print(f"*** CHECKING FOR MODEL.PKL: {pkl_path} ***")
+        log.info("Checking for model.pkl at %s", pkl_path)
         if os.path.exists(pkl_path):
-            print(f"*** FOUND MODEL.PKL: {pkl_path} ***")
+            log.info("Found model.pkl at %s", pkl_path)
             
-            # Try multiple methods to load the model
-            model_loaded = False
+            # Try multiple methods to load the model, starting with the fast-loading cached copy
+            self.model = load_cached_model(pkl_path)
+            model_loaded = self.model is not None
+            from_cache = model_loaded
+            if from_cache:
+                log.info("Model loaded from cache! Type: %s", type(self.model))
             
             # Method 1: Try loading with joblib if available
-            if HAVE_JOBLIB and not model_loaded:
+            if not model_loaded:
                 try:
-                    print("Attempting to load model with joblib...")
+                    import joblib
+                    log.info("Attempting to load model with joblib...")
                     self.model = joblib.load(pkl_path)
-                    print(f"Model successfully loaded with joblib! Type: {type(self.model)}")
+                    log.info("Model successfully loaded with joblib! Type: %s", type(self.model))
                     model_loaded = True
+                except ImportError:
+                    log.info("joblib not available, will try alternative loading methods")
                 except Exception as e:
-                    print(f"Joblib loading failed: {e}")
+                    log.warning("Joblib loading failed: %s", e)
             
             # Method 2: Try loading with custom pickle handler
             if not model_loaded:
                 try:
-                    print("Attempting to load model with custom pickle handler...")
+                    import pickle
+                    log.info("Attempting to load model with custom pickle handler...")
                     
                     # Define a custom persistent_load function
                     def persistent_load(pid):
-                        print(f"Persistent load called with {pid}")
+                        log.debug("Persistent load called with %s", pid)
                         return pid
                     
                     with open(pkl_path, 'rb') as f:
@@ -111,65 +171,106 @@ class YOLODetector:
                         unpickler.persistent_load = persistent_load
                         self.model = unpickler.load()
                         
-                    print(f"Model successfully loaded with custom unpickler! Type: {type(self.model)}")
+                    log.info("Model successfully loaded with custom unpickler! Type: %s", type(self.model))
                     model_loaded = True
                 except Exception as e:
-                    print(f"Custom pickle loading failed: {e}")
-                    print(traceback.format_exc())
+                    log.warning("Custom pickle loading failed: %s", e, exc_info=True)
             
             # Method 3: Standard pickle load as last resort
             if not model_loaded:
                 try:
-                    print("Attempting standard pickle load as last resort...")
+                    import pickle
+                    log.info("Attempting standard pickle load as last resort...")
                     with open(pkl_path, 'rb') as f:
                         self.model = pickle.load(f)
                     model_loaded = True
                 except Exception as e:
-                    print(f"Standard pickle load failed: {e}")
-                    print(traceback.format_exc())
+                    log.warning("Standard pickle load failed: %s", e, exc_info=True)
             
             # Check if any method succeeded
             if model_loaded:
                 # Verify the model has predict method
                 if hasattr(self.model, 'predict'):
-                    print("Material classification model loaded successfully!")
+                    log.info("Material classification model loaded successfully!")
                     self.is_pickle_model = True
+                    self.model_source = pkl_path
+                    if not from_cache and save_cached_model(pkl_path, self.model):
+                        log.info("Cached model for faster loading next time")
                     
                     # Print model details if available
                     if hasattr(self.model, 'classes_'):
-                        print(f"Model classes: {self.model.classes_}")
+                        log.info("Model classes: %s", self.model.classes_)
                     if hasattr(self.model, 'n_features_in_'):
-                        print(f"Model expects {self.model.n_features_in_} features")
+                        log.info("Model expects %d features", self.model.n_features_in_)
                 else:
-                    print("ERROR: Loaded model doesn't have predict method")
+                    log.error("Loaded model doesn't have predict method")
                     self._load_yolo_fallback()
             else:
-                print("All model loading methods failed.")
+                log.error("All model loading methods failed.")
                 self._load_yolo_fallback()
         else:
-            print(f"Model.pkl not found at {pkl_path}")
+            log.info("Model.pkl not found at %s", pkl_path)
             self._load_yolo_fallback()
         
+        # torch is only imported by the model load, so apply the thread limit now
+        # (also covers detectors built in process-pool workers)
+        limit_worker_threads(WORKER_THREADS)
+        
         # Set confidence threshold
         self.confidence_threshold = 0.45
         
         # Print final confirmation of which model is being used
         if self.is_pickle_model:
-            print("✅ ACTIVE MODEL: Material Classification Model (model.pkl)")
+            log.info("Active model: Material Classification Model (model.pkl)")
         else:
-            print("⚠️ ACTIVE MODEL: YOLO Object Detection (Fallback)")
+            log.warning("Active model: YOLO Object Detection (Fallback, %s backend)", self.backend)
     
     def _load_yolo_fallback(self):
         """Helper method to load YOLO as fallback"""
-        print("*** Falling back to YOLO model ***")
-        if os.path.exists("yolov10n.pt"):
-            print("Loading existing YOLOv10n model...")
-            self.model = YOLO("yolov10n.pt")
-        else:
-            print("Downloading YOLOv10n model...")
-            self.model = YOLO("yolov10n.pt")
+        log.info("Falling back to YOLO model")
         self.is_pickle_model = False
         
+        if YOLO_BACKEND not in BACKENDS:
+            log.warning("Unknown YOLO_BACKEND '%s', using torch", YOLO_BACKEND)
+        elif YOLO_BACKEND != "torch":
+            # Exported model run with NumPy pre/postprocessing, no PyTorch needed
+            exported_path = YOLO_MODEL or default_model_path(YOLO_BACKEND, YOLO_PRECISION)
+            try:
+                log.info("Loading %s model from %s...", YOLO_BACKEND, exported_path)
+                self.model = load_exported_model(YOLO_BACKEND, exported_path, imgsz=YOLO_IMGSZ, threads=WORKER_THREADS, cache_dir=CACHE_DIR)
+                self.backend = YOLO_BACKEND
+                self.model_source = exported_path
+                log.info("%s model loaded, classes: %s", YOLO_BACKEND, self.model.names)
+                return
+            except Exception as e:
+                log.error("Failed to load %s model: %s", YOLO_BACKEND, e)
+                log.warning("Falling back to PyTorch backend")
+        
+        self.backend = "torch"
+        if YOLO_PRECISION == "int8":
+            log.warning("YOLO_PRECISION=int8 needs YOLO_BACKEND=onnx or openvino, loading the fp32 PyTorch model")
+        torch_path = YOLO_MODEL if YOLO_MODEL and YOLO_BACKEND == "torch" else DEFAULT_MODEL_PATHS["torch"]
+        if os.path.exists(torch_path):
+            log.info("Loading existing model %s...", torch_path)
+        else:
+            log.info("Downloading %s model...", torch_path)
+        from ultralytics import YOLO
+        self.model = YOLO(torch_path)
+        self.model_source = torch_path
+    
+    @property
+    def model_version(self):
+        """
+        Identifies the loaded model and the settings that affect its output
+        (changes whenever a different or updated model file is loaded)
+        """
+        try:
+            mtime = os.stat(self.model_source).st_mtime_ns
+        except (OSError, TypeError):
+            mtime = 0
+        backend = "pickle" if self.is_pickle_model else self.backend
+        return f"{backend}:{self.model_source}:{mtime}:{YOLO_IMGSZ}:{self.confidence_threshold}"
+        
     def check_for_cardboard_texture(self, frame):
         """
         Simple texture-based detector for cardboard.
@@ -204,65 +305,186 @@ class YOLODetector:
             is_cardboard = (3 < edge_percentage < 20) and (500 < texture_variance < 3000)
             
             if is_cardboard:
-                print(f"Cardboard texture detected! Edge %: {edge_percentage:.2f}, Variance: {texture_variance:.2f}")
+                frame_log.debug("Cardboard texture detected! Edge %%: %.2f, Variance: %.2f", edge_percentage, texture_variance)
             
             return is_cardboard
         except Exception as e:
-            print(f"Error in cardboard texture detection: {e}")
+            frame_log.warning("Error in cardboard texture detection: %s", e)
             return False
             
-    def detect(self, frame):
+    def detect(self, frame, timings=None):
         """
         Run detection on a frame using either YOLO or pickle model
+        Args:
+            frame: BGR image
+            timings: Optional dict that receives per-stage durations in seconds
+                     (preprocess, predict, postprocess)
         Returns a list of detections
         """
-        detections = []
-        
-        # Enhanced preprocessing
-        enhanced_frame = frame.copy()
-        enhanced_frame = cv2.convertScaleAbs(enhanced_frame, alpha=1.05, beta=3)
+        return self.detect_batch([frame], [timings if timings is not None else {}])[0]
+
+    def warm_up(self, sizes=((640, 480),), batch_sizes=(1,), runs=2, input_sizes=(None,)):
+        """
+        Run dummy frames through the full pipeline so lazy weight initialization,
+        kernel selection and buffer allocation happen before the first real frame
+        Args:
+            sizes: Frame resolutions (width, height) to warm up
+            batch_sizes: Batch sizes to warm up for each resolution
+            runs: Passes per resolution and batch size (the first one is the slow one)
+            input_sizes: Model input sizes to warm up (None is the default size)
+        Returns a dict mapping "WxH/bN" (plus "@imgsz" for non-default input sizes)
+        to the warm-up time in seconds
+        """
+        rng = np.random.default_rng(0)
+        results = {}
+        # Sizes that map to the same model input (exported models, the classifier) run once
+        input_sizes = {self.input_size(imgsz): imgsz for imgsz in input_sizes}
+        for width, height in sizes:
+            # Noise rather than a flat image, so the model produces (and postprocesses) candidates
+            frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            for imgsz in input_sizes.values():
+                for batch_size in batch_sizes:
+                    start = time.perf_counter()
+                    for _ in range(runs):
+                        self.detect_batch([frame] * batch_size, imgsz=imgsz)
+                    key = f"{width}x{height}/b{batch_size}"
+                    if imgsz is not None:
+                        key += f"@{self.input_size(imgsz)}"
+                    results[key] = time.perf_counter() - start
+        return results
+
+    @property
+    def class_names(self):
+        """Class id -> name table of the active model"""
+        if self.is_pickle_model:
+            return dict(MATERIAL_CLASSES)
+        return dict(self.model.names)
+
+    def input_size(self, imgsz=None):
+        """
+        Model input size actually used for a requested imgsz: exported models have a
+        fixed input shape, the material classifier has none (None)
+        """
+        if self.is_pickle_model:
+            return None
+        if self.backend != "torch":
+            return self.model.imgsz
+        return imgsz or YOLO_IMGSZ
+
+    def _preprocessor(self, imgsz=None):
+        """Preprocessing buffers owned by the calling worker thread, one set per input size"""
+        preprocessors = getattr(self._local, "preprocessors", None)
+        if preprocessors is None:
+            preprocessors = self._local.preprocessors = {}
+        imgsz = self.input_size(imgsz) or YOLO_IMGSZ
+        preprocessor = preprocessors.get(imgsz)
+        if preprocessor is None:
+            preprocessor = FramePreprocessor(imgsz=imgsz)
+            preprocessors[imgsz] = preprocessor
+        return preprocessor
+
+    @staticmethod
+    def _to_frame_coords(boxes, meta):
+        """Map (N, 4) x1, y1, x2, y2 boxes from letterbox to original frame coordinates (in place)"""
+        ratio, (pad_x, pad_y), (h, w) = meta
+        boxes[:, [0, 2]] -= pad_x
+        boxes[:, [1, 3]] -= pad_y
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0.0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0.0, h)
+        return boxes
+
+    @staticmethod
+    def _to_detections(boxes, scores, class_ids, names):
+        """
+        Build detection dicts from parallel (N, 4) boxes, (N,) scores and (N,) class ids.
+        Classes missing from names are dropped with one vectorized mask, and every
+        array is converted to Python values in a single call, so the per-object
+        work is only the dict itself.
+        """
+        if len(class_ids) == 0:
+            return []
+        known = np.isin(class_ids, np.fromiter(names, dtype=np.int64, count=len(names)))
+        if not known.all():
+            boxes, scores, class_ids = boxes[known], scores[known], class_ids[known]
+        return [
+            {
+                "class_id": class_id,
+                "class_name": names[class_id],
+                "confidence": confidence,
+                "recyclable": False,  # Default for YOLO
+                "bbox": bbox,
+            }
+            for bbox, confidence, class_id in zip(boxes.tolist(), scores.tolist(), class_ids.tolist())
+        ]
+
+    def detect_batch(self, frames, timings_list=None, imgsz=None):
+        """
+        Run detection on several frames with a single model call
+        Args:
+            frames: List of BGR images
+            timings_list: Optional list of dicts (one per frame) that receive
+                          per-stage durations in seconds. The shared predict
+                          time is reported for every frame in the batch.
+            imgsz: Model input size for the torch backend (defaults to YOLO_IMGSZ)
+        Returns a list of detection lists, one per frame
+        """
+        if timings_list is None:
+            timings_list = [{} for _ in frames]
+        all_detections = [[] for _ in frames]
+        if not frames:
+            return all_detections
+        n = len(frames)
+        preprocessor = self._preprocessor(imgsz)
         
         if self.is_pickle_model:
-            print("📊 Using material classification model (model.pkl)")
+            frame_log.debug("Using material classification model (model.pkl), batch size %d", n)
             try:
-                # Process frame for material classification
-                # Resize to expected input size (224x224 for most image classification models)
-                resized_frame = cv2.resize(enhanced_frame, (224, 224))
-                
-                # Convert from BGR to RGB (OpenCV loads as BGR)
-                rgb_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)
-                
-                # Normalize pixel values to [0,1]
-                normalized_frame = rgb_frame / 255.0
-                
-                # Flatten the image for the model
-                features = normalized_frame.reshape(1, -1)
+                # Resize, enhance, convert to RGB and normalize into reused buffers,
+                # one flattened row per frame
+                start = time.perf_counter()
+                features = preprocessor.classification_features(frames)
+                preprocess_time = time.perf_counter() - start
                 
+                start = time.perf_counter()
                 # Make prediction - try different input formats if needed
                 try:
                     # First try standard flattened format
                     prediction = self.model.predict(features)
-                    print(f"Prediction result: {prediction}")
+                    frame_log.debug("Prediction result: %s", prediction)
                 except Exception as e:
-                    print(f"Error with flattened format: {e}")
+                    frame_log.warning("Error with flattened format: %s", e)
                     # Try channel-last format (common for CNN models)
-                    features = normalized_frame.reshape(1, 224, 224, 3)
+                    features = features.reshape(n, preprocessor.cls_size, preprocessor.cls_size, 3)
                     prediction = self.model.predict(features)
-                    print(f"Prediction with channel-last format: {prediction}")
+                    frame_log.debug("Prediction with channel-last format: %s", prediction)
+                
+                # Try to get actual confidences if model supports it
+                proba = None
+                if hasattr(self.model, 'predict_proba'):
+                    try:
+                        proba = self.model.predict_proba(features)
+                    except Exception:
+                        pass
+                predict_time = time.perf_counter() - start
                 
                 # Process prediction results
-                if hasattr(prediction, '__len__') and len(prediction) > 0:
+                for i, frame in enumerate(frames):
+                    start = time.perf_counter()
+                    timings_list[i]["preprocess"] = preprocess_time / n
+                    timings_list[i]["predict"] = predict_time
+                    if not hasattr(prediction, '__len__') or len(prediction) <= i:
+                        timed(timings_list[i], "postprocess", start)
+                        continue
+                    
                     # Get predicted class index
-                    class_id = int(prediction[0])
+                    class_id = int(prediction[i])
                     
                     # Default high confidence for material detection
                     confidence = 0.95
-                    
-                    # Try to get actual confidence if model supports it
-                    if hasattr(self.model, 'predict_proba'):
+                    if proba is not None:
                         try:
-                            proba = self.model.predict_proba(features)
-                            confidence = float(proba[0][class_id])
+                            confidence = float(proba[i][class_id])
                         except Exception:
                             pass
                     
@@ -280,183 +502,783 @@ class YOLODetector:
                             "bbox": [0, 0, frame.shape[1], frame.shape[0]]  # Full frame bbox
                         }
                         
-                        detections.append(detection)
-                        print(f"🔍 DETECTED: {class_name} (Recyclable: {recyclable}) with confidence {confidence:.2f}")
+                        all_detections[i].append(detection)
+                        frame_log.debug("DETECTED: %s (Recyclable: %s) with confidence %.2f", class_name, recyclable, confidence)
                     else:
-                        print(f"Unknown class ID: {class_id}")
+                        frame_log.warning("Unknown class ID: %s", class_id)
+                    timed(timings_list[i], "postprocess", start)
             except Exception as e:
-                print(f"Error in material classification: {e}")
-                traceback_info = traceback.format_exc()
-                print(f"Traceback: {traceback_info}")
+                frame_log.error("Error in material classification: %s", e, exc_info=True)
+            return all_detections
+        
+        # Letterbox, enhance and normalize all frames into one reused NCHW batch
+        start = time.perf_counter()
+        batch, metas = preprocessor.detection_batch(frames)
+        preprocess_time = time.perf_counter() - start
+        for timings in timings_list:
+            timings["preprocess"] = preprocess_time / n
+        
+        if self.backend != "torch":
+            frame_log.debug("Using YOLO model (%s) - material classification model not active, batch size %d", self.backend, n)
+            # Exported model: one inference call, NMS-free postprocessing
+            start = time.perf_counter()
+            output = self.model.infer(batch)
+            predict_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            outputs = self.model.postprocess(output, metas, conf=self.confidence_threshold, iou=0.4)
+            postprocess_time = (time.perf_counter() - start) / n
+            
+            for i, (boxes, scores, class_ids) in enumerate(outputs):
+                start = time.perf_counter()
+                timings_list[i]["predict"] = predict_time
+                all_detections[i] = self._to_detections(boxes, scores, class_ids, self.model.names)
+                timings_list[i]["postprocess"] = postprocess_time + time.perf_counter() - start
         else:
-            print("Using YOLO model - material classification model not active")
-            # YOLO detection logic
+            frame_log.debug("Using YOLO model - material classification model not active, batch size %d", n)
+            import torch
+            # YOLO detection logic, one predict call on the already letterboxed batch
+            start = time.perf_counter()
             results = self.model.predict(
-                enhanced_frame, 
+                torch.from_numpy(batch), 
                 conf=self.confidence_threshold, 
                 iou=0.4,
+                imgsz=preprocessor.imgsz,
                 verbose=False
             )
+            predict_time = time.perf_counter() - start
             
-            # Process YOLO results
-            if results and len(results) > 0:
-                result = results[0]
-                for box in result.boxes:
-                    class_id = int(box.cls.item())
-                    confidence = float(box.conf.item())
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    
-                    if class_id < len(result.names):
-                        class_name = result.names[class_id]
-                        detection = {
-                            "class_id": class_id,
-                            "class_name": class_name,
-                            "confidence": confidence,
-                            "recyclable": False,  # Default for YOLO
-                            "bbox": [x1, y1, x2, y2]
-                        }
-                        detections.append(detection)
+            # Process YOLO results: one device-to-NumPy copy per tensor, then array ops
+            for i, result in enumerate(results or []):
+                start = time.perf_counter()
+                timings_list[i]["predict"] = predict_time
+                boxes = result.boxes
+                xyxy = self._to_frame_coords(boxes.xyxy.cpu().numpy().astype(np.float32), metas[i])
+                scores = boxes.conf.cpu().numpy()
+                class_ids = boxes.cls.cpu().numpy().astype(np.int64)
+                all_detections[i] = self._to_detections(xyxy, scores, class_ids, result.names)
+                timed(timings_list[i], "postprocess", start)
         
-        return detections
-
-# Initialize our detector directly with the model.pkl path
-print("\n" + "="*80)
-print("INITIALIZING MATERIAL CLASSIFICATION MODEL")
-print("="*80)
+        return all_detections
 
 # Look specifically for model.pkl
 model_path = os.path.join(os.path.dirname(__file__), "models", "model.pkl")
-if os.path.exists(model_path):
-    print(f"✅ FOUND model.pkl at {model_path}")
-    print(f"Available material classes: {', '.join(MATERIAL_CLASSES.values())}")
-else:
-    print(f"❌ model.pkl NOT FOUND at {model_path}")
 
-# Create the detector with model.pkl path
-detector = YOLODetector(model_path)
+def create_detector():
+    """
+    Initialize our detector with the model.pkl path (called from the startup hook,
+    so importing this module does not load any model libraries)
+    """
+    log.info("Initializing material classification model")
+    if os.path.exists(model_path):
+        log.info("Found model.pkl at %s, material classes: %s", model_path, ", ".join(MATERIAL_CLASSES.values()))
+    else:
+        log.warning("model.pkl not found at %s", model_path)
+
+    detector = YOLODetector(model_path)
+
+    # Double check we're using the right model
+    if detector.is_pickle_model:
+        log.info("Using material classification model (model.pkl): Paper, Plastic, Glass, Metal, Others")
+    else:
+        log.warning("Using YOLO model as fallback - material classification unavailable "
+                    "(this likely means there was an error loading model.pkl)")
+    return detector
 
-# Double check we're using the right model
-if detector.is_pickle_model:
-    print("✅ SUCCESS: Using material classification model (model.pkl)")
-    print("   This will classify materials as: Paper, Plastic, Glass, Metal, Others")
-else:
-    print("⚠️ WARNING: Using YOLO model as fallback - material classification unavailable")
-    print("   This likely means there was an error loading model.pkl")
+# Inference pool configuration (override with environment variables)
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")  # "thread" or "process"
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "8"))
+# "wait" holds the connection until a slot frees up, "reject" drops the frame immediately
+INFERENCE_QUEUE_POLICY = os.environ.get("INFERENCE_QUEUE_POLICY", "wait")
 
-print("="*80 + "\n")
+# Created by the startup hook
+detector = None
+inference_pool = None
+
+# Temporal layer (override with environment variables): frames whose downscaled
+# grayscale thumbnail differs from the last inferred frame by less than
+# TEMPORAL_DIFF_THRESHOLD (mean absolute difference, 0-255) skip inference, at most
+# TEMPORAL_MAX_SKIP frames in a row; results are tracked and EMA-smoothed per connection
+TEMPORAL_ENABLED = os.environ.get("TEMPORAL_SMOOTHING", "1") == "1"
+TEMPORAL_DIFF_THRESHOLD = float(os.environ.get("TEMPORAL_DIFF_THRESHOLD", "3.0"))
+TEMPORAL_MAX_SKIP = int(os.environ.get("TEMPORAL_MAX_SKIP", "10"))
+TEMPORAL_EMA_ALPHA = float(os.environ.get("TEMPORAL_EMA_ALPHA", "0.5"))
+
+# Region of interest (override with environment variables): only the ROI of each
+# frame is decoded into the model input. ROI_DEFAULT ("x1,y1,x2,y2" fractions) applies
+# to every connection, ROI_CONFIG is a JSON file mapping session ids to ROIs, and a
+# ?roi=x1,y1,x2,y2 query parameter on /ws/detect overrides both
+ROI_DEFAULT = parse_roi(os.environ.get("ROI_DEFAULT", ""))
+ROI_BY_SESSION = load_roi_config(os.environ.get("ROI_CONFIG", ""))
+# Motion gate: frames where less than MOTION_MIN_AREA of the ROI differs from the
+# running-average background skip inference (also at most TEMPORAL_MAX_SKIP in a row)
+MOTION_GATE_ENABLED = os.environ.get("MOTION_GATE", "0") == "1"
+MOTION_MIN_AREA = float(os.environ.get("MOTION_MIN_AREA", "0.01"))
+MOTION_LEARNING_RATE = float(os.environ.get("MOTION_LEARNING_RATE", "0.05"))
+
+# Result cache for byte-identical images (override with environment variables):
+# up to RESULT_CACHE_SIZE results (0, the default, disables it), each valid for RESULT_CACHE_TTL seconds
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "0"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "60"))
+result_cache = ResultCache(max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def frame_cache_key(payload, roi=None, imgsz=None):
+    """
+    Result cache key: hash of the encoded image (the binary frame header is excluded),
+    salted with the ROI and model input size since they change the result
+    """
+    salt = repr((roi, imgsz)).encode() if roi is not None or imgsz is not None else b""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return ResultCache.key(image_array(payload), salt)
+    return ResultCache.key(payload.encode(), salt)
+
+def base64_image_array(data):
+    """Encoded image bytes of a base64 image (optionally a data URL) as a uint8 array"""
+    # Skip the data URL prefix to get the base64 data
+    if "," in data:
+        base64_data = data.split(",")[1]
+    else:
+        base64_data = data
+    return np.frombuffer(base64.b64decode(base64_data), dtype=np.uint8)
+
+def frame_image_array(payload):
+    """
+    Encoded image of a frame payload: bytes use the binary frame protocol (read in
+    place), str is a base64 data URL
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return image_array(payload)
+    return base64_image_array(payload)
+
+def decode_frame(payload):
+    """
+    Decode a frame payload into a BGR frame.
+    Returns None if the data is not a valid image.
+    """
+    return cv2.imdecode(frame_image_array(payload), cv2.IMREAD_COLOR)
+
+def check_scene(gray, gate, scene):
+    """
+    Scene checks on a reduced-size grayscale ROI: compares it with the last inferred
+    frame (temporal layer) and the background model (motion gate), storing the new
+    "signature", "background" and "motion" in scene
+    Returns True if inference can be skipped
+    """
+    unchanged = False
+    if TEMPORAL_ENABLED:
+        scene["signature"] = frame_signature(gray)
+        unchanged = not scene_changed(scene["signature"], gate["reference"], TEMPORAL_DIFF_THRESHOLD)
+    if MOTION_GATE_ENABLED:
+        scene["motion"], scene["background"] = motion_fraction(gray, gate["background"], MOTION_LEARNING_RATE)
+        unchanged = unchanged or scene["motion"] < MOTION_MIN_AREA
+    return unchanged and gate["allow_skip"]
+
+def process_batch(detector, items, imgsz=None):
+    """
+    Inference pool job: decode a batch of frames and run detection on them together.
+    items are (payload, gate) pairs; gate holds the connection's "roi", the scene
+    thumbnail of its last inferred frame ("reference"), its motion gate "background"
+    and whether this frame may skip inference ("allow_skip"). imgsz is the model
+    input size chosen by the QoS controller (None for the default).
+    Returns a list of (detections, timings, scene, skipped, imgsz) in item order:
+    detections is None when the image was invalid and boxes are in full-frame
+    coordinates, skipped frames (scene unchanged or no motion in the ROI) are
+    neither fully decoded nor run through the model, scene holds the state
+    to pass back in the connection's next gate, and imgsz is the model input
+    size actually used.
+    """
+    outputs = []
+    frames, valid, offsets = [], [], []
+    for payload, gate in items:
+        timings, scene = {}, {}
+        frame, skipped = None, False
+        start = time.perf_counter()
+        try:
+            image = frame_image_array(payload)
+            if TEMPORAL_ENABLED or MOTION_GATE_ENABLED:
+                # A 1/8 scale grayscale decode costs a fraction of the full decode
+                small = cv2.imdecode(image, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+                if small is not None:
+                    skipped = check_scene(crop(small, gate["roi"])[0], gate, scene)
+                    if not skipped:
+                        frame = cv2.imdecode(image, cv2.IMREAD_COLOR)
+            else:
+                frame = cv2.imdecode(image, cv2.IMREAD_COLOR)
+        except Exception:
+            frame, skipped = None, False
+        timed(timings, "decode", start)
+        if frame is not None:
+            # Only the ROI is letterboxed and inferred (a view, not a copy)
+            frame, offset = crop(frame, gate["roi"])
+            frames.append(frame)
+            valid.append(len(outputs))
+            offsets.append(offset)
+        outputs.append(([] if skipped else None, timings, scene, skipped, detector.input_size(imgsz)))
+    
+    if frames:
+        results = detector.detect_batch(frames, [outputs[i][1] for i in valid], imgsz=imgsz)
+        for i, offset, detections in zip(valid, offsets, results):
+            outputs[i] = (offset_detections(detections, offset),) + outputs[i][1:]
+    return outputs
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# Micro-batching configuration: frames from all connections are grouped for up to
+# BATCH_MAX_WAIT_MS or BATCH_MAX_SIZE frames, whichever comes first (1 disables batching)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Adaptive quality of service (override with environment variables): when the p95
+# frame latency exceeds QOS_LATENCY_TARGET_MS or QOS_QUEUE_HIGH jobs are queued,
+# the model input size steps down QOS_LEVELS (torch backend only, exported models
+# have a fixed input size) and the batch window widens towards QOS_MAX_WAIT_MS;
+# both step back once the load drops. QOS_OPERATING_POINTS is the JSON written by
+# validate_model.py --imgsz-levels, reported with the current level
+QOS_ENABLED = os.environ.get("QOS_ADAPTIVE", "0") == "1"
+QOS_LEVELS = [int(level) for level in os.environ.get("QOS_LEVELS", "640,480,320").split(",") if level.strip()]
+QOS_LATENCY_TARGET_MS = float(os.environ.get("QOS_LATENCY_TARGET_MS", "250"))
+QOS_MAX_WAIT_MS = float(os.environ.get("QOS_MAX_WAIT_MS", "20"))
+QOS_QUEUE_HIGH = int(os.environ.get("QOS_QUEUE_HIGH", str(INFERENCE_QUEUE_SIZE)))
+QOS_INTERVAL = float(os.environ.get("QOS_INTERVAL", "2"))
+QOS_OPERATING_POINTS = os.environ.get("QOS_OPERATING_POINTS", "")
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+async def run_detection_batch(payloads):
+    imgsz = qos.imgsz if qos is not None else None
+    return await inference_pool.submit(
+        process_batch, payloads, imgsz, wait=INFERENCE_QUEUE_POLICY != "reject"
+    )
 
-    async def broadcast(self, message: Dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+batch_scheduler = BatchScheduler(run_detection_batch, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+log.info("Micro-batching: up to %d frames / %s ms", BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
 
-manager = ConnectionManager()
+qos = None
+if QOS_ENABLED:
+    qos = QosController(
+        levels=QOS_LEVELS,
+        wait_ms=(BATCH_MAX_WAIT_MS, max(BATCH_MAX_WAIT_MS, QOS_MAX_WAIT_MS)),
+        target_ms=QOS_LATENCY_TARGET_MS,
+        queue_high=QOS_QUEUE_HIGH,
+        interval=QOS_INTERVAL,
+        queue_depth=lambda: inference_pool.queue_depth + batch_scheduler.info()["pending"],
+    )
+    if QOS_OPERATING_POINTS:
+        qos.load_operating_points(QOS_OPERATING_POINTS)
+    log.info("Adaptive QoS: input sizes %s, p95 target %s ms, batch window %s-%s ms",
+             QOS_LEVELS, QOS_LATENCY_TARGET_MS, BATCH_MAX_WAIT_MS, QOS_MAX_WAIT_MS)
+
+def observe_latency(latency):
+    """Feed one frame's end-to-end latency to the QoS controller and apply level changes"""
+    if qos is not None and qos.observe(latency):
+        batch_scheduler.max_wait = qos.wait_ms / 1000.0
+        log.info("QoS level %d: input size %d, batch window %.1f ms",
+                 qos.level, detector.input_size(qos.imgsz) or 0, qos.wait_ms)
+
+# Readiness: set once the model is loaded and the startup warm-up has finished
+server_ready = False
+# Cold start timings in seconds (first_inference covers decode to postprocess of the first real frame)
+startup_timings = {"import": None, "model_load": None, "warmup": None, "first_inference": None}
+
+def parse_sizes(value):
+    """Parse "640x480,1280x720" (or "640" for a square frame) into [(width, height), ...]"""
+    sizes = []
+    for item in value.replace(" ", "").split(","):
+        if item:
+            width, _, height = item.lower().partition("x")
+            sizes.append((int(width), int(height or width)))
+    return sizes
+
+# Warm-up configuration: camera resolutions run through the full pipeline at startup
+# (at batch size 1 and BATCH_MAX_SIZE) before the server reports ready
+WARMUP_SIZES = parse_sizes(os.environ.get("WARMUP_SIZES", "640x480"))
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", "2"))
+# Per resolution/batch size warm-up times of the first pool worker, reported by /api/ready
+warmup_detail = {}
+
+def warm_up_worker(detector):
+    """Inference pool job: warm up the detector owned by the worker (at every QoS input size)"""
+    batch_sizes = sorted({1, BATCH_MAX_SIZE})
+    input_sizes = QOS_LEVELS if QOS_ENABLED else (None,)
+    return detector.warm_up(WARMUP_SIZES, batch_sizes, WARMUP_RUNS, input_sizes)
+
+@app.on_event("startup")
+async def start_inference_pool():
+    global detector, inference_pool, server_ready
+    start = time.perf_counter()
+    limit_worker_threads(WORKER_THREADS)
+    detector = await asyncio.to_thread(create_detector)
+    inference_pool = InferencePool(
+        detector=detector,
+        executor=INFERENCE_EXECUTOR,
+        workers=INFERENCE_WORKERS,
+        max_queue=INFERENCE_QUEUE_SIZE,
+        detector_factory=YOLODetector,
+        factory_args=(model_path,),
+    )
+    startup_timings["model_load"] = time.perf_counter() - start
+    # Cached results are only valid for the model that produced them
+    result_cache.set_version(detector.model_version)
+    log.info("Inference pool: %s x%d, queue size %d (%s)", INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_QUEUE_POLICY)
+    
+    start = time.perf_counter()
+    # Exactly one warm-up per pool worker, so every per-thread/per-process detector is warm before ready
+    results = await inference_pool.run_on_every_worker(warm_up_worker)
+    startup_timings["warmup"] = time.perf_counter() - start
+    warmup_detail.update({key: round(seconds, 3) for key, seconds in results[0].items()})
+    log.info("Warm-up per resolution/batch size (s): %s", warmup_detail)
+    server_ready = True
+    log.info("Ready for traffic (pid %d): import %.2f s, model load %.2f s, warm-up %.2f s", os.getpid(),
+             startup_timings["import"], startup_timings["model_load"], startup_timings["warmup"])
+
+@app.on_event("shutdown")
+async def shutdown_inference_pool():
+    await batch_scheduler.shutdown()
+    if inference_pool is not None:
+        inference_pool.shutdown()
+    sessions.close()
+
+# Status push configuration: every subscriber buffers up to STATUS_QUEUE_SIZE
+# messages; when it falls behind, SLOW_CONSUMER_POLICY drops its oldest message
+# ("drop_oldest") or the subscriber ("disconnect"). A WebSocket send that takes
+# longer than BROADCAST_SEND_TIMEOUT seconds also drops the subscriber
+BROADCAST_SEND_TIMEOUT = float(os.environ.get("BROADCAST_SEND_TIMEOUT", "2"))
+STATUS_QUEUE_SIZE = int(os.environ.get("STATUS_QUEUE_SIZE", "16"))
+SLOW_CONSUMER_POLICY = os.environ.get("SLOW_CONSUMER_POLICY", "drop_oldest")
+# Seconds between SSE keepalive comments
+STATUS_KEEPALIVE_SECONDS = float(os.environ.get("STATUS_KEEPALIVE_SECONDS", "15"))
+# With a shared session store, state changes made by other workers are picked up
+# by re-reading the subscribed sessions every STATUS_RECHECK_SECONDS
+STATUS_RECHECK_SECONDS = float(os.environ.get("STATUS_RECHECK_SECONDS", "1"))
+
+# Registry of /ws/detect connections and status subscribers
+manager = ConnectionManager(max_queue=STATUS_QUEUE_SIZE, policy=SLOW_CONSUMER_POLICY,
+                            send_timeout=BROADCAST_SEND_TIMEOUT)
+
+# Last status pushed per subscribed session, so only changes are published
+published_status: Dict[str, Dict] = {}
+
+def status_topic(session_id):
+    return f"status:{session_id}"
+
+def status_message(session_id, state):
+    return {
+        "type": "status",
+        "session_id": session_id,
+        "recyclable_detected": state["recyclable_detected"],
+        "last_detection": state["last_detection"],
+    }
+
+async def subscribe_status(session_id, websocket=None):
+    """
+    Subscribe to a session's status pushes (websocket=None for SSE)
+    Returns the Subscriber, with the current status already queued as its first message
+    """
+    message = status_message(session_id, await session_call(sessions.get, session_id))
+    subscriber = manager.subscribe(status_topic(session_id), websocket)
+    subscriber.offer(dumps_json(message))
+    published_status[session_id] = message
+    return subscriber
+
+def unsubscribe_status(session_id, subscriber):
+    manager.unsubscribe(subscriber)
+    if status_topic(session_id) not in manager.topics:
+        published_status.pop(session_id, None)
+
+async def publish_status(session_id, state):
+    """Push a session's state to its status subscribers if it differs from the last push"""
+    if status_topic(session_id) not in manager.topics:
+        return
+    message = status_message(session_id, state)
+    if published_status.get(session_id) == message:
+        return
+    published_status[session_id] = message
+    status_pushes_total.inc(manager.broadcast(message, status_topic(session_id)))
+
+async def watch_shared_sessions():
+    """
+    Background task for shared session stores: publishes state changes made by
+    other workers to this worker's subscribers
+    """
+    while True:
+        await asyncio.sleep(STATUS_RECHECK_SECONDS)
+        for topic in list(manager.topics):
+            session_id = topic.partition(":")[2]
+            try:
+                await publish_status(session_id, await session_call(sessions.get, session_id))
+            except Exception as e:
+                log.warning("Status recheck failed for session %s: %s", session_id, e)
+
+status_watcher = None
+
+@app.on_event("startup")
+async def start_status_watcher():
+    global status_watcher
+    if SESSION_STORE != "memory":
+        status_watcher = asyncio.create_task(watch_shared_sessions())
+
+@app.on_event("shutdown")
+async def stop_status_watcher():
+    if status_watcher is not None:
+        status_watcher.cancel()
+    manager.close()
+
+async def read_frames(websocket: WebSocket, mailbox: LatestFrameMailbox):
+    """
+    Reader task for one connection: receives messages as fast as the client sends
+    them and posts them to the mailbox, where newer frames replace older ones.
+    """
+    client = websocket.client
+    try:
+        while True:
+            # Receive either a binary frame or a base64 encoded image from the client
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            data = message.get("bytes")
+            if data is not None:
+                try:
+                    frame_header = parse_header(data)
+                except FrameProtocolError as e:
+                    frame_log.warning("Bad binary frame from %s:%s: %s", client[0], client[1], e)
+                    mailbox.put_control(("error", f"Invalid frame: {e}", None))
+                    continue
+                mailbox.put_frame(("frame", data, frame_header))
+                continue
+            
+            data = message.get("text") or ""
+            if data == "RESET_DETECTION":
+                # A frame still pending from before the reset must not set the state again
+                mailbox.put_control(("reset", data, None), drop_frame=True)
+            else:
+                mailbox.put_frame(("frame", data, None))
+    except Exception as e:
+        mailbox.close(e)
+    else:
+        mailbox.close()
+
+# Prometheus-style metrics exposed on /metrics
+metrics = Registry()
+stage_seconds = metrics.histogram(
+    "detection_stage_seconds", "Time spent per frame in each processing stage", labels=("stage",))
+frames_total = metrics.counter("detection_frames_total", "Frames processed by the detector")
+detections_total = metrics.counter(
+    "detection_detections_total", "Detections returned, by class name", labels=("class_name",))
+invalid_images_total = metrics.counter("detection_invalid_images_total", "Frames that could not be decoded")
+rejected_frames_total = metrics.counter("detection_rejected_frames_total", "Frames rejected because the inference queue was full")
+dropped_frames_total = metrics.counter("detection_dropped_frames_total", "Frames superseded by a newer frame before processing")
+disconnects_total = metrics.counter("detection_disconnects_total", "WebSocket disconnects")
+cache_hits_total = metrics.counter("detection_cache_hits_total", "Frames answered from the result cache")
+cache_misses_total = metrics.counter("detection_cache_misses_total", "Frames not found in the result cache")
+unchanged_responses_total = metrics.counter("detection_unchanged_responses_total", "Responses not sent in delta mode because nothing changed")
+response_bytes_total = metrics.counter(
+    "detection_response_bytes_total", "Encoded response bytes sent, by format", labels=("format",))
+skipped_frames_total = metrics.counter("detection_skipped_frames_total", "Frames answered from the tracker because the scene had not changed")
+status_pushes_total = metrics.counter("detection_status_pushes_total", "Status messages pushed to subscribers")
+metrics.gauge("detection_status_subscribers", "Open status push subscriptions (SSE and /ws/status)",
+              callback=lambda: manager.subscriber_count)
+metrics.gauge("detection_active_connections", "Open /ws/detect connections",
+              callback=lambda: len(manager.active_connections))
+metrics.gauge("detection_queue_depth", "Inference jobs queued or running in the worker pool",
+              callback=lambda: inference_pool.queue_depth)
+metrics.gauge("detection_batch_pending", "Frames waiting for the next micro-batch",
+              callback=lambda: batch_scheduler.info()["pending"])
+
+def observe_timings(timings):
+    """Record one frame's stage timings (seconds) in the stage histogram"""
+    for stage, seconds in timings.items():
+        stage_seconds.observe(seconds, stage)
+
+# Delta mode (?delta=1) resends an unchanged result at least every DELTA_KEEPALIVE_SECONDS
+DELTA_KEEPALIVE_SECONDS = float(os.environ.get("DELTA_KEEPALIVE_SECONDS", "5"))
 
 # Main detection endpoint
 @app.websocket("/ws/detect")
-async def websocket_endpoint(websocket: WebSocket):
-    global recyclable_detected, last_detection_result
+async def websocket_endpoint(websocket: WebSocket, session_id: str = DEFAULT_SESSION, roi: str = "",
+                             format: str = "json", delta: int = 0):
     await manager.connect(websocket)
     client = websocket.client
-    print(f"New WebSocket connection from {client[0]}:{client[1]}")
+    log.info("New WebSocket connection from %s:%s (session %s)", client[0], client[1], session_id)
+    
+    # Response encoding negotiated through ?format= (json, msgpack or packed)
+    try:
+        response_format = check_format(format)
+    except ResponseFormatError as e:
+        log.warning("Falling back to json for %s:%s: %s", client[0], client[1], e)
+        await websocket.send_json({"error": str(e)})
+        response_format = "json"
+    class_ids = {}
+    if response_format != "json":
+        # Binary responses carry class ids only, so send the class table once
+        class_names = detector.class_names
+        class_ids = {name: class_id for class_id, name in class_names.items()}
+        await websocket.send_text(dumps_json({"format": response_format, "classes": class_names}))
+    # ?delta=1 only sends a response when the detections or session state changed
+    delta_filter = DeltaFilter(max_interval=DELTA_KEEPALIVE_SECONDS) if delta else None
+    
+    # Region of interest: query parameter, then per-session config, then the default
+    try:
+        zone = parse_roi(roi) if roi else ROI_BY_SESSION.get(session_id, ROI_DEFAULT)
+    except ValueError as e:
+        log.warning("Ignoring invalid ROI from %s:%s: %s", client[0], client[1], e)
+        await websocket.send_json({"error": f"Invalid roi: {e}"})
+        zone = ROI_BY_SESSION.get(session_id, ROI_DEFAULT)
+    
+    # Only the newest pending frame is kept; superseded frames count as dropped
+    mailbox = LatestFrameMailbox()
+    reader = asyncio.create_task(read_frames(websocket, mailbox))
+    # Dropped frames not yet reported to the client (responses suppressed in
+    # delta mode, or more than a packed header can carry)
+    unreported_dropped = 0
+    # Temporal layer and motion gate: scene thumbnail of the last inferred frame,
+    # background model, tracker, and counts for the skip rate
+    temporal = TemporalSmoother(alpha=TEMPORAL_EMA_ALPHA) if TEMPORAL_ENABLED else None
+    reference, background, since_inference = None, None, 0
+    last_detections, inferred_count, skipped_count = [], 0, 0
+    # Model input size of the last inferred frame (changes with the QoS level)
+    input_imgsz = detector.input_size()
+    gating = TEMPORAL_ENABLED or MOTION_GATE_ENABLED
     
     try:
         while True:
-            # Receive the base64 encoded image from the client
-            data = await websocket.receive_text()
+            kind, data, frame_header = await mailbox.get()
+            
+            if kind == "error":
+                await websocket.send_json({"error": data})
+                continue
             
             # Check if it's a reset signal
-            if data == "RESET_DETECTION":
-                recyclable_detected = False
-                last_detection_result = {"detected": False, "class": None, "confidence": 0.0, "recyclable": False}
-                print(f"Reset detection request from {client[0]}:{client[1]}")
+            if kind == "reset":
+                await publish_status(session_id, await session_call(sessions.reset, session_id))
+                if temporal is not None:
+                    temporal.reset()
+                if delta_filter is not None:
+                    delta_filter.reset()
+                # The next frame is always inferred
+                last_detections, since_inference = [], TEMPORAL_MAX_SKIP
+                dropped = mailbox.take_dropped()
+                if dropped:
+                    dropped_frames_total.inc(dropped)
+                log.info("Reset detection request from %s:%s (session %s)", client[0], client[1], session_id)
                 await websocket.send_json({"status": "reset_complete"})
                 continue
             
-            # Skip the data URL prefix to get the base64 data
-            if "," in data:
-                base64_data = data.split(",")[1]
-            else:
-                base64_data = data
+            # A byte-identical image seen recently is answered without decoding or inference
+            cache_key, cached = None, None
+            if result_cache.enabled:
+                start = time.perf_counter()
+                imgsz = detector.input_size(qos.imgsz) if qos is not None else None
+                cache_key = frame_cache_key(data, zone, imgsz)
+                cached = result_cache.get(cache_key)
+                (cache_hits_total if cached is not None else cache_misses_total).inc()
             
-            # Decode the base64 image
-            image_bytes = base64.b64decode(base64_data)
-            image_array = np.frombuffer(image_bytes, dtype=np.uint8)
-            frame = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+            if cached is not None:
+                detections, signature, imgsz = cached
+                scene = {"signature": signature} if signature is not None else {}
+                skipped = False
+                timings = {}
+                timed(timings, "cache", start)
+            else:
+                # Decode the image and run detection in the inference pool,
+                # batched together with frames from other connections
+                try:
+                    # Skipping is only allowed against a recent enough inferred frame
+                    gate = {"roi": zone, "reference": reference, "background": background,
+                            "allow_skip": since_inference < TEMPORAL_MAX_SKIP}
+                    start = time.perf_counter()
+                    detections, timings, scene, skipped, imgsz = await batch_scheduler.submit((data, gate))
+                    observe_latency(time.perf_counter() - start)
+                except PoolBusyError:
+                    rejected_frames_total.inc()
+                    await websocket.send_json({"error": "Server busy, frame dropped"})
+                    continue
+                if cache_key is not None and detections is not None and not skipped:
+                    result_cache.put(cache_key, (detections, scene.get("signature"), imgsz))
             
-            if frame is None:
-                print(f"Invalid image data received from {client[0]}:{client[1]}")
-                await websocket.send_json({"error": "Invalid image data"})
+            if detections is None:
+                invalid_images_total.inc()
+                frame_log.warning("Invalid image data received from %s:%s", client[0], client[1])
+                error = {"error": "Invalid image data"}
+                if frame_header is not None:
+                    error["frame"] = frame_header.to_dict()
+                await websocket.send_json(error)
                 continue
             
-            # Run detection on the frame
-            detections = detector.detect(frame)
+            frames_total.inc()
+            background = scene.get("background", background)
+            if skipped:
+                # Nothing changed in the zone: repeat the tracked (or last) result
+                skipped_frames_total.inc()
+                skipped_count += 1
+                since_inference += 1
+                detections = temporal.current() if temporal is not None else last_detections
+            else:
+                inferred_count += 1
+                input_imgsz = imgsz
+                reference, since_inference = scene.get("signature"), 0
+                if temporal is not None:
+                    detections = temporal.update(detections)
+                last_detections = detections
+            if startup_timings["first_inference"] is None and not skipped and cached is None:
+                startup_timings["first_inference"] = sum(timings.values())
+                log.info("First inference took %.1f ms", startup_timings["first_inference"] * 1000)
+            for detection in detections:
+                detections_total.inc(1, detection["class_name"])
             
-            # Update detection status
-            if detections:
-                highest_conf = max(detections, key=lambda x: x['confidence'])
-                
-                # Update recyclable status based on material class
-                recyclable = highest_conf.get('recyclable', False)
-                if recyclable:
-                    recyclable_detected = True
-                    print(f"Recyclable material detected: {highest_conf['class_name']} with {highest_conf['confidence']:.2f} confidence")
-                else:
-                    print(f"Non-recyclable material detected: {highest_conf['class_name']} with {highest_conf['confidence']:.2f} confidence")
-                
-                # Always update last_detection_result with the highest confidence detection
-                last_detection_result = {
-                    "detected": True,
-                    "class": highest_conf['class_name'],
-                    "confidence": highest_conf['confidence'],
-                    "recyclable": recyclable
-                }
+            # Update this session's detection status with the highest confidence detection
+            # (a skipped frame carries the previous result, so there is nothing new to store)
+            if detections and not skipped:
+                state, changed = await session_call(sessions.update, session_id, detections)
+                if changed:
+                    await publish_status(session_id, state)
+                last_detection = state["last_detection"]
+                frame_log.debug("%s material detected: %s with %.2f confidence",
+                                "Recyclable" if last_detection["recyclable"] else "Non-recyclable",
+                                last_detection["class"], last_detection["confidence"])
+            else:
+                state = await session_call(sessions.get, session_id)
             
             # Send result back to client
+            dropped = mailbox.take_dropped()
+            if dropped:
+                dropped_frames_total.inc(dropped)
+            unreported_dropped += dropped
+            if response_format == "packed":
+                dropped = min(unreported_dropped, MAX_PACKED_DROPPED)
+            else:
+                dropped = unreported_dropped
             result = {
                 "detections": detections,
-                "recyclable_detected": recyclable_detected,
-                "last_detection": last_detection_result
+                "recyclable_detected": state["recyclable_detected"],
+                "last_detection": state["last_detection"],
+                "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+                "dropped_frames": dropped,
+                "total_dropped_frames": mailbox.dropped,
+                # Model input size the detections came from (None for the material classifier)
+                "imgsz": input_imgsz,
             }
-            await websocket.send_json(result)
+            if result_cache.enabled:
+                result["cached"] = cached is not None
+            if gating:
+                result["temporal"] = {
+                    "skipped": skipped,
+                    "skip_rate": round(skipped_count / (skipped_count + inferred_count), 4),
+                }
+                if "motion" in scene:
+                    result["temporal"]["motion"] = round(scene["motion"], 4)
+            if frame_header is not None:
+                # Echo the frame header so binary clients can match results to frames
+                result["frame"] = frame_header.to_dict()
+            if delta_filter is not None and not delta_filter.should_send(result):
+                unchanged_responses_total.inc()
+                inference_pool.record(timings)
+                observe_timings(timings)
+                continue
+            start = time.perf_counter()
+            message = encode_response(result, response_format, class_ids)
+            timed(timings, "serialize", start)
+            response_bytes_total.inc(len(message), response_format)
+            start = time.perf_counter()
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+            unreported_dropped -= dropped
+            timed(timings, "send", start)
+            inference_pool.record(timings)
+            observe_timings(timings)
             
-    except WebSocketDisconnect:
-        print(f"WebSocket disconnected: {client[0]}:{client[1]}")
+    except (WebSocketDisconnect, MailboxClosed):
+        disconnects_total.inc()
+        log.info("WebSocket disconnected: %s:%s (%d/%d frames dropped)", client[0], client[1], mailbox.dropped, mailbox.received)
         manager.disconnect(websocket)
     except Exception as e:
-        print(f"Error in WebSocket connection from {client[0]}:{client[1]}: {str(e)}")
-        if websocket in manager.active_connections:
-            manager.disconnect(websocket)
+        disconnects_total.inc()
+        log.error("Error in WebSocket connection from %s:%s: %s", client[0], client[1], e)
+        manager.disconnect(websocket)
+    finally:
+        reader.cancel()
 
 # API endpoint to check if a recyclable has been detected
 @app.get("/api/recyclable-status")
-async def get_recyclable_status():
-    global recyclable_detected, last_detection_result
-    print(f"Status check: recyclable_detected={recyclable_detected}")
+async def get_recyclable_status(session_id: str = DEFAULT_SESSION):
+    state = await session_call(sessions.get, session_id)
+    frame_log.debug("Status check: session=%s recyclable_detected=%s", session_id, state["recyclable_detected"])
     return {
-        "recyclable_detected": recyclable_detected,
-        "last_detection": last_detection_result
+        "session_id": session_id,
+        "recyclable_detected": state["recyclable_detected"],
+        "last_detection": state["last_detection"]
     }
 
+# Status push: the same state as /api/recyclable-status, sent once on subscribe
+# and then only when recyclable_detected or last_detection changes
+@app.get("/api/recyclable-status/stream")
+async def stream_recyclable_status(session_id: str = DEFAULT_SESSION):
+    """Server-Sent Events stream of a session's detection status"""
+    subscriber = await subscribe_status(session_id)
+
+    async def events():
+        try:
+            while not subscriber.closed:
+                text = await subscriber.get(STATUS_KEEPALIVE_SECONDS)
+                # A comment line on timeout keeps proxies from closing an idle stream
+                yield f"data: {text}\n\n" if text is not None else ": keepalive\n\n"
+        finally:
+            unsubscribe_status(session_id, subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/status")
+async def status_websocket(websocket: WebSocket, session_id: str = DEFAULT_SESSION):
+    """WebSocket status channel: pushes the same messages as the SSE stream"""
+    await websocket.accept()
+    # All sends go through the subscriber's sender task; this loop only waits for the client to leave
+    subscriber = await subscribe_status(session_id, websocket)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except Exception:
+        pass
+    finally:
+        unsubscribe_status(session_id, subscriber)
+
+# API endpoint exposing inference pool configuration and per-stage latency
+@app.get("/api/inference-stats")
+async def get_inference_stats():
+    stats = inference_pool.info()
+    stats["batching"] = batch_scheduler.info()
+    stats["sessions"] = await session_call(sessions.info)
+    stats["result_cache"] = result_cache.info()
+    stats["status_push"] = manager.info()
+    if qos is not None:
+        stats["qos"] = qos.info()
+    return stats
+
+# Readiness probe for load balancers and the multi-worker launcher
+@app.get("/api/ready")
+async def get_ready():
+    body = {
+        "ready": server_ready,
+        "pid": os.getpid(),
+        "backend": None if detector is None else "pickle" if detector.is_pickle_model else detector.backend,
+        "startup_seconds": {stage: round(seconds, 3) if seconds is not None else None
+                            for stage, seconds in startup_timings.items()},
+        "warmup_seconds": warmup_detail,
+    }
+    return JSONResponse(body, status_code=200 if server_ready else 503)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # API endpoint to reset the detection status
 @app.post("/api/reset-detection")
-async def reset_detection():
-    global recyclable_detected, last_detection_result
-    recyclable_detected = False
-    last_detection_result = {"detected": False, "class": None, "confidence": 0.0, "recyclable": False}
-    print("Detection status reset via API")
-    return {"status": "success", "message": "Detection status reset"}
+async def reset_detection(session_id: str = DEFAULT_SESSION):
+    await publish_status(session_id, await session_call(sessions.reset, session_id))
+    log.info("Detection status reset via API (session %s)", session_id)
+    return {"status": "success", "message": "Detection status reset", "session_id": session_id}
 
 # Route for the detection demo page
 @app.get("/", response_class=HTMLResponse)
@@ -551,6 +1373,8 @@ async def get_detection_page():
             let socket;
             let lastDetectionTime = 0;
             const detectionCooldown = 1000; // 1 second cooldown
+            // Each page load gets its own detection state on the server
+            const sessionId = Math.random().toString(36).slice(2, 12);
             
             // Start webcam
             async function setupWebcam() {
@@ -579,9 +1403,10 @@ async def get_detection_page():
             function connectWebSocket() {
                 // Determine correct WebSocket URL (secure or not)
                 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-                const wsUrl = protocol + '//' + window.location.host + '/ws/detect';
+                const wsUrl = protocol + '//' + window.location.host + '/ws/detect?session_id=' + sessionId;
                 
                 socket = new WebSocket(wsUrl);
+                socket.binaryType = 'arraybuffer';
                 
                 socket.onopen = function(e) {
                     console.log('WebSocket connection established');
@@ -674,6 +1499,31 @@ async def get_detection_page():
                 );
             }
             
+            // Binary frame protocol: 20-byte header followed by the JPEG bytes
+            const FRAME_HEADER_SIZE = 20;
+            let frameId = 0;
+            
+            function sendCanvasFrame(canvas) {
+                canvas.toBlob(async function(blob) {
+                    if (!blob || !socket || socket.readyState !== WebSocket.OPEN) {
+                        return;
+                    }
+                    const image = new Uint8Array(await blob.arrayBuffer());
+                    const message = new Uint8Array(FRAME_HEADER_SIZE + image.length);
+                    const header = new DataView(message.buffer);
+                    header.setUint8(0, 0x52);  // 'R'
+                    header.setUint8(1, 0x44);  // 'D'
+                    header.setUint8(2, 1);     // protocol version
+                    header.setUint8(3, 0);     // 0 = JPEG
+                    header.setUint32(4, frameId++ >>> 0, true);
+                    header.setFloat64(8, Date.now(), true);
+                    header.setUint16(16, canvas.width, true);
+                    header.setUint16(18, canvas.height, true);
+                    message.set(image, FRAME_HEADER_SIZE);
+                    socket.send(message.buffer);
+                }, 'image/jpeg', 0.7);
+            }
+            
             // Send frame to server for detection
             function sendFrameForDetection() {
                 if (!socket || socket.readyState !== WebSocket.OPEN) {
@@ -695,11 +1545,8 @@ async def get_detection_page():
                 const ctx = canvas.getContext('2d');
                 ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
                 
-                // Get base64 image data
-                const imageData = canvas.toDataURL('image/jpeg', 0.7);
-                
-                // Send to WebSocket
-                socket.send(imageData);
+                // Send the JPEG as a binary frame
+                sendCanvasFrame(canvas);
             }
             
             // Reset detection status
@@ -712,7 +1559,7 @@ async def get_detection_page():
                 } else {
                     // Fallback to REST API if WebSocket is not available
                     try {
-                        const response = await fetch('/api/reset-detection', {
+                        const response = await fetch('/api/reset-detection?session_id=' + sessionId, {
                             method: 'POST',
                         });
                         const data = await response.json();
@@ -744,13 +1591,8 @@ async def get_detection_page():
                 ctx.fillStyle = '#4CAF50';
                 ctx.fillRect(0, 0, canvas.width, canvas.height);
                 
-                // Get base64 image
-                const imageData = canvas.toDataURL('image/jpeg', 0.7);
-                
-                // Send to WebSocket if open
-                if (socket && socket.readyState === WebSocket.OPEN) {
-                    socket.send(imageData);
-                }
+                // Send to WebSocket as a binary frame if open
+                sendCanvasFrame(canvas);
             }
             
             // Initialize
@@ -781,6 +1623,10 @@ async def get_detection_page():
     </html>
     """
 
+# Module import time, reported in the startup log
+startup_timings["import"] = time.perf_counter() - _import_start
+
 # Run the app with uvicorn if this file is executed directly
 if __name__ == "__main__":
+    # Single process for development; use serve.py to run several worker processes
     uvicorn.run(app, host="0.0.0.0", port=8080) 
\ No newline at end of file
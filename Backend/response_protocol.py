@@ -0,0 +1,227 @@
+"""
+Response encodings for the /ws/detect WebSocket endpoint.
+
+Clients choose an encoding with the ?format= query parameter:
+
+    json     text message (default); serialized with orjson when installed
+    msgpack  binary MessagePack message with the same fields as json
+             (requires the msgpack package)
+    packed   binary message with a fixed little-endian layout and quantized
+             values, described below
+
+A packed message is an 18-byte header followed by one 16-byte record per detection:
+
+    offset  size  field
+    0       2     magic, always b"RR"
+    2       1     protocol version (1)
+    3       1     flags (bit 0 recyclable_detected, bit 1 temporal skipped,
+                  bit 2 answered from the result cache)
+    4       4     frame id (uint32, echoed from the binary frame header, else 0)
+    8       2     model input size (uint16, 0 for the material classifier)
+    10      2     dropped frames since the previous response (uint16)
+    12      2     last_detection class id (uint16, 0xFFFF if none)
+    14      2     last_detection confidence (uint16, confidence * 65535)
+    16      2     detection count N (uint16)
+    18      16*N  detections: class id (uint16), confidence (uint16, * 65535),
+                  track id (uint16, wraps, 0 if untracked), recyclable (uint8), padding
+                  (uint8), x1, y1, x2, y2 (int16 pixels)
+
+Class names are not repeated in packed messages: the server sends one json text
+message {"format": ..., "classes": {id: name}} when a binary encoding is chosen.
+Errors are always sent as json text messages.
+"""
+
+import json
+import struct
+import time
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ("json", "msgpack", "packed")
+
+MAGIC = b"RR"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIHHHHH")
+HEADER_SIZE = HEADER.size
+NO_CLASS = 0xFFFF
+# Largest dropped frame count the uint16 header field can carry
+MAX_PACKED_DROPPED = 0xFFFF
+
+FLAG_RECYCLABLE = 1
+FLAG_SKIPPED = 2
+FLAG_CACHED = 4
+
+DETECTION_DTYPE = np.dtype([
+    ("class_id", "<u2"),
+    ("confidence", "<u2"),
+    ("track_id", "<u2"),
+    ("recyclable", "u1"),
+    ("pad", "u1"),
+    ("bbox", "<i2", (4,)),
+])
+
+
+class ResponseFormatError(ValueError):
+    """Raised for an unknown or unavailable response encoding"""
+
+
+def check_format(name):
+    """
+    Validate a requested encoding
+    Returns the normalized name, raises ResponseFormatError if it cannot be used
+    """
+    name = (name or "json").lower()
+    if name not in FORMATS:
+        raise ResponseFormatError(f"Unknown response format {name!r} (expected one of {', '.join(FORMATS)})")
+    if name == "msgpack" and msgpack is None:
+        raise ResponseFormatError("msgpack is not installed on the server")
+    return name
+
+
+def dumps_json(obj):
+    """Serialize to a JSON string, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj)
+
+
+def _quantize_confidence(value):
+    return min(max(int(round(value * 65535)), 0), 65535)
+
+
+def encode_packed(result, class_ids):
+    """
+    Encode a detection response in the packed layout
+    Args:
+        result: Response dict as sent to json clients
+        class_ids: Mapping of class name to class id (for last_detection)
+    """
+    detections = result["detections"]
+    flags = FLAG_RECYCLABLE if result.get("recyclable_detected") else 0
+    if result.get("temporal", {}).get("skipped"):
+        flags |= FLAG_SKIPPED
+    if result.get("cached"):
+        flags |= FLAG_CACHED
+    last = result.get("last_detection") or {}
+    detected = last.get("detected", False)
+    last_class = class_ids.get(last["class"], NO_CLASS) if detected else NO_CLASS
+    last_confidence = _quantize_confidence(last["confidence"]) if detected else 0
+    frame_id = result["frame"]["id"] if "frame" in result else 0
+
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, frame_id & 0xFFFFFFFF, result.get("imgsz") or 0,
+        min(result.get("dropped_frames", 0), MAX_PACKED_DROPPED), last_class, last_confidence, len(detections),
+    )
+    if not detections:
+        return header
+
+    # One row per detection, converted to the record layout column by column
+    rows = np.array([(d["class_id"], d["confidence"], d.get("track_id", 0), d.get("recyclable", False), *d["bbox"])
+                     for d in detections], dtype=np.float64)
+    records = np.zeros(len(detections), dtype=DETECTION_DTYPE)
+    records["class_id"] = rows[:, 0]
+    records["confidence"] = np.rint(rows[:, 1].clip(0.0, 1.0) * 65535)
+    records["track_id"] = rows[:, 2] % 65536
+    records["recyclable"] = rows[:, 3]
+    records["bbox"] = np.rint(rows[:, 4:]).clip(-32768, 32767)
+    return header + records.tobytes()
+
+
+def decode_packed(message):
+    """
+    Decode a packed response (used by Python clients and tools)
+    Returns a dict with the header fields and a "detections" structured array
+    """
+    if len(message) < HEADER_SIZE:
+        raise ResponseFormatError("Packed response is too short")
+    magic, version, flags, frame_id, imgsz, dropped, last_class, last_confidence, count = HEADER.unpack_from(message, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ResponseFormatError("Not a packed response")
+    detections = np.frombuffer(message, dtype=DETECTION_DTYPE, count=count, offset=HEADER_SIZE)
+    return {
+        "frame_id": frame_id,
+        "recyclable_detected": bool(flags & FLAG_RECYCLABLE),
+        "skipped": bool(flags & FLAG_SKIPPED),
+        "cached": bool(flags & FLAG_CACHED),
+        "imgsz": imgsz or None,
+        "dropped_frames": dropped,
+        "last_class_id": None if last_class == NO_CLASS else last_class,
+        "last_confidence": last_confidence / 65535,
+        "detections": detections,
+    }
+
+
+def encode_response(result, fmt, class_ids=None):
+    """
+    Encode a detection response
+    Returns a str for json (send as a text message) or bytes (send as binary)
+    """
+    if fmt == "packed":
+        return encode_packed(result, class_ids or {})
+    if fmt == "msgpack":
+        return msgpack.packb(result, use_bin_type=True)
+    return dumps_json(result)
+
+
+class DeltaFilter:
+    """
+    Decides whether a response is worth sending in delta mode: only when the
+    detection set or the session state changed, plus a keepalive every
+    max_interval seconds so clients can tell a quiet scene from a dead connection.
+
+    Detections count as unchanged while every object keeps its class (and track
+    id) and no box corner moves more than bbox_tolerance pixels and no confidence
+    moves more than confidence_tolerance.
+    """
+
+    def __init__(self, bbox_tolerance=8.0, confidence_tolerance=0.05, max_interval=5.0):
+        self.bbox_tolerance = bbox_tolerance
+        self.confidence_tolerance = confidence_tolerance
+        self.max_interval = max_interval
+        self._last = None
+        self._last_sent = 0.0
+
+    def _changed(self, result):
+        last = self._last
+        if last is None:
+            return True
+        if result["recyclable_detected"] != last["recyclable_detected"]:
+            return True
+        a, b = result["last_detection"], last["last_detection"]
+        if (a["class"], a["recyclable"]) != (b["class"], b["recyclable"]):
+            return True
+        if abs(a["confidence"] - b["confidence"]) > self.confidence_tolerance:
+            return True
+        current, previous = result["detections"], last["detections"]
+        if len(current) != len(previous):
+            return True
+        for a, b in zip(current, previous):
+            if a["class_id"] != b["class_id"] or a.get("track_id") != b.get("track_id"):
+                return True
+            if abs(a["confidence"] - b["confidence"]) > self.confidence_tolerance:
+                return True
+            if max(abs(p - q) for p, q in zip(a["bbox"], b["bbox"])) > self.bbox_tolerance:
+                return True
+        return False
+
+    def should_send(self, result):
+        """True if the response should be sent (and remembers it as the last sent one)"""
+        now = time.monotonic()
+        if self._changed(result) or now - self._last_sent >= self.max_interval:
+            self._last = result
+            self._last_sent = now
+            return True
+        return False
+
+    def reset(self):
+        self._last = None
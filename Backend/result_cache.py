@@ -0,0 +1,101 @@
+"""
+Content-hash result cache for the recycling detection server.
+Demo and test clients often send byte-identical images (the sample image button,
+replayed footage). Results are cached by a hash of the encoded image bytes, so a
+repeated image skips decoding and inference entirely.
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    LRU cache with a size limit and a per-entry TTL.
+
+    Entries belong to a model version (set_version); changing the version, e.g.
+    when a different model is loaded, drops every cached result. Values are
+    copied on put and get, so callers may modify what they store or receive
+    without affecting other connections.
+    """
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        """
+        Initialize the cache
+        Args:
+            max_entries: Maximum cached results (0 disables the cache)
+            ttl: Seconds a result stays valid
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(image_bytes, salt=b""):
+        """
+        Cache key for an encoded image (any bytes-like object, read without copying)
+        Args:
+            salt: Extra bytes for settings that change the result for the same image
+        """
+        # The salt is hashed as part of the message (length-prefixed), not used as the
+        # blake2b key, which would silently truncate it to 64 bytes
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(len(salt).to_bytes(4, "little"))
+        digest.update(salt)
+        digest.update(image_bytes)
+        return digest.digest()
+
+    def set_version(self, version):
+        """Set the model version; cached results of another version are dropped"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key):
+        """Return the cached value or None, counting the hit or miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
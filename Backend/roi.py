@@ -0,0 +1,68 @@
+"""
+Region of interest (ROI) support for the recycling detection server.
+In the deployed bins each camera looks at a fixed drop zone, so only that part
+of the frame needs to be letterboxed and run through the model. ROIs are given
+as normalized (x1, y1, x2, y2) fractions of the frame, so they do not depend on
+the camera resolution.
+"""
+
+import json
+
+
+def parse_roi(value):
+    """
+    Parse an ROI from "x1,y1,x2,y2" or a 4-item sequence of fractions in [0, 1]
+    Returns a tuple, or None for an empty value
+    Raises ValueError for a malformed or empty region
+    """
+    if value is None or value == "":
+        return None
+    parts = value.split(",") if isinstance(value, str) else list(value)
+    if len(parts) != 4:
+        raise ValueError(f"ROI needs 4 values (x1,y1,x2,y2), got {value!r}")
+    x1, y1, x2, y2 = (float(p) for p in parts)
+    if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+        raise ValueError(f"ROI must satisfy 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1, got {value!r}")
+    if (x1, y1, x2, y2) == (0.0, 0.0, 1.0, 1.0):
+        return None
+    return (x1, y1, x2, y2)
+
+
+def load_roi_config(path):
+    """
+    Load per-session ROIs from a JSON file mapping session id to [x1, y1, x2, y2]
+    """
+    if not path:
+        return {}
+    with open(path) as f:
+        return {session_id: parse_roi(roi) for session_id, roi in json.load(f).items()}
+
+
+def roi_bounds(roi, width, height):
+    """Pixel bounds (x1, y1, x2, y2) of a normalized ROI in a width x height image"""
+    x1, y1, x2, y2 = roi
+    left, top = int(x1 * width), int(y1 * height)
+    right, bottom = max(left + 1, int(round(x2 * width))), max(top + 1, int(round(y2 * height)))
+    return left, top, min(right, width), min(bottom, height)
+
+
+def crop(image, roi):
+    """
+    View of the ROI of an image (no copy)
+    Returns (crop, (offset_x, offset_y))
+    """
+    if roi is None:
+        return image, (0, 0)
+    h, w = image.shape[:2]
+    left, top, right, bottom = roi_bounds(roi, w, h)
+    return image[top:bottom, left:right], (left, top)
+
+
+def offset_detections(detections, offset):
+    """Map detection boxes from ROI to full-frame coordinates (in place)"""
+    dx, dy = offset
+    if dx or dy:
+        for detection in detections:
+            x1, y1, x2, y2 = detection["bbox"]
+            detection["bbox"] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+    return detections
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the recycling detection server.
+Runs several uvicorn worker processes behind one port. Every worker loads and
+warms up its own model before it accepts connections (check /api/ready), and
+each worker's OpenCV/PyTorch/BLAS thread pools are capped so that
+workers x threads matches the number of cores.
+"""
+
+import argparse
+import os
+
+# Thread pool sizes read by OpenMP, MKL, OpenBLAS and NumPy when they are first imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+def plan_workers(workers, threads_per_worker, cores):
+    """
+    Pick the number of worker processes and threads per worker
+    Args:
+        workers: Requested worker processes (0 = one per core / threads_per_worker)
+        threads_per_worker: Requested threads per worker (0 = cores / workers)
+        cores: Available CPU cores
+    Returns (workers, threads_per_worker)
+    """
+    if workers <= 0:
+        workers = max(1, cores // max(1, threads_per_worker)) if threads_per_worker > 0 else cores
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, cores // workers)
+    return workers, threads_per_worker
+
+def main():
+    """
+    Main function to parse arguments and start the worker processes
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+    parser = argparse.ArgumentParser(description="Run the recycling detection server with multiple worker processes")
+    parser.add_argument("--host", type=str, default="0.0.0.0",
+                      help="Host to bind (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8080,
+                      help="Port to bind (default: 8080)")
+    parser.add_argument("--workers", type=int, default=0,
+                      help=f"Worker processes (default: 0 = cores / threads per worker, {cores} cores here)")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                      help="OpenCV/PyTorch threads per worker (default: 1; 0 = cores / workers)")
+    parser.add_argument("--log-level", type=str, default="warning",
+                      help="uvicorn access/error log level (default: warning)")
+    args = parser.parse_args()
+
+    workers, threads = plan_workers(args.workers, args.threads_per_worker, cores)
+    if workers * threads > cores:
+        print(f"Warning: {workers} workers x {threads} threads oversubscribes {cores} cores")
+
+    # Worker processes inherit the environment, so these apply before torch/cv2 are imported
+    os.environ["WORKER_THREADS"] = str(threads)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    if workers > 1:
+        # Detection state must be visible to every worker, see session_state.py
+        os.environ.setdefault("SESSION_STORE", "sqlite")
+        if os.environ["SESSION_STORE"] == "memory":
+            print("Warning: SESSION_STORE=memory keeps detection state per worker process")
+
+    print(f"Starting {workers} worker process(es) x {threads} thread(s) on {args.host}:{args.port} "
+          f"(session store: {os.environ.get('SESSION_STORE', 'memory')})")
+
+    import uvicorn
+    # Each worker imports the app, loads the model and runs the startup warm-up
+    # before it starts accepting connections on the shared socket
+    uvicorn.run(
+        "recycling_detection_server:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        log_level=args.log_level,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Per-session detection state for the recycling detection server.
+Each kiosk or game session has its own recyclable_detected / last_detection
+state, keyed by a session id and evicted once it has not been updated or reset
+for ttl seconds.
+
+Backends:
+    memory  In-process dict (one uvicorn worker)
+    sqlite  SQLite file shared by all worker processes on the host. The default
+            path is on /dev/shm when available, so the state lives in shared
+            memory and never touches disk.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_SESSION = "default"
+
+
+def empty_state():
+    """Detection state of a new or reset session"""
+    return {
+        "recyclable_detected": False,
+        "last_detection": {"detected": False, "class": None, "confidence": 0.0, "recyclable": False},
+    }
+
+
+def copy_state(state):
+    return {"recyclable_detected": state["recyclable_detected"], "last_detection": dict(state["last_detection"])}
+
+
+def apply_detections(state, detections):
+    """
+    Update a session state with one frame's detections (highest confidence wins)
+    Returns True if the state changed
+    """
+    if not detections:
+        return False
+    highest_conf = max(detections, key=lambda x: x["confidence"])
+    recyclable = highest_conf.get("recyclable", False)
+    new_state = {
+        # Stays set once a recyclable was seen, until the session is reset
+        "recyclable_detected": state["recyclable_detected"] or recyclable,
+        "last_detection": {
+            "detected": True,
+            "class": highest_conf["class_name"],
+            "confidence": highest_conf["confidence"],
+            "recyclable": recyclable,
+        },
+    }
+    changed = new_state != state
+    state.update(new_state)
+    return changed
+
+
+class MemorySessionStore:
+    """In-process session store with TTL eviction (oldest updates first)"""
+
+    kind = "memory"
+
+    def __init__(self, ttl=3600, max_sessions=10000):
+        """
+        Initialize the store
+        Args:
+            ttl: Seconds without an update or reset after which a session is evicted
+            max_sessions: Upper bound on stored sessions; the least recently updated are evicted first
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (last_seen, state)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Sessions are kept in update order, so expired ones are at the front
+        while self._sessions:
+            session_id, (last_seen, _) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id):
+        """Return a copy of the session state (a fresh state if unknown or expired)"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.get(session_id)
+            return copy_state(entry[1]) if entry is not None else empty_state()
+
+    def update(self, session_id, detections):
+        """Apply one frame's detections; returns (state, changed)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            state = entry[1] if entry is not None else empty_state()
+            changed = apply_detections(state, detections)
+            self._sessions[session_id] = (now, state)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return copy_state(state), changed
+
+    def reset(self, session_id):
+        """Clear the detection state of one session, returns the new state"""
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), empty_state())
+            self._sessions.move_to_end(session_id)
+        return empty_state()
+
+    def info(self):
+        with self._lock:
+            return {"backend": self.kind, "sessions": len(self._sessions), "ttl": self.ttl}
+
+    def close(self):
+        pass
+
+
+def default_sqlite_path():
+    shm = "/dev/shm"
+    base = shm if os.path.isdir(shm) and os.access(shm, os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "recycling_sessions.sqlite")
+
+
+class SqliteSessionStore:
+    """
+    Session store in a SQLite file, shared by every worker process that opens it.
+    Each thread gets its own connection; WAL mode lets readers run alongside the writer.
+    Frames that do not change a session's state are not written, apart from
+    refreshing its last_seen time every touch_interval seconds so it does not expire.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, path=None, ttl=3600, sweep_interval=60, touch_interval=None):
+        """
+        Initialize the store
+        Args:
+            path: Database file (default: recycling_sessions.sqlite in /dev/shm or the temp dir)
+            ttl: Seconds without an update or reset after which a session is evicted
+            sweep_interval: Minimum seconds between expired-session sweeps
+            touch_interval: Seconds after which an unchanged session's last_seen is
+                            refreshed (default: ttl / 10)
+        """
+        self.path = path or default_sqlite_path()
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.touch_interval = touch_interval if touch_interval is not None else ttl / 10
+        self._local = threading.local()
+        # Every connection opened by any thread, so close() can close them all
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._last_sweep = 0.0
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+    def _sweep(self, db, now):
+        # Wall-clock time, because the state is shared across processes
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+
+    def _load(self, db, session_id, now):
+        """Returns (state, last_seen), last_seen is 0 for an unknown or expired session"""
+        row = db.execute(
+            "SELECT state, last_seen FROM sessions WHERE session_id = ? AND last_seen >= ?",
+            (session_id, now - self.ttl),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (empty_state(), 0.0)
+
+    def _store(self, db, session_id, state, now):
+        db.execute(
+            "INSERT INTO sessions (session_id, state, last_seen) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, last_seen = excluded.last_seen",
+            (session_id, json.dumps(state), now),
+        )
+
+    def get(self, session_id):
+        """Return the session state (a fresh state if unknown or expired)"""
+        db = self._connection()
+        now = time.time()
+        self._sweep(db, now)
+        return self._load(db, session_id, now)[0]
+
+    def update(self, session_id, detections):
+        """Apply one frame's detections; returns (state, changed)"""
+        db = self._connection()
+        now = time.time()
+        # Most frames repeat the current state: check without taking the write lock
+        state, last_seen = self._load(db, session_id, now)
+        if not apply_detections(state, detections) and now - last_seen < self.touch_interval:
+            return state, False
+        # Read-modify-write in one transaction so concurrent workers do not lose updates
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            state, _ = self._load(db, session_id, now)
+            changed = apply_detections(state, detections)
+            self._store(db, session_id, state, now)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return state, changed
+
+    def reset(self, session_id):
+        """Clear the detection state of one session, returns the new state"""
+        self._store(self._connection(), session_id, empty_state(), time.time())
+        return empty_state()
+
+    def info(self):
+        db = self._connection()
+        count = db.execute("SELECT COUNT(*) FROM sessions WHERE last_seen >= ?", (time.time() - self.ttl,)).fetchone()[0]
+        return {"backend": self.kind, "sessions": count, "ttl": self.ttl, "path": self.path}
+
+    def close(self):
+        """Close the connections of every thread (executor threads included)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local.db = None
+
+
+def create_session_store(backend="memory", ttl=3600, path=None):
+    """
+    Create a session store
+    Args:
+        backend: "memory" (single worker) or "sqlite" (shared across worker processes)
+        ttl: Seconds without an update or reset after which a session is evicted
+        path: SQLite database file (sqlite backend only)
+    """
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl)
+    if backend == "sqlite":
+        return SqliteSessionStore(path=path, ttl=ttl)
+    raise ValueError(f"Unknown session store backend: {backend} (expected memory or sqlite)")
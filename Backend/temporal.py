@@ -0,0 +1,172 @@
+"""
+Temporal layer for /ws/detect connections.
+Kiosk cameras send a frame every 200 ms and consecutive frames are usually
+almost identical. Each connection keeps:
+    - a tiny grayscale thumbnail of the last inferred frame, so workers can skip
+      inference when the scene has not changed (scene_changed)
+    - a running-average background model, so workers can skip inference when
+      nothing is moving in the camera's zone (motion_fraction)
+    - an IoU tracker that carries boxes forward between inferences and
+      EMA-smooths class confidences, so results stop flickering (TemporalSmoother)
+"""
+
+import cv2
+import numpy as np
+
+# Thumbnail size used for the scene-change check
+SIGNATURE_SIZE = (32, 24)
+# Resolution of the background model used by the motion gate
+BACKGROUND_SIZE = (64, 48)
+
+
+def frame_signature(gray):
+    """
+    Downscaled grayscale thumbnail of a frame (from a reduced-size decode)
+    """
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def scene_changed(signature, reference, threshold):
+    """
+    True if the mean absolute pixel difference between two thumbnails exceeds
+    threshold (0-255 scale), or there is no reference to compare with
+    """
+    if reference is None or signature.shape != reference.shape:
+        return True
+    return float(cv2.absdiff(signature, reference).mean()) > threshold
+
+
+def motion_fraction(gray, background, learning_rate=0.05, threshold=25):
+    """
+    Background subtraction on a small grayscale image against a running average.
+    Args:
+        gray: Grayscale image (from a reduced-size decode, already cropped to the ROI)
+        background: float32 background model from the previous call, or None
+        learning_rate: How fast the background absorbs changes
+        threshold: Pixel difference (0-255) that counts as foreground
+    Returns (fraction of foreground pixels, updated background); the first call
+    reports full motion so the first frame is always inferred
+    """
+    small = cv2.resize(gray, BACKGROUND_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    if background is None or background.shape != small.shape:
+        return 1.0, small
+    foreground = cv2.absdiff(small, background) > threshold
+    cv2.accumulateWeighted(small, background, learning_rate)
+    return float(foreground.mean()), background
+
+
+def box_iou(a, b):
+    """IoU of two (x1, y1, x2, y2) boxes"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One tracked object: latest box plus EMA confidence per class"""
+
+    def __init__(self, track_id, detection):
+        self.id = track_id
+        self.bbox = list(detection["bbox"])
+        self.scores = {detection["class_name"]: detection["confidence"]}
+        # Class name -> (class_id, recyclable), needed to rebuild detections
+        self.classes = {detection["class_name"]: (detection["class_id"], detection.get("recyclable", False))}
+        self.misses = 0
+
+    def update(self, detection, alpha):
+        self.bbox = list(detection["bbox"])
+        name = detection["class_name"]
+        self.classes[name] = (detection["class_id"], detection.get("recyclable", False))
+        for key in self.scores:
+            self.scores[key] *= 1.0 - alpha
+        self.scores[name] = self.scores.get(name, 0.0) + alpha * detection["confidence"]
+        self.misses = 0
+
+    def miss(self):
+        self.misses += 1
+
+    def to_detection(self):
+        # The class with the highest smoothed confidence wins the vote
+        name = max(self.scores, key=self.scores.get)
+        class_id, recyclable = self.classes[name]
+        return {
+            "class_id": class_id,
+            "class_name": name,
+            "confidence": round(self.scores[name], 4),
+            "recyclable": recyclable,
+            "bbox": self.bbox,
+            "track_id": self.id,
+        }
+
+
+class TemporalSmoother:
+    """
+    Per-connection IoU tracker with EMA-smoothed class confidences.
+
+    New detections are matched greedily to existing tracks by IoU. Matched tracks
+    take the new box and blend the confidence into their class scores; unmatched
+    tracks keep their last box and scores for up to max_misses inferences, which
+    bridges single-frame misses instead of flickering.
+    """
+
+    def __init__(self, alpha=0.5, iou_threshold=0.3, max_misses=2, min_confidence=0.25):
+        """
+        Initialize the smoother
+        Args:
+            alpha: EMA weight of the newest detection (1.0 disables smoothing)
+            iou_threshold: Minimum IoU to match a detection to a track
+            max_misses: Inferences a track survives without a matching detection
+            min_confidence: Tracks whose smoothed confidence is below this are not reported
+        """
+        self.alpha = alpha
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_confidence = min_confidence
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections):
+        """
+        Add the detections of a newly inferred frame
+        Returns the smoothed detections
+        """
+        pairs = sorted(
+            ((box_iou(track.bbox, det["bbox"]), t, d)
+             for t, track in enumerate(self.tracks) for d, det in enumerate(detections)),
+            key=lambda pair: pair[0], reverse=True,
+        )
+        matched_tracks, matched_dets = set(), set()
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_dets:
+                continue
+            self.tracks[t].update(detections[d], self.alpha)
+            matched_tracks.add(t)
+            matched_dets.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.miss()
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for d, det in enumerate(detections):
+            if d not in matched_dets:
+                self.tracks.append(Track(self._next_id, det))
+                self._next_id += 1
+        return self.current()
+
+    def current(self):
+        """
+        The tracked objects as detections (also used for skipped frames, whose
+        scene has not changed since the last inference)
+        """
+        detections = [track.to_detection() for track in self.tracks]
+        return [det for det in detections if det["confidence"] >= self.min_confidence]
+
+    def reset(self):
+        self.tracks = []
@@ -0,0 +1,46 @@
+import asyncio
+import random
+
+from batching import BatchScheduler
+
+
+def test_every_item_gets_its_own_result():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(len(items))
+        await asyncio.sleep(0.001)
+        return [item * 2 for item in items]
+
+    async def run():
+        scheduler = BatchScheduler(run_batch, max_batch=4, max_wait_ms=1)
+        rng = random.Random(0)
+
+        async def client(i):
+            # Arrivals spread around the batch window, so items keep landing as it closes
+            await asyncio.sleep(rng.random() * 0.05)
+            return await scheduler.submit(i)
+
+        results = await asyncio.wait_for(asyncio.gather(*(client(i) for i in range(300))), 10)
+        await scheduler.shutdown()
+        return results
+
+    assert asyncio.run(run()) == [i * 2 for i in range(300)]
+    assert sum(batches) == 300 and max(batches) <= 4
+
+
+def test_waits_for_the_batch_to_fill():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        return items
+
+    async def run():
+        scheduler = BatchScheduler(run_batch, max_batch=3, max_wait_ms=200)
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(3)))
+        await scheduler.shutdown()
+        return results
+
+    assert asyncio.run(run()) == [0, 1, 2]
+    assert batches == [[0, 1, 2]]
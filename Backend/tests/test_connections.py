@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from connections import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records sent messages; a stalled socket never completes a send"""
+
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_drop_oldest_keeps_newest_messages():
+    async def run():
+        manager = ConnectionManager(max_queue=2, policy="drop_oldest")
+        subscriber = manager.subscribe("status")  # SSE-style queue, drained by the caller
+        for i in range(5):
+            assert manager.broadcast({"n": i}, "status") == 1
+        received = [json.loads(await subscriber.get(0.1)) for _ in range(2)]
+        assert received == [{"n": 3}, {"n": 4}]
+        assert await subscriber.get(0.01) is None
+        assert manager.info()["dropped_messages"] == 3
+    asyncio.run(run())
+
+
+def test_disconnect_policy_unregisters_slow_consumer():
+    async def run():
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow = manager.subscribe("status")
+        fast = manager.subscribe("status")
+        manager.broadcast({"n": 0}, "status")
+        await fast.get(0.1)
+        # The slow subscriber's queue is still full
+        assert manager.broadcast({"n": 1}, "status") == 1
+        assert slow.closed and not fast.closed
+        assert manager.subscriber_count == 1
+        assert manager.info()["dropped_subscribers"] == 1
+    asyncio.run(run())
+
+
+def test_websocket_subscribers_are_sent_independently():
+    async def run():
+        manager = ConnectionManager(max_queue=4, send_timeout=0.05)
+        healthy, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+        manager.subscribe("status", healthy)
+        manager.subscribe("status", stalled)
+        assert manager.broadcast({"n": 1}, "status") == 2
+        await asyncio.sleep(0.2)
+        assert healthy.sent == [{"n": 1}]
+        # The stalled socket timed out, was dropped and closed
+        assert manager.subscriber_count == 1
+        assert stalled.closed_with == 1013
+        manager.close()
+        assert manager.subscriber_count == 0
+    asyncio.run(run())
+
+
+def test_broadcast_without_subscribers():
+    manager = ConnectionManager()
+    assert manager.broadcast({"n": 1}, "status") == 0
@@ -0,0 +1,63 @@
+import asyncio
+
+from frame_mailbox import LatestFrameMailbox, MailboxClosed
+from session_state import MemorySessionStore
+
+RECYCLABLE = [{"class_name": "plastik", "confidence": 0.9, "recyclable": True}]
+
+
+def drain(mailbox):
+    """All items get() hands out until the mailbox is closed"""
+    async def run():
+        items = []
+        while True:
+            try:
+                items.append(await mailbox.get())
+            except MailboxClosed:
+                return items
+    mailbox.close()
+    return asyncio.run(run())
+
+
+def test_latest_frame_wins():
+    mailbox = LatestFrameMailbox()
+    mailbox.put_frame("frame 1")
+    mailbox.put_frame("frame 2")
+    assert drain(mailbox) == ["frame 2"]
+    assert mailbox.dropped == 1
+
+
+def test_controls_and_frames_keep_arrival_order():
+    mailbox = LatestFrameMailbox()
+    mailbox.put_control("error")
+    mailbox.put_frame("frame 1")
+    mailbox.put_control("error 2")
+    mailbox.put_frame("frame 2")
+    assert drain(mailbox) == ["error", "error 2", "frame 2"]
+    assert mailbox.take_dropped() == 1
+
+
+def test_frame_before_reset_is_dropped():
+    mailbox = LatestFrameMailbox()
+    mailbox.put_frame(("frame", RECYCLABLE))
+    mailbox.put_control(("reset", None), drop_frame=True)
+
+    # Apply the items the way the server does
+    sessions = MemorySessionStore()
+    sessions.update("kiosk", RECYCLABLE)
+    for kind, detections in drain(mailbox):
+        if kind == "reset":
+            sessions.reset("kiosk")
+        else:
+            sessions.update("kiosk", detections)
+
+    assert sessions.get("kiosk")["recyclable_detected"] is False
+    assert mailbox.take_dropped() == 1
+
+
+def test_frame_after_reset_is_kept():
+    mailbox = LatestFrameMailbox()
+    mailbox.put_control("reset", drop_frame=True)
+    mailbox.put_frame("frame 1")
+    assert drain(mailbox) == ["reset", "frame 1"]
+    assert mailbox.dropped == 0
@@ -0,0 +1,34 @@
+import pytest
+
+from frame_protocol import (
+    FORMAT_WEBP, HEADER, HEADER_SIZE, FrameProtocolError, encode_frame, image_array, parse_header,
+)
+
+IMAGE = b"\xff\xd8\xff\xe0 not really a jpeg"
+
+
+def test_round_trip():
+    message = encode_frame(IMAGE, frame_id=2**32 + 7, width=640, height=480, image_format=FORMAT_WEBP,
+                           timestamp=1234.5)
+    header = parse_header(message)
+    assert header.to_dict() == {"id": 7, "timestamp": 1234.5, "width": 640, "height": 480, "format": "webp"}
+    assert image_array(message).tobytes() == IMAGE
+
+
+def test_image_array_reads_in_place():
+    message = bytearray(encode_frame(IMAGE, 1))
+    array = image_array(message)
+    message[HEADER_SIZE] = 0
+    assert array[0] == 0
+
+
+@pytest.mark.parametrize("message, error", [
+    (b"RD", "too short"),
+    (encode_frame(b"", 1), "too short"),
+    (b"XX" + encode_frame(IMAGE, 1)[2:], "magic"),
+    (HEADER.pack(b"RD", 2, 0, 1, 0.0, 0, 0) + IMAGE, "version 2"),
+    (HEADER.pack(b"RD", 1, 9, 1, 0.0, 0, 0) + IMAGE, "image format 9"),
+])
+def test_parse_header_errors(message, error):
+    with pytest.raises(FrameProtocolError, match=error):
+        parse_header(message)
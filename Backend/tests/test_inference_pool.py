@@ -0,0 +1,41 @@
+import asyncio
+import os
+import threading
+import time
+
+from inference_pool import InferencePool
+
+
+class Worker:
+    """Stand-in detector that records which thread and process built it"""
+
+    def __init__(self):
+        self.owner = (os.getpid(), threading.get_ident())
+
+
+def warm_up(detector):
+    # Slow enough that one idle worker could otherwise pick up several jobs
+    time.sleep(0.05)
+    return detector.owner
+
+
+def run_round(pool):
+    async def run():
+        try:
+            return await pool.run_on_every_worker(warm_up)
+        finally:
+            pool.shutdown()
+    return asyncio.run(run())
+
+
+def test_every_thread_worker_runs_once():
+    pool = InferencePool(executor="thread", workers=3, max_queue=1, detector_factory=Worker)
+    owners = run_round(pool)
+    assert len(set(owners)) == 3
+
+
+def test_every_process_worker_runs_once():
+    pool = InferencePool(executor="process", workers=2, max_queue=1, detector_factory=Worker)
+    owners = run_round(pool)
+    assert len({pid for pid, _ in owners}) == 2
+    assert os.getpid() not in {pid for pid, _ in owners}
@@ -0,0 +1,59 @@
+from qos import QosController
+
+
+def controller(**kwargs):
+    # interval=0: every observation is a decision
+    options = dict(levels=(640, 480, 320), wait_ms=(5.0, 25.0), target_ms=100.0, interval=0.0, patience=2)
+    options.update(kwargs)
+    return QosController(**options)
+
+
+def test_steps_down_immediately_when_over_target():
+    qos = controller()
+    assert qos.observe(0.2)
+    assert (qos.level, qos.imgsz, qos.wait_ms) == (1, 480, 15.0)
+    assert qos.observe(0.2)
+    assert qos.imgsz == 320
+    # Already at the fastest level
+    assert not qos.observe(0.2)
+    assert qos.level == 2 and qos.changes == 2
+
+
+def test_steps_up_only_after_patience_calm_intervals():
+    qos = controller()
+    qos.observe(0.2)
+    assert not qos.observe(0.01)
+    assert qos.observe(0.01)
+    assert qos.level == 0
+    assert not qos.observe(0.01)
+
+
+def test_latency_between_half_and_full_target_resets_calm():
+    qos = controller()
+    qos.observe(0.2)
+    qos.observe(0.01)
+    # Not over target, but not calm either: no change, calm count starts over
+    assert not qos.observe(0.07)
+    assert not qos.observe(0.01)
+    assert qos.observe(0.01)
+    assert qos.level == 0
+
+
+def test_queue_depth_steps_down_and_blocks_stepping_up():
+    depth = [10]
+    qos = controller(queue_high=6, queue_low=1, queue_depth=lambda: depth[0])
+    assert qos.observe(0.01)
+    assert qos.level == 1
+    depth[0] = 3
+    assert not qos.observe(0.01)
+    assert not qos.observe(0.01)
+    depth[0] = 0
+    qos.observe(0.01)
+    assert qos.observe(0.01)
+    assert qos.level == 0
+
+
+def test_single_level_uses_min_wait():
+    qos = controller(levels=(640,))
+    assert not qos.observe(1.0)
+    assert (qos.imgsz, qos.wait_ms) == (640, 5.0)
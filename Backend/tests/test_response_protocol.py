@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from response_protocol import (
+    HEADER_SIZE, DeltaFilter, ResponseFormatError, check_format, decode_packed, encode_packed, encode_response,
+)
+
+CLASS_IDS = {"metal": 5, "plastik": 6}
+
+
+def make_result(detections=None, **fields):
+    result = {
+        "detections": detections or [],
+        "recyclable_detected": True,
+        "last_detection": {"detected": True, "class": "plastik", "confidence": 0.75, "recyclable": True},
+        "dropped_frames": 3,
+        "imgsz": 480,
+        "frame": {"id": 42},
+    }
+    result.update(fields)
+    return result
+
+
+def test_packed_round_trip():
+    detections = [
+        {"class_id": 6, "class_name": "plastik", "confidence": 0.9, "recyclable": True,
+         "bbox": [10.4, 20.6, 300.0, 400.0], "track_id": 70000},
+        {"class_id": 5, "class_name": "metal", "confidence": 0.5, "recyclable": False, "bbox": [-5, 0, 40000, 8]},
+    ]
+    message = encode_packed(make_result(detections, cached=True, temporal={"skipped": True}), CLASS_IDS)
+    assert len(message) == HEADER_SIZE + 16 * 2
+
+    reply = decode_packed(message)
+    assert reply["frame_id"] == 42 and reply["imgsz"] == 480 and reply["dropped_frames"] == 3
+    assert reply["recyclable_detected"] and reply["skipped"] and reply["cached"]
+    assert reply["last_class_id"] == 6
+    assert abs(reply["last_confidence"] - 0.75) < 1e-4
+
+    records = reply["detections"]
+    assert records["class_id"].tolist() == [6, 5]
+    assert records["recyclable"].tolist() == [1, 0]
+    assert abs(records["confidence"][0] / 65535 - 0.9) < 1e-4
+    # Track ids wrap to 16 bits, boxes are rounded and clipped to int16
+    assert records["track_id"].tolist() == [70000 % 65536, 0]
+    assert records["bbox"].tolist() == [[10, 21, 300, 400], [-5, 0, 32767, 8]]
+
+
+def test_packed_without_detections_is_header_only():
+    result = make_result(recyclable_detected=False, last_detection={"detected": False}, dropped_frames=100000)
+    del result["frame"]
+    reply = decode_packed(encode_packed(result, CLASS_IDS))
+    assert len(reply["detections"]) == 0
+    assert reply["frame_id"] == 0 and reply["last_class_id"] is None
+    assert not reply["recyclable_detected"] and not reply["cached"]
+    assert reply["dropped_frames"] == 0xFFFF
+
+
+def test_decode_rejects_other_messages():
+    with pytest.raises(ResponseFormatError):
+        decode_packed(b"RR")
+    with pytest.raises(ResponseFormatError):
+        decode_packed(b"XX" + bytes(HEADER_SIZE))
+
+
+def test_check_format():
+    assert check_format(None) == "json"
+    assert check_format("PACKED") == "packed"
+    with pytest.raises(ResponseFormatError):
+        check_format("xml")
+
+
+def test_json_encoding_keeps_fields():
+    result = make_result()
+    assert json.loads(encode_response(result, "json")) == result
+
+
+def test_delta_filter_sends_only_changes(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("response_protocol.time.monotonic", lambda: now[0])
+    detection = {"class_id": 6, "confidence": 0.8, "bbox": [0, 0, 100, 100]}
+    delta = DeltaFilter(bbox_tolerance=8.0, confidence_tolerance=0.05, max_interval=5.0)
+    assert delta.should_send(make_result([detection]))
+    # Small jitter in box and confidence is not a change
+    assert not delta.should_send(make_result([dict(detection, confidence=0.82, bbox=[4, 0, 100, 100])]))
+    assert delta.should_send(make_result([dict(detection, bbox=[20, 0, 100, 100])]))
+    assert delta.should_send(make_result([]))
+    assert delta.should_send(make_result([], recyclable_detected=False))
+    # Keepalive after max_interval, and after a reset
+    now[0] = 6.0
+    assert delta.should_send(make_result([], recyclable_detected=False))
+    delta.reset()
+    assert delta.should_send(make_result([], recyclable_detected=False))
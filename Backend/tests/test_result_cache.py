@@ -0,0 +1,63 @@
+import result_cache
+from result_cache import ResultCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put(b"a", 1)
+    cache.put(b"b", 2)
+    assert cache.get(b"a") == 1  # b is now the least recently used
+    cache.put(b"c", 3)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == 1 and cache.get(b"c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl=10.0)
+    cache.put(b"a", 1)
+    now[0] = 109.0
+    assert cache.get(b"a") == 1
+    now[0] = 111.0
+    assert cache.get(b"a") is None
+    assert cache.info()["entries"] == 0
+
+
+def test_version_change_drops_entries():
+    cache = ResultCache()
+    cache.set_version("v1")
+    cache.put(b"a", 1)
+    cache.set_version("v1")
+    assert cache.get(b"a") == 1
+    cache.set_version("v2")
+    assert cache.get(b"a") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(max_entries=0)
+    assert not cache.enabled
+    cache.put(b"a", 1)
+    assert cache.get(b"a") is None
+
+
+def test_values_are_copied():
+    cache = ResultCache()
+    detections = [{"class_name": "metal", "bbox": [0, 0, 1, 1]}]
+    cache.put(b"a", detections)
+    detections[0]["bbox"][0] = 5
+    received = cache.get(b"a")
+    assert received[0]["bbox"] == [0, 0, 1, 1]
+    received.append({})
+    assert len(cache.get(b"a")) == 1
+
+
+def test_key_depends_on_the_whole_salt():
+    image = b"\xff\xd8 jpeg bytes"
+    # Salts that only differ after 64 bytes (the blake2b key limit) must not collide
+    long_salt = b"x" * 64
+    assert ResultCache.key(image, long_salt + b"1") != ResultCache.key(image, long_salt + b"2")
+    # Salt and image are length-prefixed, not just concatenated
+    assert ResultCache.key(b"ab", b"c") != ResultCache.key(b"b", b"ca")
+    assert ResultCache.key(memoryview(image), b"s") == ResultCache.key(image, b"s")
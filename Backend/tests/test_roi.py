@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from roi import crop, offset_detections, parse_roi, roi_bounds
+
+
+def test_parse_roi():
+    assert parse_roi("0.1,0.2,0.9,0.8") == (0.1, 0.2, 0.9, 0.8)
+    assert parse_roi([0, 0.5, 0.5, 1]) == (0.0, 0.5, 0.5, 1.0)
+    # Empty and full-frame regions mean "no ROI"
+    assert parse_roi("") is None and parse_roi(None) is None
+    assert parse_roi("0,0,1,1") is None
+
+
+@pytest.mark.parametrize("value", ["0.1,0.2,0.9", "0.5,0.2,0.4,0.8", "0,0,1.5,1", "-0.1,0,1,1", "a,b,c,d"])
+def test_parse_roi_rejects_malformed_regions(value):
+    with pytest.raises(ValueError):
+        parse_roi(value)
+
+
+def test_roi_bounds():
+    assert roi_bounds((0.25, 0.5, 0.75, 1.0), 640, 480) == (160, 240, 480, 480)
+    # A region smaller than a pixel still covers one pixel
+    assert roi_bounds((0.5, 0.5, 0.5001, 0.5001), 100, 100) == (50, 50, 51, 51)
+
+
+def test_crop_and_offset_round_trip():
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    view, offset = crop(image, (0.25, 0.5, 0.75, 1.0))
+    assert view.shape == (240, 320, 3) and offset == (160, 240)
+    assert np.shares_memory(view, image)
+    view, offset_none = crop(image, None)
+    assert view is image and offset_none == (0, 0)
+
+    detections = offset_detections([{"bbox": [0, 0, 10, 10]}], offset)
+    assert detections[0]["bbox"] == [160, 240, 170, 250]
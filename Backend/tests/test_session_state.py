@@ -0,0 +1,40 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from session_state import SqliteSessionStore
+
+RECYCLABLE = [{"class_name": "plastik", "confidence": 0.9, "recyclable": True}]
+
+
+def test_sqlite_update_and_reset(tmp_path):
+    store = SqliteSessionStore(path=str(tmp_path / "sessions.sqlite"))
+    state, changed = store.update("a", RECYCLABLE)
+    assert changed and state["recyclable_detected"]
+    assert store.update("a", RECYCLABLE)[1] is False
+    assert store.get("a")["recyclable_detected"]
+    assert not store.reset("a")["recyclable_detected"]
+    assert not store.get("a")["recyclable_detected"]
+    store.close()
+
+
+def test_sqlite_close_closes_every_thread_connection(tmp_path):
+    store = SqliteSessionStore(path=str(tmp_path / "sessions.sqlite"))
+    barrier = threading.Barrier(4)
+
+    def connect(_):
+        # Hold every worker thread until all four have opened their connection
+        db = store._connection()
+        barrier.wait()
+        return db
+
+    # One connection per executor thread, as asyncio.to_thread does in the server
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        connections = list(pool.map(connect, range(4)))
+    store.close()
+    assert len(set(map(id, connections))) == 4
+    for db in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
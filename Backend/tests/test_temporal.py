@@ -0,0 +1,68 @@
+import numpy as np
+
+from temporal import TemporalSmoother, box_iou, motion_fraction, scene_changed
+
+
+def detection(bbox, name="plastik", confidence=0.8, class_id=6):
+    return {"class_id": class_id, "class_name": name, "confidence": confidence, "recyclable": True, "bbox": bbox}
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+    assert abs(box_iou([0, 0, 10, 10], [5, 0, 15, 10]) - 1 / 3) < 1e-9
+
+
+def test_overlapping_detection_keeps_its_track():
+    smoother = TemporalSmoother(alpha=0.5)
+    first = smoother.update([detection([0, 0, 100, 100])])
+    second = smoother.update([detection([5, 5, 105, 105], confidence=0.4)])
+    assert first[0]["track_id"] == second[0]["track_id"]
+    assert second[0]["bbox"] == [5, 5, 105, 105]
+    # EMA of 0.8 then 0.4 with alpha 0.5
+    assert second[0]["confidence"] == 0.6
+
+
+def test_distant_detection_starts_a_new_track():
+    smoother = TemporalSmoother()
+    smoother.update([detection([0, 0, 100, 100])])
+    tracked = smoother.update([detection([0, 0, 100, 100]), detection([300, 300, 400, 400])])
+    assert sorted(d["track_id"] for d in tracked) == [1, 2]
+
+
+def test_missed_track_survives_max_misses():
+    smoother = TemporalSmoother(alpha=1.0, max_misses=2)
+    smoother.update([detection([0, 0, 100, 100])])
+    assert len(smoother.update([])) == 1
+    assert len(smoother.update([])) == 1
+    assert smoother.update([]) == []
+
+
+def test_class_vote_follows_smoothed_scores():
+    smoother = TemporalSmoother(alpha=0.5)
+    smoother.update([detection([0, 0, 100, 100], "plastik", 0.9)])
+    # One frame of a different class does not flip the reported class
+    tracked = smoother.update([detection([0, 0, 100, 100], "metal", 0.5, class_id=5)])
+    assert tracked[0]["class_name"] == "plastik"
+
+
+def test_low_confidence_tracks_are_not_reported():
+    smoother = TemporalSmoother(min_confidence=0.5)
+    assert smoother.update([detection([0, 0, 10, 10], confidence=0.3)]) == []
+    assert len(smoother.tracks) == 1
+
+
+def test_scene_changed_and_motion():
+    still = np.full((24, 32), 100, dtype=np.uint8)
+    assert scene_changed(still, None, 4.0)
+    assert not scene_changed(still, still.copy(), 4.0)
+    assert scene_changed(still + 10, still, 4.0)
+
+    fraction, background = motion_fraction(still, None)
+    assert fraction == 1.0
+    fraction, background = motion_fraction(still, background)
+    assert fraction == 0.0
+    moved = still.copy()
+    moved[:, :16] = 200
+    fraction, _ = motion_fraction(moved, background)
+    assert 0.4 < fraction < 0.6
@@ -9,6 +9,8 @@ import os
 import argparse
 from pathlib import Path
 from ultralytics import YOLO
+from cached_training import train
+from dataset_cache import prepare_dataset
 
 def main():
     """
@@ -29,6 +31,10 @@ def main():
                       help="Name for the training run (default: recycling_model)")
     parser.add_argument("--device", type=str, default="",
                       help="Device to train on (default: auto-select)")
+    parser.add_argument("--no-store", action="store_true",
+                      help="Decode the JPEG files every epoch instead of using the pre-decoded dataset store")
+    parser.add_argument("--compare-to", type=str, default=None,
+                      help="epoch_times.json of an earlier run to compare epoch times against")
     args = parser.parse_args()
     
     # Check if data file exists
@@ -44,6 +50,14 @@ def main():
     except Exception as e:
         print(f"Error loading model: {e}")
         return
+
+    # Decode and letterbox the train/val images once (reused while the dataset is unchanged)
+    if not args.no_store:
+        try:
+            prepare_dataset(data_path, args.imgsz)
+        except Exception as e:
+            print(f"Error preparing dataset store: {e}")
+            return
     
     # Print training information
     print(f"\n{'='*50}")
@@ -55,12 +69,16 @@ def main():
     print(f"- Batch size:    {args.batch}")
     print(f"- Run name:      {args.name}")
     print(f"- Device:        {args.device if args.device else 'auto'}")
+    print(f"- Images from:   {'JPEG files' if args.no_store else 'dataset store'}")
     print(f"{'='*50}\n")
     
     # Start training
     try:
-        results = model.train(
-            data=str(data_path.absolute()),
+        results = train(
+            model,
+            str(data_path.absolute()),
+            use_store=not args.no_store,
+            compare_to=args.compare_to,
             epochs=args.epochs,
             imgsz=args.imgsz,
             batch=args.batch,
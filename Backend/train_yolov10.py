@@ -7,6 +7,7 @@ This is a more direct approach that leverages the Ultralytics command line inter
 import os
 import argparse
 import subprocess
+import sys
 from pathlib import Path
 
 def main():
@@ -30,7 +31,14 @@ def main():
                       help="Device to train on (default: auto-select)")
     parser.add_argument("--patience", type=int, default=50,
                       help="Early stopping patience (default: 50)")
+    parser.add_argument("--no-store", action="store_true",
+                      help="Run plain `yolo train` on the JPEG files instead of the pre-decoded dataset store")
+    parser.add_argument("--compare-to", type=str, default=None,
+                      help="epoch_times.json of an earlier run to compare epoch times against")
     args = parser.parse_args()
+    if args.no_store and args.compare_to:
+        # Plain `yolo train` neither accepts compare_to nor records epoch times
+        parser.error("--compare-to needs the dataset store; use train_model.py --no-store for a timed baseline")
     
     # Check if data file exists
     data_path = Path(args.data)
@@ -38,8 +46,18 @@ def main():
         print(f"Error: Dataset config file {args.data} not found")
         return
     
-    # Create command with all arguments
-    cmd = ["yolo", "train"]
+    # Create command with all arguments. The dataset store needs a custom trainer,
+    # which the yolo CLI cannot load, so cached_training.py takes the same arguments
+    if args.no_store:
+        cmd = ["yolo", "train"]
+    else:
+        # Prepare the store up front so its progress is visible before training starts
+        prepare_cmd = [sys.executable, str(Path(__file__).with_name("dataset_cache.py")), "prepare",
+                       "--data", str(data_path.absolute()), "--imgsz", str(args.imgsz)]
+        if subprocess.run(prepare_cmd).returncode != 0:
+            print("Error preparing dataset store")
+            return
+        cmd = [sys.executable, str(Path(__file__).with_name("cached_training.py"))]
     cmd.extend(["data=" + str(data_path.absolute())])
     cmd.extend(["model=" + args.model])
     cmd.extend(["epochs=" + str(args.epochs)])
@@ -50,6 +68,8 @@ def main():
     
     if args.device:
         cmd.extend(["device=" + args.device])
+    if args.compare_to and not args.no_store:
+        cmd.extend(["compare_to=" + args.compare_to])
     
     # Print command being executed
     print(f"\n{'='*50}")
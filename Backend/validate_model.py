@@ -2,9 +2,23 @@
 """
 Script to validate the trained YOLOv10 model on the recycling dataset.
 This script evaluates the model against the validation set and runs inference on test images.
+Several inference backends (PyTorch, ONNX Runtime, OpenVINO) can be compared side by side,
+and --imgsz-levels measures the accuracy/latency operating points used by the server's
+adaptive QoS controller.
+
+Latency is profiled over the whole test split after warm-up: p50/p95/p99 per stage
+(preprocess, inference, postprocess), optionally swept over batch sizes and thread
+counts, with an optional cProfile dump or py-spy flamegraph and JSON output for
+tracking across model versions.
 """
 
 import os
+import cProfile
+import json
+import pstats
+import shutil
+import signal
+import subprocess
 import argparse
 from pathlib import Path
 from ultralytics import YOLO
@@ -13,13 +27,426 @@ import numpy as np
 import time
 import matplotlib.pyplot as plt
 from tqdm import tqdm
+from yolo_backends import load_exported_model
+
+def default_backend_path(model_path, backend):
+    """Path of the exported model written by export_model.py for the given backend"""
+    model_path = Path(model_path)
+    if backend == "onnx":
+        return model_path.with_suffix(".onnx")
+    if backend == "openvino":
+        return model_path.parent / f"{model_path.stem}_openvino_model"
+    return model_path
+
+def load_test_images(test_dir="DATASET/test/images"):
+    """List the test images, if any"""
+    test_dir = Path(test_dir)
+    if not test_dir.exists():
+        return []
+    return list(test_dir.glob("*.jpg")) + list(test_dir.glob("*.png"))
+
+def evaluate_model(model, data_path, imgsz, conf):
+    """
+    Run validation on the validation set and print the standard metrics
+
+    Args:
+        model: YOLO model or path to a .pt / .onnx / OpenVINO model
+        data_path: Path to the dataset yaml file
+
+    Returns:
+        Dict with map50, map, precision and recall
+    """
+    if not isinstance(model, YOLO):
+        model = YOLO(str(model), task="detect")
+
+    print("Running validation on the validation set...")
+    val_results = model.val(data=str(Path(data_path).absolute()), imgsz=imgsz, conf=conf)
+    metrics = {
+        "map50": float(val_results.box.map50),
+        "map": float(val_results.box.map),
+        "precision": float(val_results.box.mp),
+        "recall": float(val_results.box.mr),
+    }
+
+    print("\nValidation Results:")
+    print(f"- mAP@0.5:      {metrics['map50']:.4f}")
+    print(f"- mAP@0.5-0.95: {metrics['map']:.4f}")
+    print(f"- Precision:    {metrics['precision']:.4f}")
+    print(f"- Recall:       {metrics['recall']:.4f}")
+    return metrics
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def box_iou(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def match_detections(boxes, class_ids, gt_boxes, gt_classes):
+    """
+    Greedily match detections to ground truth boxes of the same class, highest IoU first
+    Returns an (N, len(IOU_THRESHOLDS)) bool array: detection i is a true positive at each threshold
+    """
+    correct = np.zeros((len(boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if len(boxes) == 0 or len(gt_boxes) == 0:
+        return correct
+    iou = box_iou(gt_boxes, boxes) * (gt_classes[:, None] == class_ids[None, :])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        gt_index, det_index = np.nonzero(iou >= threshold)
+        used_gt, used_det = set(), set()
+        for k in np.argsort(-iou[gt_index, det_index], kind="stable"):
+            g, d = gt_index[k], det_index[k]
+            if g not in used_gt and d not in used_det:
+                used_gt.add(g)
+                used_det.add(d)
+                correct[d, t] = True
+    return correct
+
+def average_precision(tp, n_gt):
+    """101-point interpolated AP (COCO) of detections sorted by descending confidence"""
+    if len(tp) == 0:
+        return 0.0
+    tp_sum = np.cumsum(tp)
+    recall = tp_sum / n_gt
+    # Precision envelope: the best precision at this recall or any higher one
+    precision = np.flip(np.maximum.accumulate(np.flip(tp_sum / np.arange(1, len(tp) + 1))))
+    index = np.searchsorted(recall, np.linspace(0, 1, 101), side="left")
+    reached = index < len(precision)
+    return float(np.where(reached, precision[np.minimum(index, len(precision) - 1)], 0.0).mean())
+
+def evaluate_exported(backend, model_path, data_path, imgsz, conf):
+    """
+    Validate an exported model through the server's own pipeline (letterbox and
+    brightness/contrast enhancement, NMS-free postprocessing) instead of
+    Ultralytics val, so the metrics describe the model as it is served
+
+    Args:
+        backend: "onnx" or "openvino"
+        model_path: Exported model
+        data_path: Path to the dataset yaml file (its val split is used)
+
+    Returns:
+        Dict with map50, map, precision and recall
+    """
+    from dataset_cache import label_path, list_images, read_labels, resolve_splits
+
+    runtime = load_exported_model(backend, model_path, imgsz=imgsz)
+    val_dir = resolve_splits(data_path, ("val",)).get("val")
+    if val_dir is None or not val_dir.exists():
+        raise FileNotFoundError(f"No val split found in {data_path}")
+
+    print(f"Running validation on {val_dir} with the server's preprocessing...")
+    scores, classes, correct, gt_classes = [], [], [], []
+    for image_path in tqdm(list_images(val_dir)):
+        frame = cv2.imread(str(image_path))
+        if frame is None:
+            continue
+        h, w = frame.shape[:2]
+        labels = read_labels(label_path(image_path))
+        gt_boxes = np.column_stack([(labels[:, 1] - labels[:, 3] / 2) * w, (labels[:, 2] - labels[:, 4] / 2) * h,
+                                    (labels[:, 1] + labels[:, 3] / 2) * w, (labels[:, 2] + labels[:, 4] / 2) * h])
+        gt = labels[:, 0].astype(np.int32)
+        boxes, frame_scores, class_ids = runtime.predict([frame], conf=conf)[0]
+        correct.append(match_detections(boxes, class_ids, gt_boxes, gt))
+        scores.append(frame_scores)
+        classes.append(class_ids)
+        gt_classes.append(gt)
+    if not correct:
+        raise FileNotFoundError(f"No readable images in {val_dir}")
+
+    scores, classes = np.concatenate(scores), np.concatenate(classes)
+    correct, gt_classes = np.concatenate(correct), np.concatenate(gt_classes)
+    ap, precision, recall = [], [], []
+    for cls in np.unique(gt_classes):
+        n_gt = int((gt_classes == cls).sum())
+        mask = classes == cls
+        order = np.argsort(-scores[mask], kind="stable")
+        tp = correct[mask][order]
+        ap.append([average_precision(tp[:, t], n_gt) for t in range(len(IOU_THRESHOLDS))])
+        precision.append(tp[:, 0].mean() if len(tp) else 0.0)
+        recall.append(tp[:, 0].sum() / n_gt)
+    ap = np.array(ap).reshape(-1, len(IOU_THRESHOLDS))
+    metrics = {
+        "map50": float(ap[:, 0].mean()) if len(ap) else 0.0,
+        "map": float(ap.mean()) if len(ap) else 0.0,
+        "precision": float(np.mean(precision)) if precision else 0.0,
+        "recall": float(np.mean(recall)) if recall else 0.0,
+    }
+
+    print("\nValidation Results:")
+    print(f"- mAP@0.5:      {metrics['map50']:.4f}")
+    print(f"- mAP@0.5-0.95: {metrics['map']:.4f}")
+    print(f"- Precision:    {metrics['precision']:.4f}")
+    print(f"- Recall:       {metrics['recall']:.4f}")
+    return metrics
+
+def validate_backend(backend, model_path, data_path, args, test_images):
+    """
+    Run validation and test-image inference for one backend
+
+    Returns:
+        Dict with the validation metrics and inference latency
+    """
+    print(f"\n--- Backend: {backend} ({model_path}) ---")
+    model = YOLO(str(model_path), task="detect")
+    summary = {"backend": backend}
+    if not args.profile_only:
+        summary.update(evaluate_model(model, data_path, args.imgsz, args.conf))
+
+    if not test_images:
+        print("No test images found.")
+        return summary
+
+    summary["profile"] = profile_backend(backend, model_path, test_images, args, model)
+    # Headline numbers: the first batch size / thread count of the sweep
+    first = summary["profile"][0]
+    summary["avg_ms"] = first["latency_ms"]["total"]["mean"] / first["batch_size"]
+    summary["fps"] = first["throughput_fps"]
+
+    # Show results if requested
+    if args.show:
+        for img_path in test_images[:10]:
+            img = cv2.imread(str(img_path))
+            if img is None:
+                continue
+            results = model.predict(img, conf=args.conf, imgsz=args.imgsz, verbose=False)
+            cv2.imshow(f"Detection Result: {img_path.name}", results[0].plot())
+            cv2.waitKey(0)
+    return summary
+
+def stage_runner(backend, model, model_path, imgsz, conf, threads):
+    """
+    Build a function that runs one batch of frames and returns the nanoseconds
+    spent per stage (preprocess, inference, postprocess, total)
+    """
+    if backend != "torch":
+        # Exported models are timed through the same NumPy pipeline the server uses
+        runtime = load_exported_model(backend, model_path, imgsz=imgsz, threads=threads)
+
+        def run(frames):
+            t0 = time.perf_counter_ns()
+            batch, metas = runtime.preprocess(frames)
+            t1 = time.perf_counter_ns()
+            output = runtime.infer(batch)
+            t2 = time.perf_counter_ns()
+            runtime.postprocess(output, metas, conf=conf)
+            t3 = time.perf_counter_ns()
+            return {"preprocess": t1 - t0, "inference": t2 - t1, "postprocess": t3 - t2, "total": t3 - t0}
+        return run
+
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+
+    def run(frames):
+        start = time.perf_counter_ns()
+        results = model.predict(frames, conf=conf, imgsz=imgsz, verbose=False)
+        total = time.perf_counter_ns() - start
+        # Ultralytics reports per-image stage times in ms, averaged over the batch
+        speed = results[0].speed
+        stages = {stage: int(speed[stage] * 1e6 * len(frames)) for stage in ("preprocess", "inference", "postprocess")}
+        stages["total"] = total
+        return stages
+    return run
+
+def load_frames(test_images):
+    """Decode the test images once, so profiling does not time disk reads"""
+    return [img for img in (cv2.imread(str(p)) for p in test_images) if img is not None]
+
+def latency_summary(samples_ns):
+    """Mean and p50/p95/p99 in milliseconds of a list of nanosecond samples"""
+    values = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "max": float(values.max())}
+
+def profile_backend(backend, model_path, test_images, args, model=None):
+    """
+    Profile latency and throughput on the whole test split for every batch size
+    and thread count of the sweep
+
+    Returns:
+        List of dicts (one per batch size / thread count) with per-stage latency
+        percentiles of one batch call and the throughput in images per second
+    """
+    frames = load_frames(test_images)
+    if not frames:
+        # Nothing to time: every batch list and latency summary below would be empty
+        raise SystemExit(f"Error: none of the {len(test_images)} test images could be decoded")
+    if backend == "torch" and model is None:
+        model = YOLO(str(model_path), task="detect")
+    runs = []
+    for threads in args.threads:
+        run = stage_runner(backend, model, model_path, args.imgsz, args.conf, threads)
+        for batch_size in args.batch_sizes:
+            batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+            # Warm-up: the first calls pay for lazy initialization and allocation
+            for i in range(args.warmup):
+                run(batches[i % len(batches)])
+
+            samples = {"preprocess": [], "inference": [], "postprocess": [], "total": []}
+            for _ in range(args.repeats):
+                for batch in tqdm(batches, desc=f"{backend} batch={batch_size} threads={threads or 'default'}", leave=False):
+                    for stage, ns in run(batch).items():
+                        samples[stage].append(ns)
+            images = len(frames) * args.repeats
+            entry = {
+                "backend": backend,
+                "batch_size": batch_size,
+                "threads": threads,
+                "images": images,
+                "throughput_fps": images / (sum(samples["total"]) / 1e9),
+                "latency_ms": {stage: latency_summary(values) for stage, values in samples.items()},
+            }
+            runs.append(entry)
+            total = entry["latency_ms"]["total"]
+            print(f"- batch {batch_size:>2}, threads {threads or 'default':>7}: "
+                  f"p50 {total['p50']:.2f} / p95 {total['p95']:.2f} / p99 {total['p99']:.2f} ms per call, "
+                  f"{entry['throughput_fps']:.2f} img/s")
+    print_profile(runs)
+    return runs
+
+def print_profile(runs):
+    """Per-stage latency percentiles of every batch size / thread count"""
+    print(f"\n{'Batch':>5}{'Threads':>9}  {'Stage':<12}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'img/s':>10}")
+    print(f"{'-'*72}")
+    for entry in runs:
+        for stage, lat in entry["latency_ms"].items():
+            fps = f"{entry['throughput_fps']:.2f}" if stage == "total" else ""
+            print(f"{entry['batch_size']:>5}{entry['threads'] or 'default':>9}  {stage:<12}"
+                  f"{lat['mean']:>9.2f}{lat['p50']:>9.2f}{lat['p95']:>9.2f}{lat['p99']:>9.2f}{fps:>10}")
+
+class Profiler:
+    """
+    Optional whole-run profiling: cProfile statistics (--cprofile) and/or a py-spy
+    flamegraph of this process (--flamegraph, needs py-spy on PATH)
+    """
+
+    def __init__(self, cprofile_path=None, flamegraph_path=None):
+        self.cprofile_path = cprofile_path
+        self.flamegraph_path = flamegraph_path
+        self._profile = None
+        self._py_spy = None
+
+    def __enter__(self):
+        if self.flamegraph_path:
+            if shutil.which("py-spy") is None:
+                print("py-spy not found on PATH, no flamegraph will be written")
+            else:
+                self._py_spy = subprocess.Popen(
+                    ["py-spy", "record", "--pid", str(os.getpid()), "--output", self.flamegraph_path, "--rate", "200"])
+        if self.cprofile_path:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.cprofile_path)
+            print(f"\ncProfile statistics written to {self.cprofile_path} (top 15 by cumulative time):")
+            pstats.Stats(self._profile).sort_stats("cumulative").print_stats(15)
+        if self._py_spy is not None:
+            # py-spy writes the flamegraph when interrupted
+            self._py_spy.send_signal(signal.SIGINT)
+            self._py_spy.wait()
+            print(f"Flamegraph written to {self.flamegraph_path}")
+        return False
+
+def model_fingerprint(model_path):
+    """Size and modification time of a model file or directory, to tell model versions apart"""
+    path = Path(model_path)
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+    return {
+        "path": str(path),
+        "bytes": sum(p.stat().st_size for p in files),
+        "modified": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(max((p.stat().st_mtime for p in files), default=0))),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def validate_levels(model_path, data_path, levels, args, test_images):
+    """
+    Measure accuracy (validation split) and latency (test images) of the torch model
+    at every input size the server's QoS controller can step through
+
+    Returns:
+        List of dicts with imgsz, the validation metrics and inference latency
+    """
+    model = YOLO(str(model_path), task="detect")
+    frames = load_frames(test_images)
+    points = []
+    for imgsz in levels:
+        print(f"\n--- Input size: {imgsz} ---")
+        point = {"imgsz": imgsz}
+        point.update(evaluate_model(model, data_path, imgsz, args.conf))
+        if frames:
+            run = stage_runner("torch", model, model_path, imgsz, args.conf, 0)
+            # Untimed passes so the timed ones do not pay for the new input shape
+            for i in range(args.warmup):
+                run([frames[i % len(frames)]])
+            latency = latency_summary([run([frame])["total"] for frame in frames])
+            point["avg_ms"] = latency["mean"]
+            point["p95_ms"] = latency["p95"]
+            point["fps"] = 1000.0 / latency["mean"]
+        points.append(point)
+
+    print(f"\n{'='*70}")
+    print(f"{'imgsz':<8}{'mAP@0.5':>10}{'mAP@.5-.95':>12}{'P':>9}{'R':>9}{'ms/frame':>11}{'dmAP@0.5':>11}")
+    print(f"{'-'*70}")
+    best = points[0]["map50"]
+    for p in points:
+        latency = f"{p['avg_ms']:.2f}" if "avg_ms" in p else "-"
+        print(f"{p['imgsz']:<8}{p['map50']:>10.4f}{p['map']:>12.4f}{p['precision']:>9.4f}{p['recall']:>9.4f}"
+              f"{latency:>11}{p['map50'] - best:>+11.4f}")
+    print(f"{'='*70}")
+    return points
+
+def print_comparison(summaries):
+    """Print validation metrics and latency of every backend side by side"""
+    print(f"\n{'='*78}")
+    print(f"{'Backend':<10}{'mAP@0.5':>10}{'mAP@.5-.95':>12}{'P':>9}{'R':>9}{'ms/frame':>11}{'FPS':>9}{'Speedup':>9}")
+    print(f"{'-'*78}")
+    baseline = summaries[0].get("avg_ms")
+    metric = lambda s, key, width: f"{s[key]:>{width}.4f}" if key in s else f"{'-':>{width}}"
+    for s in summaries:
+        avg_ms = s.get("avg_ms")
+        speedup = f"{baseline / avg_ms:.2f}x" if baseline and avg_ms else "-"
+        latency = f"{avg_ms:.2f}" if avg_ms else "-"
+        fps = f"{s['fps']:.2f}" if avg_ms else "-"
+        print(f"{s['backend']:<10}{metric(s, 'map50', 10)}{metric(s, 'map', 12)}{metric(s, 'precision', 9)}"
+              f"{metric(s, 'recall', 9)}{latency:>11}{fps:>9}{speedup:>9}")
+    print(f"{'='*78}")
+
+def positive_int(value):
+    """argparse type for options that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+def thread_count(value):
+    """argparse type for thread counts: 0 (runtime default) or more"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 (runtime default) or a positive integer, got {value}")
+    return number
 
 def main():
     """
     Main function to parse arguments and validate the model
     """
     parser = argparse.ArgumentParser(description="Validate trained YOLOv10 model on recycling dataset")
-    parser.add_argument("--model", type=str, default="models/recyclables.pt", 
+    parser.add_argument("--model", type=str, default="models/recyclables.pt",
                       help="Path to trained model (default: models/recyclables.pt)")
     parser.add_argument("--data", type=str, default="DATASET/data.yaml",
                       help="Path to dataset yaml file (default: DATASET/data.yaml)")
@@ -27,99 +454,114 @@ def main():
                       help="Image size for validation (default: 640)")
     parser.add_argument("--conf", type=float, default=0.25,
                       help="Confidence threshold (default: 0.25)")
+    parser.add_argument("--backends", type=str, nargs="+", default=["torch"],
+                      choices=["torch", "onnx", "openvino"],
+                      help="Backends to validate and compare (default: torch)")
+    parser.add_argument("--onnx", type=str, default=None,
+                      help="Path to ONNX model (default: <model>.onnx)")
+    parser.add_argument("--openvino", type=str, default=None,
+                      help="Path to OpenVINO model directory (default: <model>_openvino_model)")
     parser.add_argument("--show", action="store_true",
                       help="Show detection results on test images")
+    parser.add_argument("--imgsz-levels", type=int, nargs="+", default=None,
+                      help="Measure the torch model at each input size, e.g. 640 480 320 "
+                           "(the server's QOS_LEVELS)")
+    parser.add_argument("--batch-sizes", type=positive_int, nargs="+", default=[1],
+                      help="Batch sizes to profile (default: 1)")
+    parser.add_argument("--threads", type=thread_count, nargs="+", default=[0],
+                      help="Inference thread counts to profile, 0 = runtime default (default: 0)")
+    parser.add_argument("--warmup", type=int, default=3,
+                      help="Untimed warm-up calls before each profile (default: 3)")
+    parser.add_argument("--repeats", type=positive_int, default=1,
+                      help="Timed passes over the test split (default: 1)")
+    parser.add_argument("--test-dir", type=str, default="DATASET/test/images",
+                      help="Images used for latency profiling (default: DATASET/test/images)")
+    parser.add_argument("--profile-only", action="store_true",
+                      help="Skip mAP validation and only profile latency")
+    parser.add_argument("--cprofile", type=str, default=None,
+                      help="Write cProfile statistics of the run to this file")
+    parser.add_argument("--flamegraph", type=str, default=None,
+                      help="Record a py-spy flamegraph of the run to this SVG file (needs py-spy)")
+    parser.add_argument("--output", type=str, default=None,
+                      help="Write the results as JSON to this file (with --imgsz-levels: the "
+                           "operating points for the server's QOS_OPERATING_POINTS)")
     args = parser.parse_args()
-    
-    # Check if model exists
-    model_path = Path(args.model)
-    if not model_path.exists():
-        print(f"Error: Model file {args.model} not found.")
-        print("Check if training has completed and the model was saved correctly.")
-        return
-    
+
+    # Resolve the model path for every requested backend
+    model_paths = {}
+    for backend in args.backends:
+        override = getattr(args, backend, None) if backend != "torch" else args.model
+        model_paths[backend] = Path(override) if override else default_backend_path(args.model, backend)
+
+    # Check if models exist
+    for backend, model_path in model_paths.items():
+        if not model_path.exists():
+            print(f"Error: Model file {model_path} not found.")
+            if backend == "torch":
+                print("Check if training has completed and the model was saved correctly.")
+            else:
+                print(f"Export the model first: python export_model.py --formats {backend}")
+            return
+
     # Check if data file exists
     data_path = Path(args.data)
     if not data_path.exists():
         print(f"Error: Dataset config file {args.data} not found")
         return
-    
-    # Load the model
-    try:
-        print(f"Loading model from {model_path}...")
-        model = YOLO(model_path)
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return
-    
+
     # Print validation information
     print(f"\n{'='*50}")
     print(f"Starting validation with the following configuration:")
-    print(f"- Model:         {model_path.absolute()}")
+    for backend, model_path in model_paths.items():
+        print(f"- Model ({backend}): {model_path.absolute()}")
     print(f"- Dataset:       {data_path.absolute()}")
     print(f"- Image size:    {args.imgsz}")
     print(f"- Confidence:    {args.conf}")
     print(f"{'='*50}\n")
-    
-    # Run validation
-    try:
-        print("Running validation on the validation set...")
-        val_results = model.val(data=str(data_path.absolute()), imgsz=args.imgsz, conf=args.conf)
-        
-        print("\nValidation Results:")
-        print(f"- mAP@0.5:      {val_results.box.map50:.4f}")
-        print(f"- mAP@0.5-0.95: {val_results.box.map:.4f}")
-        print(f"- Precision:    {val_results.box.p:.4f}")
-        print(f"- Recall:       {val_results.box.r:.4f}")
-        
-        # Run inference on some test images
-        test_dir = Path("DATASET/test/images")
-        if test_dir.exists() and any(test_dir.iterdir()):
-            print("\nRunning inference on test images...")
-            
-            # Get list of test images
-            test_images = list(test_dir.glob("*.jpg")) + list(test_dir.glob("*.png"))
-            if not test_images:
-                print("No test images found.")
-            else:
-                print(f"Found {len(test_images)} test images.")
-                
-                # Run inference on each test image
-                inference_times = []
-                for img_path in tqdm(test_images[:10], desc="Processing test images"):  # Process up to 10 test images
-                    # Load image
-                    img = cv2.imread(str(img_path))
-                    if img is None:
-                        print(f"Could not load image: {img_path}")
-                        continue
-                    
-                    # Run inference with timing
-                    start_time = time.time()
-                    results = model.predict(img, conf=args.conf, imgsz=args.imgsz, verbose=False)
-                    inference_time = time.time() - start_time
-                    inference_times.append(inference_time)
-                    
-                    # Show results if requested
-                    if args.show and results:
-                        res_plotted = results[0].plot()
-                        cv2.imshow(f"Detection Result: {img_path.name}", res_plotted)
-                        cv2.waitKey(0)
-                
-                # Print inference performance
-                if inference_times:
-                    avg_time = sum(inference_times) / len(inference_times)
-                    fps = 1 / avg_time
-                    print(f"\nInference Performance:")
-                    print(f"- Average inference time: {avg_time*1000:.2f} ms")
-                    print(f"- Frames per second: {fps:.2f} FPS")
-        
+
+    test_images = load_test_images(args.test_dir)
+    if args.profile_only and not test_images:
+        print(f"Error: No test images found in {args.test_dir}")
+        return
+
+    if args.imgsz_levels:
+        points = validate_levels(model_paths.get("torch", args.model), data_path, args.imgsz_levels, args, test_images)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"model": str(args.model), "conf": args.conf, "levels": points}, f, indent=2)
+            print(f"Operating points written to {args.output}")
         print("\nValidation completed!")
-    except Exception as e:
-        print(f"Error during validation: {e}")
-    
+        return
+
+    summaries = []
+    with Profiler(args.cprofile, args.flamegraph):
+        for backend, model_path in model_paths.items():
+            try:
+                summaries.append(validate_backend(backend, model_path, data_path, args, test_images))
+            except Exception as e:
+                print(f"Error during validation of {backend} backend: {e}")
+
+    if len(summaries) > 1:
+        print_comparison(summaries)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "models": {backend: model_fingerprint(path) for backend, path in model_paths.items()},
+            "config": {"imgsz": args.imgsz, "conf": args.conf, "test_images": len(test_images),
+                       "warmup": args.warmup, "repeats": args.repeats},
+            "results": summaries,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    print("\nValidation completed!")
+
     # Close any open windows
     if args.show:
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,244 @@
+"""
+CPU inference backends for exported YOLOv10 models (ONNX Runtime and OpenVINO).
+Preprocessing (letterbox and enhancement, shared with the server through
+preprocessing.FramePreprocessor) and postprocessing are written with NumPy/OpenCV
+so the server does not need PyTorch at inference time.
+"""
+
+import ast
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+from preprocessing import FramePreprocessor
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+# Default model location for each backend (relative to the Backend directory)
+DEFAULT_MODEL_PATHS = {
+    "torch": "yolov10n.pt",
+    "onnx": os.path.join("models", "recyclables.onnx"),
+    "openvino": os.path.join("models", "recyclables_openvino_model"),
+}
+
+
+def default_model_path(backend, precision="fp32"):
+    """
+    Default model location for a backend; precision "int8" selects the
+    quantized artifact written by quantize_model.py
+    """
+    path = DEFAULT_MODEL_PATHS[backend]
+    if precision != "int8" or backend == "torch":
+        return path
+    if backend == "onnx":
+        return path.replace(".onnx", "_int8.onnx")
+    return path.replace("_openvino_model", "_int8_openvino_model")
+
+
+class ExportedYOLO:
+    """
+    Base class for exported YOLO models. Subclasses implement _run(), which takes
+    an NCHW float32 batch and returns the raw model output.
+    """
+
+    backend = None
+
+    def __init__(self, model_path, imgsz=640):
+        self.model_path = str(model_path)
+        self.imgsz = imgsz
+        self.names = {}
+        self.static_batch = True
+        self._preprocessor = None
+
+    def preprocess(self, frames):
+        """
+        Letterbox and enhance a list of BGR frames into one NCHW float32 RGB batch
+        in [0, 1], exactly as the server does
+        Returns (batch, metas) where metas holds (ratio, pad, shape) per frame.
+        The batch is a reused buffer, valid until the next call.
+        """
+        if self._preprocessor is None or self._preprocessor.imgsz != self.imgsz:
+            self._preprocessor = FramePreprocessor(self.imgsz)
+        return self._preprocessor.detection_batch(frames)
+
+    def infer(self, batch):
+        """Run the model on a preprocessed batch"""
+        if self.static_batch and batch.shape[0] > 1:
+            # Model was exported with a fixed batch size of 1
+            return np.concatenate([self._run(batch[i:i + 1]) for i in range(batch.shape[0])], axis=0)
+        return self._run(batch)
+
+    def postprocess(self, output, metas, conf=0.25, iou=0.45):
+        """
+        Convert raw model output to per-frame (boxes, scores, class_ids) arrays with
+        boxes in original frame coordinates (x1, y1, x2, y2).
+        """
+        results = []
+        end_to_end = output.ndim == 3 and output.shape[-1] == 6
+        for i, (ratio, (pad_x, pad_y), (h, w)) in enumerate(metas):
+            if end_to_end:
+                # YOLOv10 NMS-free head: [x1, y1, x2, y2, score, class] per row
+                pred = output[i]
+                pred = pred[pred[:, 4] >= conf]
+                boxes = pred[:, :4].copy()
+                scores = pred[:, 4]
+                class_ids = pred[:, 5].astype(np.int32)
+            else:
+                boxes, scores, class_ids = self._nms(output[i], conf, iou)
+
+            boxes[:, [0, 2]] -= pad_x
+            boxes[:, [1, 3]] -= pad_y
+            boxes /= ratio
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+            results.append((boxes, scores.astype(np.float32), class_ids))
+        return results
+
+    @staticmethod
+    def _nms(pred, conf, iou):
+        """Decode a classic (4 + nc, anchors) YOLO head and apply class-wise NMS"""
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores >= conf
+        pred, scores, class_ids = pred[keep], scores[keep], class_ids[keep]
+
+        xywh = pred[:, :4]
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+        if len(boxes) == 0:
+            return boxes, scores, class_ids.astype(np.int32)
+
+        rects = np.column_stack([boxes[:, :2], xywh[:, 2:]]).tolist()
+        indices = cv2.dnn.NMSBoxesBatched(rects, scores.tolist(), class_ids.tolist(), conf, iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        return boxes[indices], scores[indices], class_ids[indices].astype(np.int32)
+
+    def predict(self, frames, conf=0.25, iou=0.45):
+        """Convenience wrapper: preprocess, infer and postprocess in one call"""
+        batch, metas = self.preprocess(frames)
+        return self.postprocess(self.infer(batch), metas, conf, iou)
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def _require_names(self):
+        # Detections of classes missing from names are dropped downstream, so a
+        # model without class names would silently detect nothing
+        if not self.names:
+            raise ValueError(f"{self.model_path} has no class names in its export metadata")
+
+
+def _parse_names(value):
+    """Parse the class names stored in Ultralytics export metadata"""
+    if isinstance(value, dict):
+        return {int(k): v for k, v in value.items()}
+    try:
+        return {int(k): v for k, v in ast.literal_eval(value).items()}
+    except (ValueError, SyntaxError, AttributeError):
+        return {}
+
+
+class OnnxYOLO(ExportedYOLO):
+    """YOLO model exported to ONNX, run with ONNX Runtime on CPU"""
+
+    backend = "onnx"
+
+    def __init__(self, model_path, imgsz=640, threads=0, cache_dir=None):
+        super().__init__(model_path, imgsz)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        session_path, optimized_path = self.model_path, None
+        if cache_dir:
+            # Reuse the graph optimized by a previous start instead of optimizing again
+            stat = os.stat(self.model_path)
+            cached = os.path.join(cache_dir, f"{Path(self.model_path).stem}-{stat.st_size}-{stat.st_mtime_ns}.ort.onnx")
+            if os.path.exists(cached):
+                session_path = cached
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                os.makedirs(cache_dir, exist_ok=True)
+                # ORT writes the file in place: write a per-process file and rename it,
+                # so concurrent workers never load a partial one
+                optimized_path = f"{cached}.{os.getpid()}.tmp"
+                options.optimized_model_filepath = optimized_path
+        self.session = ort.InferenceSession(session_path, options, providers=["CPUExecutionProvider"])
+        if optimized_path is not None:
+            try:
+                os.replace(optimized_path, cached)
+            except OSError:
+                pass
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.static_batch = isinstance(model_input.shape[0], int)
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(metadata.get("names", "{}"))
+        self._require_names()
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoYOLO(ExportedYOLO):
+    """YOLO model exported to OpenVINO IR, run with the OpenVINO CPU plugin"""
+
+    backend = "openvino"
+
+    def __init__(self, model_path, imgsz=640, threads=0, cache_dir=None):
+        super().__init__(model_path, imgsz)
+        import openvino as ov
+
+        path = Path(self.model_path)
+        xml_path = next(path.glob("*.xml")) if path.is_dir() else path
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        if cache_dir:
+            # Compiled model blobs are cached, so later starts skip CPU plugin compilation
+            config["CACHE_DIR"] = str(cache_dir)
+        model = core.read_model(str(xml_path))
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        input_shape = model.input(0).get_partial_shape()
+        self.static_batch = input_shape[0].is_static
+        if input_shape[2].is_static:
+            self.imgsz = input_shape[2].get_length()
+
+        metadata_path = xml_path.parent / "metadata.yaml"
+        if metadata_path.exists():
+            import yaml
+
+            with open(metadata_path) as f:
+                self.names = _parse_names((yaml.safe_load(f) or {}).get("names", {}))
+        self._require_names()
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.output]
+
+
+def load_exported_model(backend, model_path, imgsz=640, threads=0, cache_dir=None):
+    """
+    Load an exported YOLO model for the given backend ("onnx" or "openvino")
+    Args:
+        cache_dir: Directory for the optimized/compiled model cache (None disables it)
+    """
+    if backend == "onnx":
+        return OnnxYOLO(model_path, imgsz, threads, cache_dir)
+    if backend == "openvino":
+        return OpenVinoYOLO(model_path, imgsz, threads, cache_dir)
+    raise ValueError(f"Unknown exported model backend: {backend}")